@@ -10,6 +10,9 @@ app.config_from_object(settings, namespace='CELERY')
 
 app.autodiscover_tasks()
 
+# Connects the task duration and failure metrics
+import config.metrics  # noqa: E402,F401
+
 
 @app.task(bind=True)
 def debug_task(self):
@@ -0,0 +1,67 @@
+"""
+PostgreSQL backend that keeps its connections in a process-wide pool.
+
+Use it as the ENGINE of a DATABASES entry with CONN_MAX_AGE = 0: Django
+then "closes" the connection at the end of every request or Celery task,
+which hands it back to the pool instead of tearing it down. The pool is
+configured by the entry's POOL dict, see config.db.pool.ConnectionPool:
+
+    'POOL': {'MAX_SIZE': 10, 'TIMEOUT': 5, 'MAX_IDLE': 300,
+             'MAX_LIFETIME': 1800, 'HEALTH_CHECK_INTERVAL': 30}
+"""
+import functools
+
+from django.db.backends.postgresql import base, creation
+
+from config import timing
+
+from . import pool, routing
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # DROP DATABASE fails while pooled connections are still open.
+        pool.close_idle(test_database_name)
+        super()._destroy_test_db(test_database_name, verbosity)
+
+    def _clone_test_db(self, suffix, verbosity, keepdb=False):
+        # So is copying a template database.
+        pool.close_idle(self.connection.settings_dict['NAME'])
+        super()._clone_test_db(suffix, verbosity, keepdb)
+
+    def set_as_test_mirror(self, primary_settings_dict):
+        super().set_as_test_mirror(primary_settings_dict)
+        routing.test_mirrors.add(self.connection.alias)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Counts the queries of the request being timed, in whichever thread
+        # they run.
+        self.execute_wrappers.append(timing.record_query)
+
+    @property
+    def pool(self):
+        settings_dict = self.settings_dict
+        return pool.get_pool(
+            (self.alias, settings_dict['NAME'] or 'postgres',
+             settings_dict['HOST'], settings_dict['PORT']),
+            settings_dict.get('POOL') or {})
+
+    def get_new_connection(self, conn_params):
+        connection = self.pool.checkout(
+            functools.partial(super().get_new_connection, conn_params))
+        # Done by the parent for new connections only.
+        self.isolation_level = self.settings_dict['OPTIONS'].get(
+            'isolation_level', connection.isolation_level)
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            # Closed inside an atomic block, this wrapper keeps its reference
+            # until the block exits, so the connection must not be reused.
+            self.pool.release(self.connection, reusable=not self.in_atomic_block)
@@ -0,0 +1,285 @@
+import collections
+import logging
+import os
+import threading
+import time
+
+import psycopg2
+from psycopg2 import extensions
+
+from config import metrics
+
+logger = logging.getLogger('django.db.backends')
+
+# Checkout latencies kept for the percentiles reported by stats()
+LATENCY_SAMPLES = 1024
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class PoolTimeout(psycopg2.OperationalError):
+    """
+    No connection was released within the pool TIMEOUT. Subclasses the
+    driver error so Django raises it as django.db.OperationalError.
+    """
+
+
+class ConnectionPool:
+    """
+    A process-wide pool of open psycopg2 connections to one database,
+    shared by the Django connection wrappers of every thread.
+
+    checkout() hands out the most recently released idle connection,
+    opens a new one while fewer than max_size are open, or waits up to
+    timeout seconds for a release. Connections idle for longer than
+    health_check_interval are pinged first, and connections idle for
+    longer than max_idle or open for longer than max_lifetime are closed.
+
+    After a fork the pool starts empty: the connections inherited from the
+    parent belong to it and are dropped without being closed.
+
+    Checkout latencies, the connections in use and the events counted in
+    stats() are also recorded in config.metrics under the pool name, once
+    the condition is released, so that they are exposed at /metrics for
+    every process.
+    """
+
+    def __init__(self, max_size, timeout, max_idle, max_lifetime, health_check_interval,
+                 name=''):
+        self.name = name
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.health_check_interval = health_check_interval
+        self.condition = threading.Condition()
+        self._reset()
+
+    def _reset(self):
+        self.pid = os.getpid()
+        self.idle = collections.deque()  # (connection, created_at, released_at)
+        self.created_at = {}  # id(connection) -> monotonic time it was opened
+        self.size = 0
+        self.counters = collections.Counter()
+        self.events = []  # counted since the last _publish()
+        self.latencies = collections.deque(maxlen=LATENCY_SAMPLES)
+
+    def _check_pid(self):
+        if self.pid != os.getpid():
+            self._reset()
+
+    def _count(self, event):
+        # Called with the condition held.
+        self.counters[event] += 1
+        self.events.append(event)
+
+    def _publish(self, latency=None, in_use=None):
+        with self.condition:
+            events, self.events = self.events, []
+        with metrics.batch():
+            for event in events:
+                metrics.DB_POOL_EVENTS.inc(pool=self.name, event=event)
+            if latency is not None:
+                metrics.DB_POOL_CHECKOUT_DURATION.observe(latency, pool=self.name)
+                metrics.DB_POOL_CONNECTIONS_IN_USE.observe(in_use, pool=self.name)
+
+    def _discard(self, connection):
+        # Called with the condition held.
+        self.size -= 1
+        self.created_at.pop(id(connection), None)
+        self._count('closed')
+        self.condition.notify()
+        try:
+            connection.close()
+        except psycopg2.Error:
+            pass
+
+    def _reserve(self, deadline):
+        """
+        Returns an idle (connection, released_at) pair, or (None, None)
+        once a slot for a new connection has been reserved.
+        """
+        waited = False
+        with self.condition:
+            self._check_pid()
+            while True:
+                now = time.monotonic()
+                while self.idle and now - self.idle[0][2] > self.max_idle:
+                    self._discard(self.idle.popleft()[0])
+                if self.idle:
+                    connection, _, released_at = self.idle.pop()
+                    return connection, released_at
+                if self.size < self.max_size:
+                    self.size += 1
+                    return None, None
+                remaining = deadline - now
+                if remaining <= 0:
+                    self._count('timeouts')
+                    logger.warning('Database pool exhausted: %s connections in use for %ss',
+                                   self.size, self.timeout)
+                    raise PoolTimeout(
+                        'No database connection available within {}s '
+                        '({} open)'.format(self.timeout, self.size))
+                if not waited:
+                    self._count('waits')
+                    waited = True
+                self.condition.wait(remaining)
+
+    def _is_alive(self, connection):
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            if not connection.autocommit:
+                connection.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def checkout(self, connect):
+        """
+        Returns an open connection, calling connect() to open a new one when
+        needed.
+        """
+        started = time.monotonic()
+        deadline = started + self.timeout
+        try:
+            connection = self._checkout(connect, deadline)
+        except BaseException:
+            self._publish()
+            raise
+
+        latency = time.monotonic() - started
+        with self.condition:
+            self.counters['checkouts'] += 1
+            self.latencies.append(latency)
+            in_use = self.size - len(self.idle)
+        self._publish(latency, in_use)
+        return connection
+
+    def _checkout(self, connect, deadline):
+        while True:
+            connection, released_at = self._reserve(deadline)
+            if connection is None:
+                try:
+                    connection = connect()
+                except BaseException:
+                    with self.condition:
+                        self.size -= 1
+                        self.condition.notify()
+                    raise
+                with self.condition:
+                    self.created_at[id(connection)] = time.monotonic()
+                    self._count('created')
+                return connection
+            if time.monotonic() - released_at < self.health_check_interval \
+                    or self._is_alive(connection):
+                return connection
+            with self.condition:
+                self._count('health_check_failures')
+                self._discard(connection)
+
+    def release(self, connection, reusable=True):
+        """
+        Returns a connection checked out from this pool. Any open transaction
+        is rolled back; broken, expired or non reusable connections are
+        closed instead of being kept.
+        """
+        if reusable:
+            reusable = self._clean(connection)
+        with self.condition:
+            if self.pid != os.getpid() or id(connection) not in self.created_at:
+                # Opened before a fork, or the pool was reset since.
+                return
+            now = time.monotonic()
+            if reusable and now - self.created_at[id(connection)] < self.max_lifetime:
+                self.idle.append((connection, self.created_at[id(connection)], now))
+                self.condition.notify()
+                return
+            self._discard(connection)
+        self._publish()
+
+    def _clean(self, connection):
+        if connection.closed:
+            return False
+        status = connection.get_transaction_status()
+        if status == extensions.TRANSACTION_STATUS_IDLE:
+            return True
+        if status in (extensions.TRANSACTION_STATUS_INTRANS,
+                      extensions.TRANSACTION_STATUS_INERROR):
+            try:
+                connection.rollback()
+                return True
+            except psycopg2.Error:
+                return False
+        return False
+
+    def close_idle(self):
+        """
+        Closes every idle connection, e.g. before dropping the database.
+        """
+        with self.condition:
+            self._check_pid()
+            while self.idle:
+                self._discard(self.idle.popleft()[0])
+        self._publish()
+
+    def stats(self):
+        with self.condition:
+            self._check_pid()
+            latencies = sorted(self.latencies)
+            idle = len(self.idle)
+            data = {
+                'max_size': self.max_size,
+                'size': self.size,
+                'idle': idle,
+                'in_use': self.size - idle,
+            }
+            for name in ('checkouts', 'waits', 'timeouts', 'created', 'closed',
+                         'health_check_failures'):
+                data[name] = self.counters[name]
+        for name, fraction in (('p50', 0.5), ('p99', 0.99), ('max', 1.0)):
+            index = min(len(latencies) - 1, int(fraction * len(latencies)))
+            data['checkout_ms_{}'.format(name)] = \
+                round(latencies[index] * 1000, 3) if latencies else 0.0
+        return data
+
+
+def get_pool(key, options):
+    """
+    Returns the pool of the given (alias, database, host, port) key,
+    creating it from the POOL options of a DATABASES entry.
+    """
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(
+                max_size=options.get('MAX_SIZE', 10),
+                timeout=options.get('TIMEOUT', 5),
+                max_idle=options.get('MAX_IDLE', 300),
+                max_lifetime=options.get('MAX_LIFETIME', 1800),
+                health_check_interval=options.get('HEALTH_CHECK_INTERVAL', 30),
+                name='{}/{}'.format(*key[:2]),
+            )
+        return pool
+
+
+def close_idle(database=None):
+    """
+    Closes the idle connections of every pool, or only of the pools
+    connected to the given database name.
+    """
+    with _pools_lock:
+        pools = [pool for (_, name, *_), pool in _pools.items()
+                 if database is None or name == database]
+    for pool in pools:
+        pool.close_idle()
+
+
+def stats():
+    """
+    Returns the stats() of every pool of this process by 'alias/database'.
+    """
+    with _pools_lock:
+        pools = list(_pools.items())
+    return {'{}/{}'.format(alias, name): pool.stats() for (alias, name, *_), pool in pools}
@@ -0,0 +1,93 @@
+"""
+Read replica routing.
+
+Reads only go to DATABASE_REPLICAS inside use_replicas() blocks: the
+safe-method requests marked by config.middleware.ReplicaRoutingMiddleware
+and the read-only Celery tasks decorated with replica_reads. Everything
+else, management commands and migrations included, keeps using the
+primary.
+"""
+import contextvars
+import functools
+import random
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+
+class RoutingState:
+    """
+    The replica picked for a block, and whether the block wrote. After
+    the first write every read of the block goes to the primary, so it
+    reads its own writes.
+    """
+
+    __slots__ = ('replica', 'wrote')
+
+    def __init__(self, replica):
+        self.replica = replica
+        self.wrote = False
+
+
+_state = contextvars.ContextVar('db_routing', default=None)
+
+# Replicas set up as test mirrors of the primary. Their connection cannot see
+# the data of a running TestCase, so they are never read from.
+test_mirrors = set()
+
+
+@contextmanager
+def use_replicas(enabled=True):
+    """
+    Sends the reads of the block to one of DATABASE_REPLICAS, picked once
+    for the whole block. With enabled=False, or no replicas configured, the
+    block reads from the primary but still records its writes.
+    """
+    replicas = [alias for alias in settings.DATABASE_REPLICAS if alias not in test_mirrors]
+    state = RoutingState(random.choice(replicas) if enabled and replicas else None)
+    token = _state.set(state)
+    try:
+        yield state
+    finally:
+        _state.reset(token)
+
+
+def reading_from_replica():
+    """
+    Whether the reads of the current block go to a replica.
+    """
+    state = _state.get()
+    return state is not None and state.replica is not None and not state.wrote
+
+
+def replica_reads(func):
+    """
+    Runs func inside use_replicas(), for read-only tasks.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with use_replicas():
+            return func(*args, **kwargs)
+    return wrapper
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or state.wrote or state.replica is None:
+            return DEFAULT_DB_ALIAS
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
@@ -0,0 +1,283 @@
+"""
+Metrics shared by every process of the deployment, exposed at /metrics in
+the Prometheus text format.
+
+The gunicorn workers, the Celery workers and beat are separate processes,
+in separate containers, so samples are kept in Redis (METRICS_REDIS_URL)
+rather than in process memory. Each metric is a hash with one field per
+label set, and per bucket for histograms, updated with the atomic
+HINCRBY/HINCRBYFLOAT. The updates of a batch() block, e.g. one request or
+one task, are sent in a single round trip. Metrics are best effort: the
+updates are dropped when Redis is unreachable or slower than
+METRICS_REDIS_TIMEOUT.
+"""
+import abc
+import bisect
+import contextvars
+import json
+import logging
+import math
+import time
+from contextlib import contextmanager
+
+import redis
+from celery.signals import task_postrun, task_prerun
+from django.conf import settings
+from redis.exceptions import RedisError
+
+logger = logging.getLogger('performance')
+
+KEY_PREFIX = 'metrics'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+TASK_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+CHECKOUT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10)
+CONNECTION_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+
+REGISTRY = []
+
+_updates = contextvars.ContextVar('metrics_updates', default=None)
+_clients = {}
+
+
+def get_redis():
+    # redis-py reopens its connections after a fork, so one client per URL
+    # is safe under gunicorn's and Celery's pre-fork workers. The short
+    # timeouts bound what an unreachable Redis adds to a request.
+    url = settings.METRICS_REDIS_URL
+    client = _clients.get(url)
+    if client is None:
+        client = _clients[url] = redis.Redis.from_url(
+            url, socket_timeout=settings.METRICS_REDIS_TIMEOUT,
+            socket_connect_timeout=settings.METRICS_REDIS_TIMEOUT)
+    return client
+
+
+def send(updates):
+    """
+    Applies (key, field, amount) updates to Redis in one round trip.
+    """
+    if not updates:
+        return
+    try:
+        pipeline = get_redis().pipeline(transaction=False)
+        for key, field, amount in updates:
+            if isinstance(amount, int):
+                pipeline.hincrby(key, field, amount)
+            else:
+                pipeline.hincrbyfloat(key, field, amount)
+        pipeline.execute()
+    except RedisError:
+        logger.warning('Metrics unavailable, dropping %s updates', len(updates), exc_info=True)
+
+
+@contextmanager
+def collect():
+    """
+    Collects the updates of the block into the list it yields, for the
+    caller to send(). Nested blocks add to the outer one.
+    """
+    updates = _updates.get()
+    if updates is not None:
+        yield updates
+        return
+    updates = []
+    token = _updates.set(updates)
+    try:
+        yield updates
+    finally:
+        _updates.reset(token)
+
+
+@contextmanager
+def batch():
+    """
+    Sends the updates of the block in one round trip when it exits.
+    """
+    outer = _updates.get() is not None
+    with collect() as updates:
+        yield
+    if not outer:
+        send(updates)
+
+
+def _update(key, field, amount):
+    if not settings.METRICS_ENABLED:
+        return
+    updates = _updates.get()
+    if updates is None:
+        send([(key, field, amount)])
+    else:
+        updates.append((key, field, amount))
+
+
+def _format_value(value):
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+def _escape(value):
+    return value.replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+class Metric(abc.ABC):
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.key = '{}:{}'.format(KEY_PREFIX, name)
+        REGISTRY.append(self)
+
+    def field(self, labels, *extra):
+        if set(labels) != set(self.labelnames):
+            raise ValueError('{} takes the labels {}'.format(self.name, self.labelnames))
+        return json.dumps([str(labels[name]) for name in self.labelnames] + list(extra))
+
+    @abc.abstractmethod
+    def samples(self, values):
+        """
+        Returns the (name, labels, value) samples of the hash read from Redis.
+        """
+
+    def _parse(self, values):
+        for field, value in values.items():
+            parts = json.loads(field)
+            labels = dict(zip(self.labelnames, parts))
+            yield labels, parts[len(self.labelnames):], float(value)
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        _update(self.key, self.field(labels), amount)
+
+    def samples(self, values):
+        for labels, _, value in sorted(self._parse(values),
+                                       key=lambda sample: list(sample[0].values())):
+            yield self.name, labels, value
+
+
+class Histogram(Metric):
+    """
+    Only the bucket an observation falls in is incremented, the cumulative
+    bucket counts and the total count are summed up when exposing.
+    """
+
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.bounds = [_format_value(bound) for bound in buckets] + ['+Inf']
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        bound = self.bounds[bisect.bisect_left(self.buckets, value)]
+        _update(self.key, self.field(labels, 'bucket', bound), 1)
+        _update(self.key, self.field(labels, 'sum'), float(value))
+
+    def samples(self, values):
+        series = {}
+        for labels, extra, value in self._parse(values):
+            entry = series.setdefault(
+                tuple(labels[name] for name in self.labelnames), {'sum': 0.0, 'buckets': {}})
+            if extra[0] == 'sum':
+                entry['sum'] = value
+            else:
+                entry['buckets'][extra[1]] = value
+
+        for values, entry in sorted(series.items()):
+            labels = dict(zip(self.labelnames, values))
+            count = 0
+            for bound in self.bounds:
+                count += entry['buckets'].get(bound, 0)
+                yield '{}_bucket'.format(self.name), dict(labels, le=bound), count
+            yield '{}_sum'.format(self.name), labels, entry['sum']
+            yield '{}_count'.format(self.name), labels, count
+
+
+def exposition():
+    """
+    Returns every registered metric in the Prometheus text format.
+    """
+    pipeline = get_redis().pipeline(transaction=False)
+    for metric in REGISTRY:
+        pipeline.hgetall(metric.key)
+
+    lines = []
+    for metric, values in zip(REGISTRY, pipeline.execute()):
+        lines.append('# HELP {} {}'.format(metric.name, metric.documentation))
+        lines.append('# TYPE {} {}'.format(metric.name, metric.type))
+        for name, labels, value in metric.samples(values):
+            rendered = ','.join(
+                '{}="{}"'.format(label, _escape(text)) for label, text in labels.items())
+            lines.append('{}{{{}}} {}'.format(name, rendered, _format_value(value)))
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    """
+    Deletes every recorded sample.
+    """
+    get_redis().delete(*[metric.key for metric in REGISTRY])
+
+
+HTTP_REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds', 'Time to serve a request, by URL name.',
+    ('view', 'method'))
+HTTP_RESPONSES = Counter(
+    'http_responses_total', 'Responses by URL name and status code.',
+    ('view', 'method', 'status'))
+HTTP_REQUEST_QUERIES = Histogram(
+    'http_request_db_queries', 'SQL queries run per request, by URL name.',
+    ('view',), buckets=QUERY_BUCKETS)
+RECIPE_CACHE_DURATION = Histogram(
+    'recipe_cache_request_duration_seconds',
+    'Time to serve a request through the recipe cache, by hit or miss.',
+    ('result',))
+CELERY_TASK_DURATION = Histogram(
+    'celery_task_duration_seconds', 'Time to run a Celery task.',
+    ('task',), buckets=TASK_BUCKETS)
+CELERY_TASKS = Counter(
+    'celery_tasks_total', 'Finished Celery tasks, by final state.',
+    ('task', 'state'))
+OUTBOX_DEAD_LETTERS = Counter(
+    'outbox_dead_letters_total',
+    'Outbox events that failed OUTBOX_MAX_ATTEMPTS times, by topic.',
+    ('topic',))
+DB_POOL_CHECKOUT_DURATION = Histogram(
+    'db_pool_checkout_duration_seconds',
+    'Time to check a connection out of a database pool, by alias/database.',
+    ('pool',), buckets=CHECKOUT_BUCKETS)
+DB_POOL_CONNECTIONS_IN_USE = Histogram(
+    'db_pool_connections_in_use',
+    'Connections of a process pool in use after each checkout, by alias/database.',
+    ('pool',), buckets=CONNECTION_BUCKETS)
+DB_POOL_EVENTS = Counter(
+    'db_pool_events_total',
+    'Database pool waits, timeouts, created and closed connections and failed '
+    'health checks, by alias/database.',
+    ('pool', 'event'))
+
+
+_task_started = {}
+
+
+@task_prerun.connect
+def _task_prerun(task_id=None, **kwargs):
+    _task_started[task_id] = time.perf_counter()
+
+
+@task_postrun.connect
+def _task_postrun(task_id=None, task=None, state=None, **kwargs):
+    started = _task_started.pop(task_id, None)
+    with batch():
+        if started is not None:
+            CELERY_TASK_DURATION.observe(time.perf_counter() - started, task=task.name)
+        CELERY_TASKS.inc(task=task.name, state=state or 'UNKNOWN')
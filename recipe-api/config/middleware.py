@@ -0,0 +1,255 @@
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.permissions import SAFE_METHODS
+from whitenoise import middleware
+
+from config import metrics, timing
+from config.db.routing import use_replicas
+
+logger = logging.getLogger('performance')
+
+
+class WhiteNoiseMiddleware(middleware.WhiteNoiseMiddleware):
+    """
+    WhiteNoise that also runs as async middleware.
+
+    The stock middleware is sync only. Under ASGI, Django would then run
+    it and every view below it on its single thread-sensitive executor, so
+    the process would serve one request at a time.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings)
+        if asyncio.iscoroutinefunction(get_response):
+            # Marks the instance as a coroutine function for Django, as
+            # MiddlewareMixin does.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        response = self.process_request(request)
+        if response is None:
+            response = await self.get_response(request)
+        return response
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Reads safe-method requests from the read replicas.
+
+    Unsafe requests, and the requests of a client that wrote within the
+    last REPLICA_STICKY_SECONDS, read from the primary so that clients
+    always see their own writes. The client is recognised by a cookie,
+    or by a cache entry keyed on its Authorization header for API clients
+    that do not keep cookies.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def pin_key(self, request):
+        header = request.META.get('HTTP_AUTHORIZATION')
+        if not header:
+            return None
+        return 'replica-pin:{}'.format(hashlib.sha256(header.encode('utf-8')).hexdigest()[:32])
+
+    def reads_from_replica(self, request):
+        if request.method not in SAFE_METHODS:
+            return False
+        if request.COOKIES.get(settings.REPLICA_STICKY_COOKIE):
+            return False
+        key = self.pin_key(request)
+        return key is None or caches[settings.REPLICA_STICKY_CACHE_ALIAS].get(key) is None
+
+    def pin(self, request, response, state):
+        if not state.wrote and (request.method in SAFE_METHODS or response.status_code >= 400):
+            return
+        window = settings.REPLICA_STICKY_SECONDS
+        response.set_cookie(settings.REPLICA_STICKY_COOKIE, '1', max_age=window,
+                            httponly=True, samesite='Lax')
+        key = self.pin_key(request)
+        if key is not None:
+            caches[settings.REPLICA_STICKY_CACHE_ALIAS].set(key, 1, window)
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+        with use_replicas(self.reads_from_replica(request)) as state:
+            response = self.get_response(request)
+        self.pin(request, response, state)
+        return response
+
+    async def __acall__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return await self.get_response(request)
+        replica = await sync_to_async(self.reads_from_replica, thread_sensitive=False)(request)
+        with use_replicas(replica) as state:
+            response = await self.get_response(request)
+        await sync_to_async(self.pin, thread_sensitive=False)(request, response, state)
+        return response
+
+
+class RequestTimingMiddleware:
+    """
+    Measures each request with config.timing: the SQL query count and
+    time, and the view, serializer and render time.
+
+    The timings go out in a Server-Timing header (REQUEST_TIMING_HEADER)
+    and, for a REQUEST_TIMING_LOG_SAMPLE_RATE sample of the requests, as a
+    JSON line on the 'performance' logger. Requests taking
+    REQUEST_TIMING_SLOW_MS or longer are always logged, as warnings with
+    their SQL.
+
+    Goes last in MIDDLEWARE, so that the view time is the view's own.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+            # Django would otherwise run the sync hook on its single
+            # thread-sensitive executor.
+            self.process_template_response = self.aprocess_template_response
+        timing.instrument_serializers()
+
+    def process_template_response(self, request, response):
+        return self.time_rendering(response)
+
+    async def aprocess_template_response(self, request, response):
+        return self.time_rendering(response)
+
+    def time_rendering(self, response):
+        timings = timing.current()
+        if timings is not None and not response.is_rendered:
+            started = time.perf_counter()
+
+            def rendered(response):
+                timings.add('render', time.perf_counter() - started)
+
+            response.add_post_render_callback(rendered)
+        return response
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        with timing.collect(settings.REQUEST_TIMING_MAX_QUERIES) as timings:
+            request.timings = timings
+            response = self.get_response(request)
+        self.report(request, response, timings)
+        return response
+
+    async def __acall__(self, request):
+        with timing.collect(settings.REQUEST_TIMING_MAX_QUERIES) as timings:
+            request.timings = timings
+            response = await self.get_response(request)
+        self.report(request, response, timings)
+        return response
+
+    def report(self, request, response, timings):
+        total = time.perf_counter() - timings.started
+        durations = timings.durations
+        ms = {
+            'total': total * 1000,
+            'view': (total - durations['render']) * 1000,
+            'db': durations['db'] * 1000,
+            'serializer': durations['serializer'] * 1000,
+            'render': durations['render'] * 1000,
+        }
+        if settings.REQUEST_TIMING_HEADER:
+            response['Server-Timing'] = ', '.join(
+                '{};dur={:.1f}{}'.format(
+                    name, value,
+                    ';desc="{} queries"'.format(timings.query_count) if name == 'db' else '')
+                for name, value in ms.items())
+
+        slow = ms['total'] >= settings.REQUEST_TIMING_SLOW_MS
+        if not slow and random.random() >= settings.REQUEST_TIMING_LOG_SAMPLE_RATE:
+            return
+        match = request.resolver_match
+        record = {
+            'time': round(time.time(), 3),
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'queries': timings.query_count,
+        }
+        record.update(('{}_ms'.format(name), round(value, 1)) for name, value in ms.items())
+        if slow:
+            record['sql'] = [{'sql': sql, 'ms': round(seconds * 1000, 1)}
+                             for sql, seconds in timings.queries]
+            logger.warning(json.dumps(record))
+        else:
+            logger.info(json.dumps(record))
+
+
+class MetricsMiddleware:
+    """
+    Records the duration, status and SQL query count of each request in
+    config.metrics. Requests are labelled by URL name, e.g.
+    recipe:recipe-list, so the number of series stays bounded.
+
+    Goes first in MIDDLEWARE, so that the duration covers the whole
+    request. The query count is the one of RequestTimingMiddleware.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def record(self, request, response, started):
+        match = request.resolver_match
+        view = match.view_name if match else 'unmatched'
+        metrics.HTTP_REQUEST_DURATION.observe(
+            time.perf_counter() - started, view=view, method=request.method)
+        metrics.HTTP_RESPONSES.inc(
+            view=view, method=request.method, status=response.status_code)
+        timings = getattr(request, 'timings', None)
+        if timings is not None:
+            metrics.HTTP_REQUEST_QUERIES.observe(timings.query_count, view=view)
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        with metrics.batch():
+            response = self.get_response(request)
+            self.record(request, response, started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        with metrics.collect() as updates:
+            response = await self.get_response(request)
+            self.record(request, response, started)
+        await sync_to_async(metrics.send, thread_sensitive=False)(updates)
+        return response
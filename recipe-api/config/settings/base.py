@@ -1,7 +1,7 @@
 from pathlib import Path
 import os
 from datetime import timedelta
-from decouple import config
+from decouple import Csv, config
 from celery.schedules import crontab
 from .logging import *
 ALLOWED_HOSTS = config('ALLOWED_HOSTS', default='localhost').split(',')
@@ -15,6 +15,37 @@ CELERY_BROKER_URL = config('CELERY_BROKER_URL', 'redis://localhost:6379/0')
 accept_content = ['json']
 task_serializer = 'json'
 
+# Cache config
+CACHES = {
+    'default': {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': config('CACHE_URL', 'redis://localhost:6379/1'),
+        'OPTIONS': {
+            'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            # Fall back to the database if Redis is unavailable
+            'IGNORE_EXCEPTIONS': True,
+        },
+    },
+    # Revoked refresh tokens, see users.blacklist.RedisBlacklist. Not a
+    # cache: flushing or evicting it would un-revoke tokens, so it has a
+    # database of its own on a server run with maxmemory-policy noeviction.
+    'token_blacklist': {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': config('TOKEN_BLACKLIST_REDIS_URL', 'redis://localhost:6379/3'),
+        'OPTIONS': {
+            'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+        },
+    },
+}
+RECIPE_CACHE_ALIAS = 'default'
+RECIPE_CACHE_TIMEOUT = config('RECIPE_CACHE_TIMEOUT', default=300, cast=int)
+RECIPE_CACHE_LOCK_TIMEOUT = 10  # seconds a rebuild may hold the lock
+RECIPE_CACHE_LOCK_WAIT = 2  # seconds a request waits for a concurrent rebuild
+# Buffer like/unlike toggles in Redis and write them in bulk (flush-like-buffer)
+RECIPE_LIKE_BUFFER = config('RECIPE_LIKE_BUFFER', default=False, cast=bool)
+# Full-text matches ranked per search, see RecipeQuerySet.search
+RECIPE_SEARCH_MAX_CANDIDATES = config('RECIPE_SEARCH_MAX_CANDIDATES', default=1000, cast=int)
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/3.2/howto/deployment/checklist/
 
@@ -45,22 +76,49 @@ INSTALLED_APPS = [
     # Local apps
     'users',
     'recipe',
+    'events',
 ]
 
 MIDDLEWARE = [
+    'config.middleware.MetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'config.middleware.WhiteNoiseMiddleware',
+    'config.middleware.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'config.middleware.RequestTimingMiddleware',
 ]
 
+# Per-request timings, see config.middleware.RequestTimingMiddleware. The
+# Server-Timing header reveals internals, so it is off unless DEBUG is set.
+REQUEST_TIMING_HEADER = config('REQUEST_TIMING_HEADER', default=False, cast=bool)
+# Fraction of the requests logged to the 'performance' logger
+REQUEST_TIMING_LOG_SAMPLE_RATE = config('REQUEST_TIMING_LOG_SAMPLE_RATE', default=0.01, cast=float)
+# Requests at least this slow are always logged, with their SQL
+REQUEST_TIMING_SLOW_MS = config('REQUEST_TIMING_SLOW_MS', default=1000, cast=int)
+# SQL statements kept per request for the slow request log
+REQUEST_TIMING_MAX_QUERIES = 200
+
+# Metrics shared by the web and Celery processes, served at /metrics, see
+# config.metrics. Kept apart from the cache database, which can be flushed.
+METRICS_ENABLED = config('METRICS_ENABLED', default=True, cast=bool)
+METRICS_REDIS_URL = config('METRICS_REDIS_URL', default='redis://localhost:6379/2')
+# Seconds a metrics update may wait on Redis before it is dropped
+METRICS_REDIS_TIMEOUT = config('METRICS_REDIS_TIMEOUT', default=0.1, cast=float)
+# Bearer token /metrics requires. Without one /metrics is refused unless DEBUG is on
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
 ROOT_URLCONF = 'config.urls'
 
+# Route the hot read endpoints to their async variants (recipe.async_views).
+# Set on processes serving config.asgi under uvicorn.
+ASYNC_VIEWS = config('ASYNC_VIEWS', default=False, cast=bool)
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -85,22 +143,88 @@ WSGI_APPLICATION = 'config.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql_psycopg2',
+        # PostgreSQL with a connection pool per process, see config.db.base
+        'ENGINE': 'config.db',
         'NAME': config('DB_NAME'),
         'USER': config('DB_USERNAME'),
         'PASSWORD': config('DB_PASSWORD'),
         'HOST': config('DB_HOSTNAME'),
         'PORT': config('DB_PORT', cast=int),
+        # Hand the connection back to the pool after every request or task
+        'CONN_MAX_AGE': 0,
+        # Set per service: web processes need one connection per serving
+        # thread, Celery prefork children one each.
+        'POOL': {
+            'MAX_SIZE': config('DB_POOL_MAX_SIZE', default=10, cast=int),
+            'TIMEOUT': config('DB_POOL_TIMEOUT', default=5, cast=float),  # seconds a checkout waits
+            'MAX_IDLE': config('DB_POOL_MAX_IDLE', default=300, cast=int),
+            'MAX_LIFETIME': config('DB_POOL_MAX_LIFETIME', default=1800, cast=int),
+            'HEALTH_CHECK_INTERVAL': config('DB_POOL_HEALTH_CHECK_INTERVAL', default=30, cast=int),
+        },
     }
 }
 
+# Read replicas, as "host[:port]" entries sharing the primary's name and
+# credentials. Safe-method requests and read-only tasks read from them, see
+# config.db.routing.
+DATABASE_REPLICAS = []
+for number, replica in enumerate(config('DB_REPLICA_HOSTS', default='', cast=Csv()), 1):
+    host, _, port = replica.partition(':')
+    alias = 'replica_{}'.format(number)
+    DATABASES[alias] = dict(DATABASES['default'], HOST=host,
+                            PORT=int(port) if port else DATABASES['default']['PORT'],
+                            TEST={'MIRROR': 'default'})
+    DATABASE_REPLICAS.append(alias)
+DATABASE_ROUTERS = ['config.db.routing.ReplicaRouter']
+# Seconds a client keeps reading from the primary after writing
+REPLICA_STICKY_SECONDS = config('REPLICA_STICKY_SECONDS', default=10, cast=int)
+REPLICA_STICKY_COOKIE = 'db_primary'
+REPLICA_STICKY_CACHE_ALIAS = 'default'
+
 broker_connection_retry_on_startup = True
 beat_schedule = {
     'run-daily-mail-sent': {
         'task': 'users.tasks.send_daily_mail_like_count',
         'schedule': crontab(hour=10, minute=12),
     },
+    'flush-like-buffer': {
+        'task': 'recipe.tasks.flush_like_buffer',
+        'schedule': 5.0,
+    },
+    'drain-outbox': {
+        'task': 'events.tasks.drain_outbox',
+        'schedule': 10.0,
+    },
+    'prune-outbox': {
+        'task': 'events.tasks.prune_outbox',
+        'schedule': crontab(hour=4, minute=0),
+    },
+    'refresh-trending-scores': {
+        'task': 'recipe.tasks.refresh_trending_scores',
+        'schedule': 300.0,
+    },
+    'build-recipe-similarities': {
+        'task': 'recipe.tasks.build_recipe_similarities',
+        'schedule': crontab(hour=3, minute=0),
+    },
 }
+# Authors per send_like_count_digest_chunk subtask
+DIGEST_CHUNK_SIZE = config('DIGEST_CHUNK_SIZE', default=500, cast=int)
+# Outbox draining
+OUTBOX_BATCH_SIZE = config('OUTBOX_BATCH_SIZE', default=500, cast=int)
+OUTBOX_MAX_BATCHES = 20  # per drain_outbox run
+OUTBOX_MAX_ATTEMPTS = 5  # failed deliveries before an event is left aside
+OUTBOX_DEAD_LETTER_DAYS = 7  # days events left aside are kept for inspection
+# Trending recipes
+TRENDING_HALF_LIFE_HOURS = config('TRENDING_HALF_LIFE_HOURS', default=24, cast=float)
+TRENDING_WINDOW_DAYS = 7  # likes replayed when the score table is empty
+TRENDING_MIN_SCORE = 0.01  # scores decayed below this are dropped
+TRENDING_COMMIT_MARGIN = 10  # seconds left for in-flight like transactions
+# Similar recipes
+SIMILAR_RECIPES_COUNT = 20  # neighbours stored per recipe
+SIMILAR_RECIPES_USER_CHUNK = config('SIMILAR_RECIPES_USER_CHUNK', default=50000, cast=int)
+SIMILAR_RECIPES_RECIPE_BLOCK = config('SIMILAR_RECIPES_RECIPE_BLOCK', default=2000, cast=int)  # co-like rows held at once
+SIMILAR_RECIPES_MIN_CO_LIKES = 2  # users who must have liked both recipes
 
 
 
@@ -165,13 +289,26 @@ EMAIL_HOST_PASSWORD = config('EMAIL_PASSWORD')
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.StatelessJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ),
     'DEFAULT_FILTER_BACKENDS': (
         'django_filters.rest_framework.DjangoFilterBackend',
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'recipe.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'recipe.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    # Reverse proxies in front of the app, whose X-Forwarded-For entries
+    # are trusted to identify clients. With 0 the client is REMOTE_ADDR and
+    # X-Forwarded-For, which anyone can send, is ignored.
+    'NUM_PROXIES': config('NUM_PROXIES', default=0, cast=int),
 }
 
 SPECTACULAR_SETTINGS = {
@@ -203,6 +340,7 @@ SIMPLE_JWT = {
 
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
     'TOKEN_TYPE_CLAIM': 'token_type',
+    'TOKEN_USER_CLASS': 'users.authentication.LazyTokenUser',
 
     'JTI_CLAIM': 'jti',
 
@@ -211,5 +349,29 @@ SIMPLE_JWT = {
     'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=1),
 }
 
+# Resized copies generated for recipe pictures and avatars (longest side in px)
+IMAGE_VARIANTS = {
+    'thumbnail': 160,
+    'card': 480,
+    'full': 1280,
+}
+
+# Revoked refresh tokens. users.blacklist.DatabaseBlacklist keeps using the
+# token_blacklist tables; see the migrate_token_blacklist command.
+TOKEN_BLACKLIST_BACKEND = config('TOKEN_BLACKLIST_BACKEND', default='users.blacklist.RedisBlacklist')
+TOKEN_BLACKLIST_CACHE_ALIAS = 'token_blacklist'
+
+# Seconds StatelessJWTAuthentication trusts a cached is_active check
+AUTH_USER_STATE_TIMEOUT = 60
+
+# Sliding window limits of the endpoints that hash a password (login,
+# registration, password change and reset), see users.throttling
+AUTH_THROTTLE_CACHE_ALIAS = 'default'
+AUTH_THROTTLE_RATES = {
+    'auth_ip': config('AUTH_THROTTLE_IP_RATE', default='20/min'),
+    'auth_email': config('AUTH_THROTTLE_EMAIL_RATE', default='5/min'),
+    'auth_global': config('AUTH_THROTTLE_GLOBAL_RATE', default='50/s'),
+}
+
 # Password reset token lifetime
 DJANGO_REST_MULTITOKENAUTH_RESET_TOKEN_EXPIRY_TIME = 3  # in hours
@@ -3,6 +3,7 @@ import os
 
 
 DEBUG = True
+REQUEST_TIMING_HEADER = config('REQUEST_TIMING_HEADER', default=DEBUG, cast=bool)
 ALLOWED_HOSTS = ['localhost', '127.0.0.1', '0.0.0.0']
 
 MEDIA_URL = '/media/'
@@ -14,6 +14,10 @@ LOGGING = {
             'format': '{levelname} {message}',
             'style': '{',
         },
+        'message': {
+            'format': '{message}',
+            'style': '{',
+        },
     },
     'handlers': {
         'file': {
@@ -28,6 +32,12 @@ LOGGING = {
             'filename': f'{LOG_PATH}/logs/django_errors.log',  
             'formatter': 'verbose',
         },
+        'performance_file': {
+            'level': 'INFO',
+            'class': 'logging.FileHandler',
+            'filename': f'{LOG_PATH}/logs/performance.log',
+            'formatter': 'message',
+        },
         'console': {
             'class': 'logging.StreamHandler',
             'formatter': 'simple',
@@ -49,5 +59,15 @@ LOGGING = {
             'level': 'INFO',
             'propagate': False,
         },
+        'events': {
+            'handlers': ['file', 'console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'performance': {
+            'handlers': ['performance_file'],
+            'level': 'INFO',
+            'propagate': False,
+        },
     },
 }
@@ -0,0 +1,86 @@
+import threading
+
+import psycopg2
+from django.db import connection
+from rest_framework.test import APITestCase
+
+from config import metrics
+from config.db import pool as db_pool
+from config.db.pool import ConnectionPool, PoolTimeout
+
+
+class DatabasePoolTestCase(APITestCase):
+
+    def make_pool(self, **options):
+        defaults = dict(max_size=2, timeout=1, max_idle=300, max_lifetime=1800,
+                        health_check_interval=30)
+        pool = ConnectionPool(**{**defaults, **options})
+        params = connection.get_connection_params()
+        self.addCleanup(pool.close_idle)
+        return pool, lambda: psycopg2.connect(**params)
+
+    def test_released_connections_are_reused(self):
+        pool, connect = self.make_pool()
+        first = pool.checkout(connect)
+        pool.release(first)
+        self.assertIs(pool.checkout(connect), first)
+        second = pool.checkout(connect)
+        self.assertIsNot(second, first)
+        pool.release(first)
+        pool.release(second)
+
+        stats = pool.stats()
+        self.assertEqual((stats['created'], stats['checkouts'], stats['size'], stats['idle']),
+                         (2, 3, 2, 2))
+
+    def test_checkout_waits_then_times_out(self):
+        pool, connect = self.make_pool(max_size=1, timeout=0.2)
+        held = pool.checkout(connect)
+        with self.assertRaises(PoolTimeout):
+            pool.checkout(connect)
+
+        timer = threading.Timer(0.05, pool.release, args=(held,))
+        timer.start()
+        self.assertIs(pool.checkout(connect), held)
+        timer.join()
+        stats = pool.stats()
+        self.assertEqual((stats['waits'], stats['timeouts']), (2, 1))
+        pool.release(held)
+
+    def test_release_rolls_back_and_drops_broken_or_old_connections(self):
+        pool, connect = self.make_pool(health_check_interval=0)
+        conn = pool.checkout(connect)
+        conn.cursor().execute('SELECT 1')
+        pool.release(conn)
+        self.assertEqual(conn.get_transaction_status(), psycopg2.extensions.TRANSACTION_STATUS_IDLE)
+
+        # Broken while idle: the health check replaces it.
+        conn.close()
+        replacement = pool.checkout(connect)
+        self.assertIsNot(replacement, conn)
+        self.assertEqual(pool.stats()['health_check_failures'], 1)
+
+        pool.max_lifetime = 0
+        pool.release(replacement)
+        self.assertTrue(replacement.closed)
+        self.assertEqual(pool.stats()['size'], 0)
+
+    def test_pool_stats_are_exposed_as_metrics(self):
+        metrics.reset()
+        pool, connect = self.make_pool(max_size=1, timeout=0.05, name='test/pool')
+        held = pool.checkout(connect)
+        with self.assertRaises(PoolTimeout):
+            pool.checkout(connect)
+        pool.max_lifetime = 0
+        pool.release(held)
+
+        lines = metrics.exposition().splitlines()
+        self.assertIn('db_pool_checkout_duration_seconds_count{pool="test/pool"} 1', lines)
+        self.assertIn('db_pool_connections_in_use_bucket{pool="test/pool",le="1"} 1', lines)
+        for event in ('created', 'waits', 'timeouts', 'closed'):
+            self.assertIn('db_pool_events_total{{pool="test/pool",event="{}"}} 1'.format(event),
+                          lines)
+
+    def test_django_connections_go_through_the_pool(self):
+        self.assertEqual(connection.vendor, 'postgresql')
+        self.assertIn('default/{}'.format(connection.settings_dict['NAME']), db_pool.stats())
@@ -0,0 +1,127 @@
+import socket
+import time
+
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from config import metrics
+from config.celery import debug_task
+from config.tests import DUMMY_CACHE, LOCMEM_CACHE
+from recipe import cache as recipe_cache
+from recipe.models import Recipe, RecipeCategory
+from users.models import CustomUser
+
+
+@override_settings(CACHES=DUMMY_CACHE, METRICS_TOKEN='secret')
+class MetricsTestCase(APITestCase):
+
+    def setUp(self):
+        metrics.reset()
+        self.user = CustomUser.objects.create_user(
+            username='testuser', password='password123', email='testuser@example.com')
+        Recipe.objects.create(
+            title='Test Recipe', author=self.user, category=RecipeCategory.objects.create(name='Dinner'),
+            cook_time='00:30:00', ingredients='Eggs', procedure='Cook')
+
+    def get_metrics(self):
+        return self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+
+    def scrape(self):
+        response = self.get_metrics()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        return response.content.decode().splitlines()
+
+    def test_request_metrics(self):
+        self.client.get(reverse('recipe:recipe-list'))
+        self.client.get(reverse('recipe:recipe-list'))
+        self.client.get('/api/recipe/does-not-exist/')
+
+        lines = self.scrape()
+        self.assertIn('# TYPE http_request_duration_seconds histogram', lines)
+        self.assertIn(
+            'http_responses_total{view="recipe:recipe-list",method="GET",status="200"} 2', lines)
+        self.assertIn('http_responses_total{view="unmatched",method="GET",status="404"} 1', lines)
+        self.assertIn(
+            'http_request_duration_seconds_count{view="recipe:recipe-list",method="GET"} 2', lines)
+        self.assertIn('http_request_db_queries_count{view="recipe:recipe-list"} 2', lines)
+        self.assertNotIn('http_request_db_queries_bucket{view="recipe:recipe-list",le="0"} 2', lines)
+
+    def test_histogram_buckets_are_cumulative(self):
+        for value in (0.003, 0.3, 20):
+            metrics.HTTP_REQUEST_DURATION.observe(value, view='test', method='GET')
+
+        lines = self.scrape()
+        series = 'http_request_duration_seconds_{}{{view="test",method="GET"{}}} {}'
+        self.assertIn(series.format('bucket', ',le="0.005"', 1), lines)
+        self.assertIn(series.format('bucket', ',le="0.25"', 1), lines)
+        self.assertIn(series.format('bucket', ',le="0.5"', 2), lines)
+        self.assertIn(series.format('bucket', ',le="10"', 2), lines)
+        self.assertIn(series.format('bucket', ',le="+Inf"', 3), lines)
+        self.assertIn(series.format('count', '', 3), lines)
+        self.assertIn(series.format('sum', '', 20.303), lines)
+
+    def test_celery_task_metrics(self):
+        debug_task.apply()
+        debug_task.apply(args=('unexpected',))
+
+        lines = self.scrape()
+        self.assertIn('celery_tasks_total{task="config.celery.debug_task",state="SUCCESS"} 1', lines)
+        self.assertIn('celery_tasks_total{task="config.celery.debug_task",state="FAILURE"} 1', lines)
+        self.assertIn('celery_task_duration_seconds_count{task="config.celery.debug_task"} 2', lines)
+
+    @override_settings(CACHES=LOCMEM_CACHE)
+    def test_recipe_cache_metrics(self):
+        recipe_cache.get_cache().clear()
+        self.client.get(reverse('recipe:recipe-list'))
+        self.client.get(reverse('recipe:recipe-list'))
+
+        lines = self.scrape()
+        self.assertIn('recipe_cache_request_duration_seconds_count{result="miss"} 1', lines)
+        self.assertIn('recipe_cache_request_duration_seconds_count{result="hit"} 1', lines)
+
+    def test_metrics_token(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code,
+                         status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.get_metrics().status_code, status.HTTP_200_OK)
+
+    @override_settings(METRICS_TOKEN='')
+    def test_metrics_without_token_are_served_only_in_debug(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code,
+                         status.HTTP_403_FORBIDDEN)
+        with override_settings(DEBUG=True):
+            self.assertEqual(self.client.get(reverse('metrics')).status_code,
+                             status.HTTP_200_OK)
+
+    def test_metric_must_implement_samples(self):
+        with self.assertRaises(TypeError):
+            metrics.Metric('incomplete_total', 'Lacks samples()')
+
+    @override_settings(METRICS_REDIS_URL='redis://localhost:1/0')
+    def test_requests_are_served_without_redis(self):
+        with self.assertLogs('performance', 'WARNING'):
+            response = self.client.get(reverse('recipe:recipe-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.get_metrics().status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    def test_updates_are_dropped_when_redis_hangs(self):
+        # Accepts connections but never answers them.
+        server = socket.socket()
+        server.bind(('127.0.0.1', 0))
+        server.listen(1)
+        self.addCleanup(server.close)
+        url = 'redis://127.0.0.1:{}/0'.format(server.getsockname()[1])
+        with override_settings(METRICS_REDIS_URL=url, METRICS_REDIS_TIMEOUT=0.1), \
+                self.assertLogs('performance', 'WARNING'):
+            started = time.perf_counter()
+            metrics.HTTP_RESPONSES.inc(view='test', method='GET', status=200)
+            self.assertLess(time.perf_counter() - started, 1)
+
+    @override_settings(METRICS_ENABLED=False)
+    def test_metrics_can_be_disabled(self):
+        self.client.get(reverse('recipe:recipe-list'))
+        self.assertNotIn(
+            'http_responses_total{view="recipe:recipe-list",method="GET",status="200"} 1',
+            self.scrape())
@@ -0,0 +1,15 @@
+import asyncio
+
+from django.test import SimpleTestCase
+
+from config.middleware import WhiteNoiseMiddleware
+
+
+class WhiteNoiseMiddlewareTestCase(SimpleTestCase):
+
+    def test_whitenoise_middleware_is_async_capable(self):
+        async def get_response(request):
+            pass
+
+        self.assertTrue(asyncio.iscoroutinefunction(WhiteNoiseMiddleware(get_response)))
+        self.assertFalse(asyncio.iscoroutinefunction(WhiteNoiseMiddleware(lambda request: None)))
@@ -0,0 +1,152 @@
+import os
+from unittest import skipUnless
+
+from django.core import mail
+from django.db import connections, router
+from django.http import HttpResponse
+from django.test import RequestFactory, TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient, APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from config.db.routing import ReplicaRouter, use_replicas
+from config.middleware import ReplicaRoutingMiddleware
+from config.tests import DUMMY_CACHE, LOCMEM_CACHE
+from recipe import cache as recipe_cache
+from recipe.models import Recipe, RecipeCategory
+from users.models import CustomUser
+from users.tasks import send_like_count_digest_chunk
+
+
+@override_settings(DATABASE_REPLICAS=['replica_a', 'replica_b'], CACHES=LOCMEM_CACHE,
+                   REPLICA_STICKY_SECONDS=10)
+class ReplicaRouterTestCase(APITestCase):
+
+    def test_reads_use_replicas_only_inside_routing_blocks(self):
+        routes = ReplicaRouter()
+        self.assertEqual(routes.db_for_read(Recipe), 'default')
+        with use_replicas():
+            replica = routes.db_for_read(Recipe)
+            self.assertIn(replica, ['replica_a', 'replica_b'])
+            self.assertEqual(routes.db_for_read(CustomUser), replica)
+            self.assertEqual(routes.db_for_write(Recipe), 'default')
+            # Reads its own writes from then on.
+            self.assertEqual(routes.db_for_read(Recipe), 'default')
+        with use_replicas(enabled=False):
+            self.assertEqual(routes.db_for_read(Recipe), 'default')
+
+    def call(self, request):
+        reads = []
+
+        def get_response(request):
+            reads.append(router.db_for_read(Recipe))
+            if request.method == 'POST':
+                router.db_for_write(Recipe)
+            return HttpResponse()
+
+        response = ReplicaRoutingMiddleware(get_response)(request)
+        return reads[0], response
+
+    def test_clients_read_from_the_primary_after_writing(self):
+        factory = RequestFactory()
+        token = {'HTTP_AUTHORIZATION': 'Bearer abc'}
+        self.assertIn(self.call(factory.get('/', **token))[0], ['replica_a', 'replica_b'])
+
+        db, response = self.call(factory.post('/', **token))
+        self.assertEqual(db, 'default')
+        self.assertEqual(response.cookies['db_primary']['max-age'], 10)
+
+        # Pinned by the token, or by the cookie for clients without one.
+        self.assertEqual(self.call(factory.get('/', **token))[0], 'default')
+        request = factory.get('/')
+        request.COOKIES['db_primary'] = '1'
+        self.assertEqual(self.call(request)[0], 'default')
+
+        self.assertIn(self.call(factory.get('/'))[0], ['replica_a', 'replica_b'])
+        self.assertIn(self.call(factory.get('/', HTTP_AUTHORIZATION='Bearer other'))[0],
+                      ['replica_a', 'replica_b'])
+
+
+REPLICA_TEST_DB_HOST = os.environ.get('REPLICA_TEST_DB_HOST')
+
+
+@skipUnless(REPLICA_TEST_DB_HOST,
+            'REPLICA_TEST_DB_HOST ("host:port" of a second local PostgreSQL) is not set')
+@override_settings(DATABASE_REPLICAS=['replica'], RECIPE_CACHE_ALIAS='recipes',
+                   CACHES={**LOCMEM_CACHE, 'recipes': DUMMY_CACHE['default']})
+class ReplicaRoutingTestCase(TransactionTestCase):
+    # The replica is a separate database on a second instance, migrated but
+    # never replicated to: a replica lagging for ever.
+    databases = {'default', 'replica'}
+    client_class = APIClient
+
+    @classmethod
+    def setUpClass(cls):
+        host, _, port = REPLICA_TEST_DB_HOST.partition(':')
+        connections.databases['replica'] = dict(
+            connections['default'].settings_dict, HOST=host, PORT=port,
+            TEST={'NAME': 'test_recipe_replica'})
+        cls.replica_name = connections['replica'].settings_dict['NAME']
+        with override_settings(DATABASE_REPLICAS=['replica']):
+            connections['replica'].creation.create_test_db(
+                verbosity=0, autoclobber=True, serialize=False)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['replica'].creation.destroy_test_db(cls.replica_name, verbosity=0)
+        del connections['replica']
+        del connections.databases['replica']
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            username='testuser', password='password123', email='testuser@example.com')
+        # bulk_create: model signals would write to the primary.
+        CustomUser.objects.using('replica').bulk_create([CustomUser(
+            pk=self.user.pk, username='testuser', email='testuser@example.com')])
+        self.recipe = Recipe.objects.create(
+            title='Primary Recipe', author=self.user, category=RecipeCategory.objects.create(name='Dinner'),
+            cook_time='00:30:00', ingredients='Eggs', procedure='Cook')
+        token = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer {}'.format(token))
+
+    def titles(self, client):
+        response = client.get(reverse('recipe:recipe-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [recipe['title'] for recipe in response.data['results']]
+
+    def test_reads_follow_writes_to_the_primary(self):
+        self.assertEqual(self.titles(self.client), [])
+
+        response = self.client.post(reverse('recipe:recipe-like', kwargs={'pk': self.recipe.pk}))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.titles(self.client), ['Primary Recipe'])
+        # Still pinned by the token without the cookie.
+        self.client.cookies.clear()
+        self.assertEqual(self.titles(self.client), ['Primary Recipe'])
+
+        self.assertEqual(self.titles(APIClient()), [])
+
+    @override_settings(CACHES={**LOCMEM_CACHE, 'recipes': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'recipes'}})
+    def test_replica_reads_after_a_write_are_not_cached(self):
+        recipe_cache.get_cache().clear()
+        self.client.post(reverse('recipe:recipe-like', kwargs={'pk': self.recipe.pk}))
+
+        # Another client reads the lagging replica right after the write...
+        self.assertEqual(self.titles(APIClient()), [])
+        # ...without leaving its stale page for the writer.
+        self.assertEqual(self.titles(self.client), ['Primary Recipe'])
+
+    def test_read_only_tasks_read_from_the_replica(self):
+        self.assertEqual(send_like_count_digest_chunk([self.user.pk]), 0)
+        category = RecipeCategory.objects.using('replica').bulk_create([
+            RecipeCategory(pk=self.recipe.category_id, name='Dinner')])[0]
+        Recipe.objects.using('replica').bulk_create([Recipe(
+            pk=self.recipe.pk, title='Replica Recipe', author_id=self.user.pk,
+            category_id=category.pk, cook_time='00:30:00', ingredients='Eggs',
+            procedure='Cook')])
+        self.assertEqual(send_like_count_digest_chunk([self.user.pk]), 1)
+        self.assertIn('Replica Recipe', mail.outbox[0].body)
@@ -0,0 +1,90 @@
+import json
+from unittest import mock
+
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from config import timing
+from config.tests import DUMMY_CACHE
+from recipe.models import Recipe, RecipeCategory
+from recipe.serializers import RecipeSerializer
+from users.models import CustomUser
+
+
+@override_settings(CACHES=DUMMY_CACHE, REQUEST_TIMING_HEADER=True,
+                   REQUEST_TIMING_LOG_SAMPLE_RATE=0, REQUEST_TIMING_SLOW_MS=60000)
+class RequestTimingTestCase(APITestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            username='testuser', password='password123', email='testuser@example.com')
+        category = RecipeCategory.objects.create(name='Dinner')
+        for number in range(3):
+            Recipe.objects.create(
+                title='Recipe {}'.format(number), author=self.user, category=category,
+                cook_time='00:30:00', ingredients='Eggs', procedure='Cook')
+        self.url = reverse('recipe:recipe-list')
+
+    def server_timing(self, response):
+        return dict(
+            (metric.split(';')[0], metric) for metric in response['Server-Timing'].split(', '))
+
+    def test_server_timing_header(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        metrics = self.server_timing(response)
+        self.assertEqual(set(metrics), {'total', 'view', 'db', 'serializer', 'render'})
+        self.assertIn('desc="{} queries"'.format(len(queries)), metrics['db'])
+        self.assertNotEqual(metrics['serializer'], 'serializer;dur=0.0')
+
+    @override_settings(REQUEST_TIMING_HEADER=False)
+    def test_server_timing_header_can_be_disabled(self):
+        response = self.client.get(self.url)
+        self.assertNotIn('Server-Timing', response)
+
+    @override_settings(REQUEST_TIMING_LOG_SAMPLE_RATE=1)
+    def test_sampled_log_line(self):
+        with self.assertLogs('performance', 'INFO') as logs:
+            self.client.get(self.url)
+
+        self.assertEqual(len(logs.records), 1)
+        self.assertEqual(logs.records[0].levelname, 'INFO')
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'recipe:recipe-list')
+        self.assertEqual(record['status'], 200)
+        self.assertGreater(record['queries'], 0)
+        self.assertNotIn('sql', record)
+
+    def test_unsampled_requests_are_not_logged(self):
+        with mock.patch('config.middleware.logger') as logger:
+            self.client.get(self.url)
+        logger.info.assert_not_called()
+        logger.warning.assert_not_called()
+
+    @override_settings(REQUEST_TIMING_SLOW_MS=0, REQUEST_TIMING_MAX_QUERIES=1)
+    def test_slow_requests_are_logged_with_their_sql(self):
+        with self.assertLogs('performance', 'WARNING') as logs:
+            self.client.get(self.url)
+
+        record = json.loads(logs.records[0].getMessage())
+        self.assertGreater(record['queries'], 1)
+        self.assertEqual(len(record['sql']), 1)
+        self.assertIn('SELECT', record['sql'][0]['sql'])
+
+    def test_nested_timed_blocks_count_once(self):
+        with timing.collect(10) as timings:
+            with mock.patch.object(timings, 'add', wraps=timings.add) as add:
+                with timing.timed('serializer'):
+                    with timing.timed('serializer'):
+                        pass
+            self.assertEqual(add.call_count, 1)
+            RecipeSerializer(Recipe.objects.all(), many=True).data
+        self.assertIn('serializer', timings.durations)
+        self.assertGreater(timings.query_count, 0)
+        self.assertIsNone(timing.current())
@@ -0,0 +1,115 @@
+"""
+Per-request timings: SQL query count and time, serializer and render time.
+
+RequestTimingMiddleware (config.middleware) collects a RequestTimings for
+each request in a context variable, and the instrumentation points below
+add to it: record_query, an execute wrapper installed on every connection
+of the config.db backend, the serializers' data property, and the
+rendering of async views. Context variables follow the request into the
+threads of sync_to_async, so the async views are measured too.
+"""
+import collections
+import contextvars
+import time
+from contextlib import contextmanager
+
+_current = contextvars.ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    """
+    What one request spent its time on. Durations are in seconds and
+    overlap: the queries run while serializing count as both 'db' and
+    'serializer' time.
+    """
+
+    def __init__(self, max_queries):
+        self.started = time.perf_counter()
+        self.durations = collections.defaultdict(float)
+        self.query_count = 0
+        # (sql, seconds) of the first max_queries queries, for the slow
+        # request log. Parameters are left out as they can hold credentials.
+        self.queries = []
+        self.max_queries = max_queries
+        self.active = set()
+
+    def add(self, name, seconds):
+        self.durations[name] += seconds
+
+    def add_query(self, sql, seconds):
+        self.query_count += 1
+        self.durations['db'] += seconds
+        if len(self.queries) < self.max_queries:
+            self.queries.append((sql, seconds))
+
+
+def current():
+    """
+    Returns the RequestTimings of the request being served, or None.
+    """
+    return _current.get()
+
+
+@contextmanager
+def collect(max_queries):
+    """
+    Collects the timings of the block into the RequestTimings it yields.
+    """
+    timings = RequestTimings(max_queries)
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def timed(name):
+    """
+    Adds the duration of the block to name. Nested blocks of the same name,
+    e.g. a serializer serializing another one, are only counted once.
+    """
+    timings = _current.get()
+    if timings is None or name in timings.active:
+        yield
+        return
+    timings.active.add(name)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.active.discard(name)
+        timings.add(name, time.perf_counter() - started)
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Execute wrapper counting the queries of the request being timed.
+    """
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.add_query(sql, time.perf_counter() - started)
+
+
+def instrument_serializers():
+    """
+    Times the serializers' data property, where DRF serializes, as
+    'serializer'. Safe to call more than once.
+    """
+    from rest_framework.serializers import BaseSerializer
+
+    data = BaseSerializer.data
+    if getattr(data.fget, 'timed', False):
+        return
+
+    def timed_data(self):
+        with timed('serializer'):
+            return data.fget(self)
+
+    timed_data.timed = True
+    BaseSerializer.data = property(timed_data)
@@ -4,13 +4,16 @@ from django.conf import settings
 from django.conf.urls.static import static
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
 
+from config.views import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/user/', include('users.urls', namespace='users')),
     path('api/recipe/', include('recipe.urls', namespace='recipe')),
     path('api-auth/', include('rest_framework.urls', namespace='rest_framework')),
     path('api/user/password/reset/',
-         include('django_rest_passwordreset.urls', namespace='password_reset')),
+         include('users.password_reset_urls', namespace='password_reset')),
+    path('metrics', metrics_view, name='metrics'),
 ]
 
 # Media Assets
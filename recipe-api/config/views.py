@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.http import require_GET
+from redis.exceptions import RedisError
+
+from config import metrics
+
+
+@require_GET
+def metrics_view(request):
+    """
+    The metrics of config.metrics in the Prometheus text format. Scrapers
+    must send METRICS_TOKEN as a Bearer token. Without a token the metrics
+    are only served when DEBUG is on.
+    """
+    if not settings.METRICS_TOKEN:
+        if not settings.DEBUG:
+            return HttpResponse(status=403)
+    elif not constant_time_compare(
+            request.META.get('HTTP_AUTHORIZATION', ''),
+            'Bearer {}'.format(settings.METRICS_TOKEN)):
+        return HttpResponse(status=401)
+    try:
+        body = metrics.exposition()
+    except RedisError:
+        return HttpResponse('Metrics unavailable\n', status=503, content_type='text/plain')
+    return HttpResponse(body, content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,18 @@
+from django.db import models
+
+
+class OutboxEvent(models.Model):
+    """
+    Domain event written in the same transaction as the change it
+    describes, and delivered to its handlers by the drain_outbox task.
+    """
+    topic = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        ordering = ('id', )
+
+    def __str__(self):
+        return self.topic
@@ -0,0 +1,110 @@
+import logging
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from config import metrics
+
+from .models import OutboxEvent
+
+logger = logging.getLogger("events")
+
+_handlers = defaultdict(list)
+
+
+def publish(topic, **payload):
+    """
+    Records a domain event. Call it inside the transaction of the change
+    the event describes, so the event exists if and only if it commits.
+
+    Events are recorded whether or not their topic has handlers in this
+    process; the drain marks the events of topics without handlers done.
+    """
+    return OutboxEvent.objects.create(topic=topic, payload=payload)
+
+
+def publish_many(topic, payloads):
+    """
+    Records one event per payload with a single INSERT.
+    """
+    return OutboxEvent.objects.bulk_create(
+        [OutboxEvent(topic=topic, payload=payload) for payload in payloads])
+
+
+def handler(topic):
+    """
+    Registers the decorated function for topic. Handlers receive the
+    payloads of a whole batch of events at once.
+    """
+    def decorator(func):
+        _handlers[topic].append(func)
+        return func
+    return decorator
+
+
+def get_handlers(topic):
+    return list(_handlers.get(topic, ()))
+
+
+def drain_batch(batch_size):
+    """
+    Delivers the oldest pending events and deletes the delivered ones,
+    along with the events of topics that have no handler. Rows are locked
+    with SKIP LOCKED so several drains can run side by side. Events of a topic whose handler fails stay in the outbox with
+    their attempt count raised, until OUTBOX_MAX_ATTEMPTS is reached.
+
+    Returns the number of events read.
+    """
+    with transaction.atomic():
+        events = list(
+            OutboxEvent.objects
+            .filter(attempts__lt=settings.OUTBOX_MAX_ATTEMPTS)
+            .select_for_update(skip_locked=True)
+            .order_by('id')[:batch_size]
+        )
+        by_topic = defaultdict(list)
+        for event in events:
+            by_topic[event.topic].append(event)
+
+        delivered, failed = [], []
+        for topic, topic_events in by_topic.items():
+            ids = [event.id for event in topic_events]
+            try:
+                with transaction.atomic():
+                    for func in get_handlers(topic):
+                        func([event.payload for event in topic_events])
+            except Exception:
+                logger.exception('Outbox handler failed for %s', topic)
+                failed.extend(ids)
+            else:
+                delivered.extend(ids)
+
+        OutboxEvent.objects.filter(id__in=delivered).delete()
+        OutboxEvent.objects.filter(id__in=failed).update(
+            attempts=F('attempts') + 1)
+
+    failed = set(failed)
+    dead = Counter(event.topic for event in events
+                   if event.id in failed and event.attempts + 1 >= settings.OUTBOX_MAX_ATTEMPTS)
+    for topic, count in dead.items():
+        logger.error('%s %s events failed %s times and will not be retried',
+                     count, topic, settings.OUTBOX_MAX_ATTEMPTS)
+        metrics.OUTBOX_DEAD_LETTERS.inc(count, topic=topic)
+    return len(events)
+
+
+def prune_dead_letters():
+    """
+    Deletes the events that reached OUTBOX_MAX_ATTEMPTS more than
+    OUTBOX_DEAD_LETTER_DAYS ago, leaving recent ones to be inspected.
+
+    Returns the number of events deleted.
+    """
+    cutoff = timezone.now() - timedelta(days=settings.OUTBOX_DEAD_LETTER_DAYS)
+    deleted, _ = OutboxEvent.objects.filter(
+        attempts__gte=settings.OUTBOX_MAX_ATTEMPTS, created_at__lt=cutoff).delete()
+    return deleted
@@ -0,0 +1,35 @@
+from celery import shared_task
+from django.conf import settings
+
+from .outbox import drain_batch, prune_dead_letters
+
+
+@shared_task
+def drain_outbox():
+    """
+    Delivers pending outbox events to their handlers in batches of
+    OUTBOX_BATCH_SIZE, until the outbox is empty or OUTBOX_MAX_BATCHES
+    batches have been processed in this run.
+
+    Returns:
+        The number of events read.
+    """
+    total = 0
+    for _ in range(settings.OUTBOX_MAX_BATCHES):
+        count = drain_batch(settings.OUTBOX_BATCH_SIZE)
+        total += count
+        if count < settings.OUTBOX_BATCH_SIZE:
+            break
+    return total
+
+
+@shared_task
+def prune_outbox():
+    """
+    Deletes the outbox events that exhausted their delivery attempts more
+    than OUTBOX_DEAD_LETTER_DAYS ago.
+
+    Returns:
+        The number of events deleted.
+    """
+    return prune_dead_letters()
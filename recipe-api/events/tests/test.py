@@ -0,0 +1,105 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from events import outbox
+from events.models import OutboxEvent
+from events.tasks import drain_outbox, prune_outbox
+from users.models import CustomUser
+
+
+class OutboxTestCase(TestCase):
+
+    def setUp(self):
+        self.received = []
+        patcher = mock.patch.dict(outbox._handlers, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_drain_delivers_batches_and_deletes_events(self):
+        outbox.handler('test.topic')(self.received.append)
+        for i in range(5):
+            outbox.publish('test.topic', number=i)
+
+        with override_settings(OUTBOX_BATCH_SIZE=2):
+            self.assertEqual(drain_outbox(), 5)
+
+        self.assertEqual(self.received, [
+            [{'number': 0}, {'number': 1}],
+            [{'number': 2}, {'number': 3}],
+            [{'number': 4}],
+        ])
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    def test_failing_handler_keeps_its_events_only(self):
+        def broken(payloads):
+            raise RuntimeError('boom')
+
+        outbox.handler('test.broken')(broken)
+        outbox.handler('test.topic')(self.received.append)
+        outbox.publish('test.broken', number=1)
+        outbox.publish('test.topic', number=2)
+
+        drain_outbox()
+
+        self.assertEqual(self.received, [[{'number': 2}]])
+        event = OutboxEvent.objects.get()
+        self.assertEqual(event.topic, 'test.broken')
+        self.assertEqual(event.attempts, 1)
+
+    @override_settings(OUTBOX_MAX_ATTEMPTS=1)
+    def test_events_past_max_attempts_are_left_aside(self):
+        outbox.handler('test.topic')(self.received.append)
+        OutboxEvent.objects.create(topic='test.topic', attempts=1)
+
+        self.assertEqual(drain_outbox(), 0)
+        self.assertEqual(self.received, [])
+
+    def test_events_without_handlers_are_recorded_then_marked_done(self):
+        outbox.publish('test.unhandled')
+        outbox.publish_many('test.unhandled', [{}, {}])
+        self.assertEqual(OutboxEvent.objects.filter(topic='test.unhandled').count(), 3)
+
+        self.assertEqual(drain_outbox(), 3)
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    @override_settings(OUTBOX_MAX_ATTEMPTS=2)
+    def test_dead_letters_are_reported_and_pruned(self):
+        def broken(payloads):
+            raise RuntimeError('boom')
+
+        outbox.handler('test.broken')(broken)
+        outbox.publish('test.broken', number=1)
+        with self.assertLogs('events', 'ERROR') as logs:
+            drain_outbox()
+        self.assertEqual(len(logs.records), 1)
+        with self.assertLogs('events', 'ERROR') as logs:
+            drain_outbox()
+        self.assertIn('1 test.broken events failed 2 times', logs.output[-1])
+
+        self.assertEqual(prune_outbox(), 0)
+        OutboxEvent.objects.update(created_at=timezone.now() - timedelta(days=8))
+        self.assertEqual(prune_outbox(), 1)
+        self.assertFalse(OutboxEvent.objects.exists())
+
+
+class LoginEventTestCase(APITestCase):
+
+    def test_login_records_event_and_drain_updates_last_login(self):
+        user = CustomUser.objects.create_user(
+            username='testuser', password='password123', email='testuser@example.com')
+        response = self.client.post(reverse('users:login-user'), {
+            'email': 'testuser@example.com',
+            'password': 'password123',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(OutboxEvent.objects.get().topic, 'user.logged_in')
+        self.assertIsNone(CustomUser.objects.get(pk=user.pk).last_login)
+
+        drain_outbox()
+
+        self.assertIsNotNone(CustomUser.objects.get(pk=user.pk).last_login)
@@ -0,0 +1,73 @@
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, close_old_connections
+
+from config import timing
+
+_executor = None
+
+
+def get_executor():
+    """
+    The threads the async views run on, as many as the process's pooled
+    database connections: with more, the extra threads would wait
+    DB_POOL_TIMEOUT for a connection and fail, instead of queueing here.
+    """
+    global _executor
+    if _executor is None:
+        pool = settings.DATABASES[DEFAULT_DB_ALIAS].get('POOL') or {}
+        _executor = ThreadPoolExecutor(
+            max_workers=pool.get('MAX_SIZE', 10), thread_name_prefix='async-view')
+    return _executor
+
+
+def _run(view, request, *args, **kwargs):
+    # Worker threads do not see Django's request_started/request_finished
+    # connection handling, which runs on the event loop side.
+    close_old_connections()
+    try:
+        response = view(request, *args, **kwargs)
+        # Render here too, or Django would render on its single
+        # thread-sensitive executor.
+        if callable(getattr(response, 'render', None)):
+            with timing.timed('render'):
+                response = response.render()
+        return response
+    finally:
+        close_old_connections()
+
+
+def async_view(view_class, **initkwargs):
+    """
+    Returns an async view serving view_class.
+
+    DRF 3.12 and the Django 3.2 ORM are sync only, so the whole DRF view
+    (queries, serialization and rendering) runs with
+    sync_to_async(thread_sensitive=False) on the get_executor() threads.
+    Under ASGI that keeps slow clients on the event loop instead of a
+    worker process, and lets several requests wait on the database at once
+    instead of queueing on the one thread Django gives sync views.
+    """
+    view = view_class.as_view(**initkwargs)
+    run = sync_to_async(functools.partial(_run, view), thread_sensitive=False,
+                        executor=get_executor())
+
+    # Keeps cls, initkwargs and csrf_exempt for the schema and middleware.
+    @functools.wraps(view)
+    async def async_view_func(request, *args, **kwargs):
+        return await run(request, *args, **kwargs)
+
+    return async_view_func
+
+
+def as_view(view_class, **initkwargs):
+    """
+    The view to route for a hot read endpoint: the async variant when the
+    process serves ASGI (ASYNC_VIEWS), the plain DRF view under WSGI.
+    """
+    if settings.ASYNC_VIEWS:
+        return async_view(view_class, **initkwargs)
+    return view_class.as_view(**initkwargs)
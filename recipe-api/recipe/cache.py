@@ -0,0 +1,284 @@
+import hashlib
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework import status
+from rest_framework.response import Response
+
+from config import metrics
+from config.db import routing
+
+from .conditional import make_etag
+
+KEY_PREFIX = 'recipe-cache'
+GLOBAL_NAMESPACE = 'all'
+LIST_NAMESPACE = 'list'
+STATS = ('hit', 'miss', 'rebuild')
+
+
+def get_cache():
+    return caches[settings.RECIPE_CACHE_ALIAS]
+
+
+def recipe_namespace(pk):
+    return 'recipe:{}'.format(pk)
+
+
+def _version_key(namespace):
+    return '{}:version:{}'.format(KEY_PREFIX, namespace)
+
+
+def _bumped_key(namespace):
+    return '{}:bumped:{}'.format(KEY_PREFIX, namespace)
+
+
+def _changed_key(namespace):
+    return '{}:changed:{}'.format(KEY_PREFIX, namespace)
+
+
+def _stat_key(name):
+    return '{}:stats:{}'.format(KEY_PREFIX, name)
+
+
+def _incr(key, start=1):
+    cache = get_cache()
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # The key does not exist yet (or was evicted), start it at start.
+        if cache.add(key, start, timeout=None):
+            return start
+        return cache.incr(key)
+
+
+def _initial_version():
+    # Counters start at the current time in milliseconds rather than 0, so
+    # one lost to eviction does not go back to a value it already had.
+    return int(time.time() * 1000)
+
+
+def record(name):
+    _incr(_stat_key(name))
+
+
+def get_stats():
+    """
+    Returns the hit, miss and rebuild counters of the recipe cache.
+    """
+    values = get_cache().get_many([_stat_key(name) for name in STATS]) or {}
+    return {name: values.get(_stat_key(name), 0) for name in STATS}
+
+
+def _bump(*namespaces):
+    # Each new version is stored with the time it was made, the
+    # Last-Modified of the responses built under it (see _changed_at).
+    changed_at = time.time()
+    get_cache().set_many({
+        _changed_key(namespace): (_incr(_version_key(namespace), start=_initial_version()), changed_at)
+        for namespace in namespaces
+    }, timeout=None)
+    if settings.DATABASE_REPLICAS:
+        # Replicas may lag behind the change for REPLICA_STICKY_SECONDS.
+        get_cache().set_many({_bumped_key(namespace): 1 for namespace in namespaces},
+                             timeout=settings.REPLICA_STICKY_SECONDS)
+
+
+def _may_be_stale(namespace):
+    """
+    Whether data just read for namespace may predate its last change:
+    when it was read from a replica within REPLICA_STICKY_SECONDS of an
+    invalidation. Storing it would serve the old data for the whole cache
+    timeout, even to the writer, whose reads are pinned to the primary.
+    """
+    if not routing.reading_from_replica():
+        return False
+    keys = [_bumped_key(GLOBAL_NAMESPACE), _bumped_key(namespace)]
+    return bool(get_cache().get_many(keys))
+
+
+def _versions(namespace):
+    """
+    Returns the global and namespace version counters, or None when the
+    cache cannot provide them.
+    """
+    cache = get_cache()
+    keys = [_version_key(GLOBAL_NAMESPACE), _version_key(namespace)]
+    versions = cache.get_many(keys) or {}
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        start = _initial_version()
+        for key in missing:
+            cache.add(key, start, timeout=None)
+        versions = cache.get_many(keys) or {}
+        if len(versions) < len(keys):
+            return None
+    return versions[keys[0]], versions[keys[1]]
+
+
+def _changed_at(namespace, versions):
+    """
+    Returns when the latest of the global and namespace versions was made,
+    as a datetime. A version stored without its time, because it was
+    evicted or overwritten by a concurrent bump, is taken to be made now,
+    which can only make clients fetch data they already have.
+    """
+    cache = get_cache()
+    keys = dict(zip([_changed_key(GLOBAL_NAMESPACE), _changed_key(namespace)], versions))
+    stored = cache.get_many(list(keys)) or {}
+    now = time.time()
+    times = []
+    for key, version in keys.items():
+        changed = stored.get(key)
+        if changed is None or changed[0] != version:
+            changed = (version, now)
+            cache.set(key, changed, timeout=None)
+        times.append(changed[1])
+    return datetime.fromtimestamp(max(times), tz=timezone.utc)
+
+
+def invalidate_recipes(*pks):
+    """
+    Invalidates every cached list plus the detail entries of the given
+    recipes by bumping their version counters. Entries written under the
+    old versions are never read again and simply expire.
+
+    The bump is repeated once the surrounding transaction commits, so a
+    reader that rebuilt an entry from pre-commit data cannot leave it in
+    the cache.
+    """
+    namespaces = [LIST_NAMESPACE] + [recipe_namespace(pk) for pk in pks]
+    _bump(*namespaces)
+    transaction.on_commit(lambda: _bump(*namespaces))
+
+
+def invalidate_all():
+    """
+    Invalidates every cached recipe response, e.g. after a category rename.
+    """
+    _bump(GLOBAL_NAMESPACE)
+    transaction.on_commit(lambda: _bump(GLOBAL_NAMESPACE))
+
+
+def _digest(request):
+    params = sorted(request.query_params.lists())
+    raw = '{}|{}|{}'.format(request.get_host(), request.path, params)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def build_key(request, namespace):
+    versions = _versions(namespace) or (0, 0)
+    return '{}:{}:{}.{}:{}'.format(
+        KEY_PREFIX, namespace, versions[0], versions[1], _digest(request))
+
+
+def _wait_for(cache, key):
+    deadline = time.monotonic() + settings.RECIPE_CACHE_LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        data = cache.get(key)
+        if data is not None:
+            return data
+    return None
+
+
+def cached_response(request, namespace, build):
+    """
+    Serves the response data for request from the cache, calling build()
+    on a miss. Only one caller rebuilds a given entry at a time, the
+    others wait briefly for it to appear instead of hitting the database.
+    """
+    started = time.perf_counter()
+    cache = get_cache()
+    key = build_key(request, namespace)
+
+    data = cache.get(key)
+    if data is not None:
+        record('hit')
+        metrics.RECIPE_CACHE_DURATION.observe(time.perf_counter() - started, result='hit')
+        return Response(data, headers={'X-Cache': 'HIT'})
+    record('miss')
+
+    lock_key = '{}:lock'.format(key)
+    acquired = cache.add(lock_key, 1, timeout=settings.RECIPE_CACHE_LOCK_TIMEOUT)
+    if acquired is False:
+        # Another worker holds the lock. django-redis returns None rather
+        # than False when Redis is unreachable, in which case waiting is
+        # pointless and the response is built directly.
+        data = _wait_for(cache, key)
+        if data is not None:
+            record('hit')
+            metrics.RECIPE_CACHE_DURATION.observe(time.perf_counter() - started, result='hit')
+            return Response(data, headers={'X-Cache': 'HIT'})
+
+    try:
+        response = build()
+        if acquired and response.status_code == status.HTTP_200_OK \
+                and not _may_be_stale(namespace):
+            cache.set(key, response.data, timeout=settings.RECIPE_CACHE_TIMEOUT)
+            record('rebuild')
+    finally:
+        if acquired:
+            cache.delete(lock_key)
+    response['X-Cache'] = 'MISS'
+    metrics.RECIPE_CACHE_DURATION.observe(time.perf_counter() - started, result='miss')
+    return response
+
+
+def cached_validators(request, namespace, compute):
+    """
+    Returns the (etag, last_modified) validators of request, calling
+    compute() on a miss. They are versioned like the cached responses, so
+    repeated conditional requests cost a single cache read.
+    """
+    cache = get_cache()
+    key = '{}:validators'.format(build_key(request, namespace))
+    validators = cache.get(key)
+    if validators is None:
+        validators = compute()
+        if not _may_be_stale(namespace):
+            cache.set(key, validators, timeout=settings.RECIPE_CACHE_TIMEOUT)
+    return validators
+
+
+def versioned_validators(request, namespace):
+    """
+    Returns the (etag, last_modified) validators of request derived from
+    the cache versions of namespace instead of the data: every change
+    invalidating the namespace makes a new version, with a new tag and
+    modification time, so checking them costs no query. Returns None when
+    the cache is unavailable.
+    """
+    versions = _versions(namespace)
+    if versions is None:
+        return None
+    return (make_etag(namespace, versions[0], versions[1], _digest(request)),
+            _changed_at(namespace, versions))
+
+
+class CachedRetrieveMixin:
+    """
+    Serves GET requests of a recipe read view through the recipe cache.
+    The representation does not depend on the reader, so one entry is
+    shared by everybody allowed to see it.
+
+    Views combined with ConditionalRequestMixin implement
+    compute_validators(), whose result is cached the same way.
+    """
+
+    def get_cache_namespace(self):
+        if self.lookup_field in self.kwargs:
+            return recipe_namespace(self.kwargs[self.lookup_field])
+        return LIST_NAMESPACE
+
+    def get_validators(self):
+        return cached_validators(
+            self.request, self.get_cache_namespace(), self.compute_validators)
+
+    def get(self, request, *args, **kwargs):
+        parent = super()
+        return cached_response(
+            request, self.get_cache_namespace(),
+            lambda: parent.get(request, *args, **kwargs))
@@ -0,0 +1,83 @@
+import calendar
+import hashlib
+
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework import status
+
+
+def make_etag(*parts):
+    """
+    Builds a strong entity tag from the values a representation depends on.
+    """
+    raw = '|'.join(str(part) for part in parts)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def _timestamp(last_modified):
+    return calendar.timegm(last_modified.utctimetuple()) if last_modified else None
+
+
+def set_validators(response, etag, last_modified):
+    if etag:
+        response['ETag'] = quote_etag(etag)
+    if last_modified:
+        response['Last-Modified'] = http_date(_timestamp(last_modified))
+    return response
+
+
+class ConditionalRequestMixin:
+    """
+    Answers If-None-Match / If-Modified-Since GETs with 304 Not Modified and
+    rejects PUT/PATCH whose If-Match (or If-Unmodified-Since) is stale with
+    412 Precondition Failed.
+
+    Views provide compute_validators(), returning the (etag, last_modified)
+    pair of the current representation, or (None, None) if it does not
+    exist. It is evaluated before the payload is loaded or serialized, so
+    it should only read what the validators need. GETs use
+    get_validators() instead, which may serve them from a cache (see
+    CachedRetrieveMixin).
+
+    Updates lock the row with lock_object() and check the validators of
+    the locked row, so two writers holding the same ETag cannot both pass.
+    """
+
+    def lock_object(self):
+        """
+        Locks the row of the object being updated until the end of the
+        transaction.
+        """
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.get_queryset().model._default_manager.select_for_update() \
+            .filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        list(queryset.values_list('pk', flat=True))
+
+    def check_preconditions(self, request, validators):
+        etag, last_modified = validators
+        if etag is None:
+            # Missing resource, let the view answer 404.
+            return None, etag, last_modified
+        response = get_conditional_response(
+            request, etag=quote_etag(etag), last_modified=_timestamp(last_modified))
+        return response, etag, last_modified
+
+    def get(self, request, *args, **kwargs):
+        response, etag, last_modified = self.check_preconditions(request, self.get_validators())
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            set_validators(response, etag, last_modified)
+        return response
+
+    def update(self, request, *args, **kwargs):
+        with transaction.atomic():
+            self.lock_object()
+            response, _, _ = self.check_preconditions(request, self.compute_validators())
+            if response is not None:
+                return response
+            response = super().update(request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                set_validators(response, *self.compute_validators())
+        return response
@@ -0,0 +1,71 @@
+import datetime
+
+import factory
+from django.utils import timezone
+from factory.random import randgen
+
+from users.factories import UserFactory
+
+from .models import Recipe, RecipeCategory
+
+CATEGORIES = ('Breakfast', 'Lunch', 'Dinner', 'Dessert', 'Drinks', 'Snacks',
+              'Ethiopian', 'Vegetarian', 'Vegan', 'Soups', 'Salads', 'Baking')
+
+STYLES = ('Spicy', 'Slow cooked', 'Grilled', 'Smoky', 'Creamy', 'Quick', 'Crispy',
+          'Roasted', 'Braised', 'Homestyle', 'Lemony', 'Garlicky', 'One pot', 'Weeknight')
+DISHES = ('doro wat', 'misir wot', 'shiro', 'tibs', 'lentil soup', 'chicken curry',
+          'beef stew', 'vegetable stir fry', 'tomato pasta', 'fried rice', 'flatbread',
+          'banana bread', 'chickpea salad', 'pancakes', 'fish tacos', 'mushroom risotto',
+          'egg fried noodles', 'spinach pie', 'carrot cake', 'potato gratin')
+
+# Ingredient lines in the free form users type, so that the ingredient
+# index and full-text search see realistic input.
+INGREDIENT_LINES = (
+    '2 tbsp olive oil', '1 large onion, chopped', '3 cloves garlic, minced',
+    '500 g chicken thighs', '1 tsp berbere', '400 g chopped tomatoes',
+    '250 ml chicken stock', 'salt and pepper to taste', 'fresh coriander',
+    '2 cups red lentils', '1 tbsp niter kibbeh', '4 hard boiled eggs',
+    '300 g spinach', '2 carrots, grated', '1 cup basmati rice', '200 g mushrooms',
+    '1 tsp ground cumin', '1/2 tsp turmeric', '2 potatoes, diced', '1 lemon (juiced)',
+    '250 g plain flour', '2 eggs', '100 g butter, melted', '1 cup milk',
+    '3 ripe bananas', '1 tsp baking powder', '150 g sugar', '400 g chickpeas',
+    '1 cucumber', '200 g feta', '1 red chilli', '2 tbsp soy sauce',
+    '1 tbsp grated ginger', '500 g beef chuck', '1 can coconut milk', '2 spring onions',
+)
+COOK_TIMES = tuple(datetime.time(hour, minute)
+                   for hour in range(4) for minute in (0, 10, 15, 20, 30, 45))
+
+
+def ingredient_list():
+    return '\n'.join(randgen.sample(INGREDIENT_LINES, randgen.randint(4, 12)))
+
+
+class RecipeCategoryFactory(factory.django.DjangoModelFactory):
+
+    class Meta:
+        model = RecipeCategory
+        django_get_or_create = ('name',)
+
+    name = factory.Iterator(CATEGORIES)
+
+
+class RecipeFactory(factory.django.DjangoModelFactory):
+    """
+    Recipes with realistic titles, ingredient lists and text lengths,
+    created over the last two years. Saving one sets created_at to now, as
+    the field is auto_now_add; built instances keep the generated date.
+    """
+
+    class Meta:
+        model = Recipe
+
+    author = factory.SubFactory(UserFactory)
+    category = factory.SubFactory(RecipeCategoryFactory)
+    title = factory.LazyFunction(
+        lambda: '{} {}'.format(randgen.choice(STYLES), randgen.choice(DISHES)))
+    desc = factory.Faker('text', max_nb_chars=160)
+    cook_time = factory.LazyFunction(lambda: randgen.choice(COOK_TIMES))
+    ingredients = factory.LazyFunction(ingredient_list)
+    procedure = factory.Faker('paragraph', nb_sentences=10)
+    created_at = factory.Faker('date_time_between', start_date='-2y', tzinfo=timezone.utc)
+    updated_at = factory.LazyAttribute(lambda recipe: recipe.created_at)
@@ -0,0 +1,154 @@
+import hashlib
+import math
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+_BASE83 = ('0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+           'abcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~')
+
+
+def _base83(value, length):
+    return ''.join(
+        _BASE83[(value // 83 ** (length - i - 1)) % 83] for i in range(length))
+
+
+def _srgb_to_linear(value):
+    value = value / 255
+    if value <= 0.04045:
+        return value / 12.92
+    return ((value + 0.055) / 1.055) ** 2.4
+
+
+def _linear_to_srgb(value):
+    value = max(0.0, min(1.0, value))
+    if value <= 0.0031308:
+        return int(value * 12.92 * 255 + 0.5)
+    return int((1.055 * value ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def blurhash(image, x_components=4, y_components=3):
+    """
+    Encodes image as a BlurHash (https://blurha.sh) string, computed on a
+    32px copy so the cost does not depend on the upload size.
+    """
+    image = image.convert('RGB')
+    image.thumbnail((32, 32))
+    width, height = image.size
+    pixels = [tuple(_srgb_to_linear(c) for c in pixel) for pixel in image.getdata()]
+
+    factors = []
+    for j in range(y_components):
+        for i in range(x_components):
+            normalisation = 1 if i == 0 and j == 0 else 2
+            r = g = b = 0.0
+            for y in range(height):
+                cos_y = math.cos(math.pi * j * y / height)
+                for x in range(width):
+                    basis = normalisation * math.cos(math.pi * i * x / width) * cos_y
+                    pr, pg, pb = pixels[y * width + x]
+                    r += basis * pr
+                    g += basis * pg
+                    b += basis * pb
+            scale = 1 / (width * height)
+            factors.append((r * scale, g * scale, b * scale))
+
+    dc, ac = factors[0], factors[1:]
+    result = _base83((x_components - 1) + (y_components - 1) * 9, 1)
+    if ac:
+        actual_max = max(abs(value) for factor in ac for value in factor)
+        quantised_max = max(0, min(82, int(math.floor(actual_max * 166 - 0.5))))
+        max_value = (quantised_max + 1) / 166
+    else:
+        quantised_max, max_value = 0, 1
+    result += _base83(quantised_max, 1)
+    result += _base83(
+        (_linear_to_srgb(dc[0]) << 16) + (_linear_to_srgb(dc[1]) << 8)
+        + _linear_to_srgb(dc[2]), 4)
+    for factor in ac:
+        r, g, b = (
+            max(0, min(18, int(math.floor(
+                math.copysign(abs(value / max_value) ** 0.5, value) * 9 + 9.5))))
+            for value in factor)
+        result += _base83(r * 19 * 19 + g * 19 + b, 2)
+    return result
+
+
+def generate_variants(field_file, prefix):
+    """
+    Renders the resized variants listed in IMAGE_VARIANTS for an uploaded
+    image and stores them next to each other under prefix.
+
+    Returns a dict describing the stored files, suitable for the
+    *_variants JSON fields:
+
+        {'source': <original name>, 'placeholder': <blurhash>,
+         'thumbnail': {'width': .., 'height': .., 'webp': <name>, 'jpeg': <name>},
+         ...}
+    """
+    field_file.open('rb')
+    try:
+        original = Image.open(field_file)
+        original = ImageOps.exif_transpose(original).convert('RGB')
+    finally:
+        field_file.close()
+
+    digest = hashlib.sha1(field_file.name.encode('utf-8')).hexdigest()[:12]
+    variants = {
+        'source': field_file.name,
+        'placeholder': blurhash(original.copy()),
+    }
+    for variant, size in settings.IMAGE_VARIANTS.items():
+        image = original.copy()
+        image.thumbnail((size, size), Image.LANCZOS)
+        entry = {'width': image.width, 'height': image.height}
+        for extension, (image_format, options) in FORMATS.items():
+            buffer = BytesIO()
+            image.save(buffer, image_format, **options)
+            name = '{}/{}/{}.{}'.format(prefix, digest, variant, extension)
+            if default_storage.exists(name):
+                default_storage.delete(name)
+            entry[extension] = default_storage.save(name, ContentFile(buffer.getvalue()))
+        variants[variant] = entry
+    return variants
+
+
+def delete_variants(variants):
+    """
+    Removes the files of a previously generated variants dict.
+    """
+    for variant in settings.IMAGE_VARIANTS:
+        for extension in FORMATS:
+            name = variants.get(variant, {}).get(extension)
+            if name:
+                default_storage.delete(name)
+
+
+def variant_urls(variants, request=None):
+    """
+    Turns a stored variants dict into the public representation with
+    absolute URLs.
+    """
+    if not variants:
+        return None
+
+    def url(name):
+        location = default_storage.url(name)
+        return request.build_absolute_uri(location) if request else location
+
+    data = {'placeholder': variants.get('placeholder')}
+    for variant in settings.IMAGE_VARIANTS:
+        entry = variants.get(variant)
+        if entry:
+            data[variant] = dict(
+                width=entry['width'], height=entry['height'],
+                **{extension: url(entry[extension]) for extension in FORMATS})
+    return data
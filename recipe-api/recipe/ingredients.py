@@ -0,0 +1,85 @@
+import re
+
+from django.db import transaction
+
+from .models import Ingredient, Recipe, RecipeIngredient
+
+MAX_NAME_LENGTH = 100
+
+_SEPARATORS = re.compile(r'[\n\r,;•*]+|\s-\s|\s(?:and|or|&)\s', re.IGNORECASE)
+_PARENTHESES = re.compile(r'\([^)]*\)|\[[^\]]*\]')
+_QUANTITY = re.compile(r'\d+(?:[./]\d+)?(?:[a-z]{1,2}\b)?|[½⅓⅔¼¾⅛]')
+_NON_WORD = re.compile(r'[^\w\s]')
+
+# Units, quantities and preparation words that do not name the ingredient.
+STOP_WORDS = frozenset('''
+    a an of to for the taste about approx optional plus x
+    cup cups c tbsp tbs tbl tablespoon tablespoons tsp teaspoon teaspoons
+    g gr gram grams kg kilo kilos kilogram kilograms mg
+    ml l litre litres liter liters dl cl
+    oz ounce ounces lb lbs pound pounds
+    pinch pinches dash dashes handful handfuls bunch bunches sprig sprigs
+    clove cloves slice slices piece pieces can cans tin tins jar jars
+    pack packs packet packets stick sticks drop drops knob
+    small medium large big whole half
+    fresh freshly chopped finely roughly minced diced sliced grated crushed
+    peeled beaten melted softened cooked boiled
+'''.split())
+
+
+def _singular(word):
+    if len(word) <= 3 or word.endswith(('ss', 'us', 'is')):
+        return word
+    if word.endswith('ies'):
+        return word[:-3] + 'y'
+    if word.endswith('oes'):
+        return word[:-2]
+    if word.endswith('s'):
+        return word[:-1]
+    return word
+
+
+def normalize_name(text):
+    """
+    Reduces one ingredient line to its normalised name, e.g.
+    "2 cloves of Garlic (minced)" -> "garlic". Returns '' when nothing
+    but quantities and units is left.
+    """
+    text = _PARENTHESES.sub(' ', text.lower())
+    text = _NON_WORD.sub(' ', _QUANTITY.sub(' ', text))
+    words = [_singular(word) for word in text.split() if word not in STOP_WORDS]
+    return ' '.join(words)[:MAX_NAME_LENGTH].strip()
+
+
+def parse_ingredients(text):
+    """
+    Splits a free-form ingredient list on lines, commas and bullets and
+    returns the set of normalised ingredient names.
+    """
+    names = (normalize_name(part) for part in _SEPARATORS.split(text or ''))
+    return {name for name in names if name}
+
+
+def index_recipes(recipes):
+    """
+    Replaces the parsed ingredients of the given recipes, creating the
+    missing Ingredient rows, and stores their ingredient_count. Everything
+    is done with a constant number of queries for the whole batch.
+    """
+    parsed = {recipe.pk: parse_ingredients(recipe.ingredients) for recipe in recipes}
+    names = set().union(*parsed.values())
+
+    with transaction.atomic():
+        Ingredient.objects.bulk_create(
+            [Ingredient(name=name) for name in names], ignore_conflicts=True)
+        ids = dict(Ingredient.objects.filter(name__in=names).values_list('name', 'pk'))
+
+        RecipeIngredient.objects.filter(recipe_id__in=parsed).delete()
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(recipe_id=pk, ingredient_id=ids[name])
+            for pk, recipe_names in parsed.items() for name in recipe_names
+        ], batch_size=5000)
+
+        for recipe in recipes:
+            recipe.ingredient_count = len(parsed[recipe.pk])
+        Recipe.objects.bulk_update(recipes, ['ingredient_count'], batch_size=1000)
@@ -0,0 +1,76 @@
+from django.conf import settings
+from django.db import transaction
+from django_redis import get_redis_connection
+
+from events.outbox import publish_many
+
+from .cache import invalidate_recipes
+from .models import RecipeLike
+
+PENDING_KEY = 'recipe-likes:pending'
+PROCESSING_KEY = 'recipe-likes:processing'
+LOCK_KEY = 'recipe-likes:lock'
+# Longer than any flush should take; the lock is released when it ends.
+LOCK_TIMEOUT = 300
+
+
+def _redis():
+    return get_redis_connection(settings.RECIPE_CACHE_ALIAS)
+
+
+def buffer_like(user_id, recipe_id, liked):
+    """
+    Records the latest like state of a user for a recipe. Repeated
+    toggles between two flushes overwrite each other, so only the final
+    state reaches the database.
+    """
+    _redis().hset(PENDING_KEY, '{}:{}'.format(user_id, recipe_id), int(liked))
+
+
+def flush():
+    """
+    Applies the buffered like states to the database in two bulk
+    statements. The pending hash is first renamed so that new toggles
+    keep accumulating while the flush runs. A batch left behind by a
+    failed flush is retried first; reapplying it is harmless because
+    both statements are idempotent.
+
+    Flushes run one at a time: an overlapping flush could otherwise delete
+    the batch another one has just renamed in before it is applied. A
+    flush that finds the lock taken does nothing.
+
+    Returns the number of buffered states applied.
+    """
+    lock = _redis().lock(LOCK_KEY, timeout=LOCK_TIMEOUT, blocking_timeout=0)
+    if not lock.acquire():
+        return 0
+    try:
+        return _flush(lock.redis)
+    finally:
+        lock.release()
+
+
+def _flush(redis):
+    if not redis.exists(PROCESSING_KEY):
+        if not redis.exists(PENDING_KEY):
+            return 0
+        redis.renamenx(PENDING_KEY, PROCESSING_KEY)
+
+    likes, unlikes = [], []
+    for field, value in redis.hgetall(PROCESSING_KEY).items():
+        user_id, recipe_id = (int(part) for part in field.split(b':'))
+        (likes if value == b'1' else unlikes).append((user_id, recipe_id))
+
+    with transaction.atomic():
+        liked = RecipeLike.objects.like(likes)
+        unliked = RecipeLike.objects.unlike(unlikes)
+        changed = {recipe_id for _, recipe_id in liked + unliked}
+        if changed:
+            invalidate_recipes(*changed)
+        publish_many('recipe.liked', [
+            {'user': user_id, 'recipe': recipe_id} for user_id, recipe_id in liked])
+        publish_many('recipe.unliked', [
+            {'user': user_id, 'recipe': recipe_id} for user_id, recipe_id in unliked])
+
+    redis.delete(PROCESSING_KEY)
+    return len(likes) + len(unlikes)
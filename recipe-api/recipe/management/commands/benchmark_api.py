@@ -0,0 +1,216 @@
+import json
+import random
+from collections import defaultdict
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from recipe.management.commands.benchmark_http import percentile, run_clients
+from recipe.models import Recipe, RecipeLike
+from users.factories import EMAIL_DOMAIN, PASSWORD
+from users.models import CustomUser, Profile
+from users.tokens import RefreshToken
+
+SCENARIOS = ('list', 'detail', 'like', 'bookmarks', 'login')
+# Measures compared with the baseline, and whether higher is better.
+COMPARED = (('rps', True), ('p95_ms', False), ('p99_ms', False))
+
+
+def compare(results, baseline, tolerance):
+    """
+    Returns the (scenario, concurrency, measure, baseline value, value)
+    of the results that are more than tolerance (a fraction) worse than
+    the baseline run of the same scenario and concurrency.
+    """
+    previous = {(run['scenario'], run['concurrency']): run for run in baseline['results']}
+    regressions = []
+    for run in results:
+        base = previous.get((run['scenario'], run['concurrency']))
+        if base is None:
+            continue
+        for measure, higher_is_better in COMPARED:
+            if higher_is_better:
+                worse = run[measure] < base[measure] * (1 - tolerance)
+            else:
+                worse = run[measure] > base[measure] * (1 + tolerance)
+            if worse:
+                regressions.append(
+                    (run['scenario'], run['concurrency'], measure, base[measure], run[measure]))
+    return regressions
+
+
+class Client:
+    """
+    One simulated user: a session carrying the user's access token and a
+    random generator seeded per client, so runs pick the same recipes.
+    """
+
+    def __init__(self, base_url, user, seed, timeout):
+        self.base_url = base_url
+        self.user = user
+        self.random = random.Random(seed)
+        self.timeout = timeout
+        self.recipe = None
+        self.session = requests.Session()
+        self.session.headers.update({
+            'Accept': 'application/json',
+            'Authorization': 'Bearer {}'.format(RefreshToken.for_user(user).access_token),
+        })
+
+    def url(self, path):
+        return self.base_url + path
+
+    def get(self, path):
+        return self.session.get(self.url(path), timeout=self.timeout)
+
+
+class Command(BaseCommand):
+    help = ('Load the main endpoints of a running deployment seeded with '
+            'seed_benchmark_data, print throughput and p50/p95/p99 latencies, save '
+            'them as JSON and compare them with a baseline saved the same way. The '
+            'deployment must share this SECRET_KEY and database, and the login '
+            'scenario needs AUTH_THROTTLE_RATES raised on it')
+
+    def add_arguments(self, parser):
+        parser.add_argument('base_url', help='Deployment to load, e.g. http://localhost:8000')
+        parser.add_argument(
+            '--scenario', action='append', dest='scenarios', choices=SCENARIOS,
+            help='Scenario to run, repeatable. Defaults to all of them')
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[10, 50],
+                            help='Concurrent clients of each run')
+        parser.add_argument('--duration', type=float, default=30,
+                            help='Seconds each scenario runs for at each concurrency')
+        parser.add_argument('--seed', type=int, default=42,
+                            help='Seed of the users and recipes the clients pick')
+        parser.add_argument('--timeout', type=float, default=30)
+        parser.add_argument('--output', help='File the results are saved to as JSON')
+        parser.add_argument('--baseline', help='Results file of an earlier run to compare with')
+        parser.add_argument(
+            '--tolerance', type=float, default=0.1,
+            help='Fraction by which throughput or p95/p99 may be worse than the '
+                 'baseline before the run fails')
+
+    def scenario_list(self, client, turn):
+        return client.get('/api/recipe/')
+
+    def scenario_detail(self, client, turn):
+        return client.get('/api/recipe/{}/'.format(
+            client.random.randint(self.recipes['low'], self.recipes['high'])))
+
+    def scenario_like(self, client, turn):
+        # Likes a recipe the user has not liked, then unlikes it, so that
+        # the seeded likes are left as they were.
+        if client.recipe is None:
+            recipe = client.random.randint(self.recipes['low'], self.recipes['high'])
+            while recipe in self.liked[client.user.pk]:
+                recipe = client.random.randint(self.recipes['low'], self.recipes['high'])
+            client.recipe = recipe
+            return client.session.post(
+                client.url('/api/recipe/{}/like/'.format(recipe)), timeout=client.timeout)
+        response = self.unlike(client)
+        client.recipe = None
+        return response
+
+    def unlike(self, client):
+        return client.session.delete(
+            client.url('/api/recipe/{}/like/'.format(client.recipe)), timeout=client.timeout)
+
+    def scenario_bookmarks(self, client, turn):
+        return client.get('/api/user/profile/{}/bookmarks/'.format(client.user.pk))
+
+    def scenario_login(self, client, turn):
+        return client.session.post(
+            client.url('/api/user/login/'),
+            json={'email': client.user.email, 'password': PASSWORD}, timeout=client.timeout)
+
+    def dataset(self):
+        return {
+            'users': CustomUser.objects.count(),
+            'recipes': Recipe.objects.count(),
+            'likes': RecipeLike.objects.count(),
+            'bookmarks': Profile.bookmarks.through.objects.count(),
+        }
+
+    def handle(self, *args, **options):
+        base_url = options['base_url'].rstrip('/')
+        scenarios = options['scenarios'] or SCENARIOS
+        if any(level < 1 for level in options['concurrency']):
+            raise CommandError('--concurrency values must be positive')
+        baseline = None
+        if options['baseline']:
+            try:
+                with open(options['baseline']) as file:
+                    baseline = json.load(file)
+            except (OSError, ValueError) as exc:
+                raise CommandError('Cannot read the baseline: {}'.format(exc))
+
+        self.recipes = Recipe.objects.aggregate(low=Min('pk'), high=Max('pk'))
+        seeded = CustomUser.objects.filter(email__endswith='@' + EMAIL_DOMAIN).order_by('pk')
+        users = list(seeded[:max(options['concurrency'])])
+        if self.recipes['low'] is None or len(users) < max(options['concurrency']):
+            raise CommandError('Not enough seeded data, run seed_benchmark_data first')
+        self.liked = defaultdict(set)
+        for user, recipe in RecipeLike.objects.filter(user__in=users).values_list(
+                'user', 'recipe'):
+            self.liked[user].add(recipe)
+
+        report = {
+            'created_at': timezone.now().isoformat(),
+            'base_url': base_url,
+            'duration': options['duration'],
+            'seed': options['seed'],
+            'dataset': self.dataset(),
+            'results': [],
+        }
+        self.stdout.write('{:<10} {:>5} {:>9} {:>8} {:>8} {:>8} {:>7}'.format(
+            'scenario', 'conc', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms', 'errors'))
+        for name in scenarios:
+            scenario = getattr(self, 'scenario_{}'.format(name))
+            for concurrency in options['concurrency']:
+                clients = [
+                    Client(base_url, users[index],
+                           '{}:{}:{}'.format(options['seed'], name, index), options['timeout'])
+                    for index in range(concurrency)]
+                latencies, errors, elapsed = run_clients(
+                    concurrency, options['duration'],
+                    lambda index, turn: scenario(clients[index], turn).status_code < 400)
+                for client in clients:
+                    if client.recipe is not None:
+                        self.unlike(client)
+                run = {
+                    'scenario': name,
+                    'concurrency': concurrency,
+                    'requests': len(latencies),
+                    'errors': errors,
+                    'rps': round(len(latencies) / elapsed, 1),
+                    'p50_ms': round(percentile(latencies, 0.50), 1),
+                    'p95_ms': round(percentile(latencies, 0.95), 1),
+                    'p99_ms': round(percentile(latencies, 0.99), 1),
+                }
+                report['results'].append(run)
+                self.stdout.write('{:<10} {:>5} {:>9.1f} {:>8.1f} {:>8.1f} {:>8.1f} {:>7}'.format(
+                    name, concurrency, run['rps'], run['p50_ms'], run['p95_ms'],
+                    run['p99_ms'], errors))
+
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(report, file, indent=2)
+                file.write('\n')
+        if baseline is None:
+            return
+
+        if baseline.get('dataset') != report['dataset']:
+            self.stdout.write(self.style.WARNING(
+                'The baseline was measured on a different dataset: {}'.format(
+                    baseline.get('dataset'))))
+        regressions = compare(report['results'], baseline, options['tolerance'])
+        for scenario, concurrency, measure, before, after in regressions:
+            self.stdout.write(self.style.ERROR('{} at {} clients: {} {} -> {}'.format(
+                scenario, concurrency, measure, before, after)))
+        if regressions:
+            raise CommandError('{} regressions against {}'.format(
+                len(regressions), options['baseline']))
+        self.stdout.write(self.style.SUCCESS('No regressions against {}'.format(
+            options['baseline'])))
@@ -0,0 +1,97 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from config import metrics
+from config.db import pool as db_pool
+from config.db.base import DatabaseWrapper
+from recipe.management.commands.benchmark_http import percentile
+
+
+class Command(BaseCommand):
+    help = ('Run concurrent request-sized units of database work against the '
+            'configured database, with the connection pool and with a new '
+            'connection per unit, and print latencies and pool stats')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=20,
+                            help='Concurrent threads, like the serving threads of a process')
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Units of work per thread')
+        parser.add_argument('--query', default='SELECT 1',
+                            help='SQL run by each unit of work')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def pooled(self, alias, query):
+        # What a request does: query, then Django "closes" the connection,
+        # with the pool metrics sent in one batch as by MetricsMiddleware.
+        connection = connections[alias]
+        with metrics.batch():
+            with connection.cursor() as cursor:
+                cursor.execute(query)
+                cursor.fetchall()
+        connection.close()
+
+    def unpooled(self, alias, query):
+        connection = connections[alias]
+        raw = connection.Database.connect(**connection.get_connection_params())
+        try:
+            with raw.cursor() as cursor:
+                cursor.execute(query)
+                cursor.fetchall()
+        finally:
+            raw.close()
+
+    def run(self, work, alias, options):
+        latencies, lock = [], threading.Lock()
+        peak = [0]
+
+        def client(_):
+            own = []
+            for _ in range(options['requests']):
+                start = time.perf_counter()
+                work(alias, options['query'])
+                own.append((time.perf_counter() - start) * 1000)
+            with lock:
+                latencies.extend(own)
+
+        def watch(stop):
+            # Server side view of the connections this run holds open.
+            with connections[alias].cursor() as cursor:
+                while not stop.is_set():
+                    cursor.execute(
+                        'SELECT count(*) FROM pg_stat_activity WHERE datname = current_database()')
+                    peak[0] = max(peak[0], cursor.fetchone()[0] - 1)
+                    stop.wait(0.05)
+            connections[alias].close()
+
+        stop = threading.Event()
+        watcher = threading.Thread(target=watch, args=(stop,))
+        watcher.start()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['threads']) as executor:
+            list(executor.map(client, range(options['threads'])))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        watcher.join()
+        latencies.sort()
+        return len(latencies) / elapsed, latencies, peak[0]
+
+    def handle(self, *args, **options):
+        alias = options['database']
+        if not isinstance(connections[alias], DatabaseWrapper):
+            raise CommandError("Database '{}' does not use the config.db engine".format(alias))
+
+        self.stdout.write('{:<10} {:>9} {:>8} {:>8} {:>12}'.format(
+            'mode', 'units/s', 'p50 ms', 'p99 ms', 'peak conns'))
+        for name, work in (('pooled', self.pooled), ('unpooled', self.unpooled)):
+            rate, latencies, peak = self.run(work, alias, options)
+            self.stdout.write('{:<10} {:>9.1f} {:>8.2f} {:>8.2f} {:>12}'.format(
+                name, rate, percentile(latencies, 0.5), percentile(latencies, 0.99), peak))
+
+        for key, stats in db_pool.stats().items():
+            self.stdout.write('pool {}: {}'.format(key, ', '.join(
+                '{}={}'.format(name, value) for name, value in stats.items())))
@@ -0,0 +1,123 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+
+DEFAULT_PATHS = ('/api/recipe/', '/api/recipe/{recipe}/', '/api/user/profile/',
+                 '/api/user/profile/{user}/bookmarks/')
+
+
+def percentile(ordered, fraction):
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))
+    return ordered[index]
+
+
+def run_clients(concurrency, duration, call):
+    """
+    Keeps concurrency clients calling call(client, turn) for duration
+    seconds, client being the index of the client. call returns whether
+    the request succeeded; a requests exception counts as a failure.
+
+    Returns (sorted latencies in ms of the successful requests, number of
+    failed requests, elapsed seconds).
+    """
+    latencies, errors = [], []
+    deadline = time.perf_counter() + duration
+    lock = threading.Lock()
+
+    def client(index):
+        own_latencies, own_errors, turn = [], 0, 0
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                ok = call(index, turn)
+            except requests.RequestException:
+                ok = False
+            turn += 1
+            if ok:
+                own_latencies.append((time.perf_counter() - start) * 1000)
+            else:
+                own_errors += 1
+        with lock:
+            latencies.extend(own_latencies)
+            errors.append(own_errors)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(client, range(concurrency)))
+    return sorted(latencies), sum(errors), time.perf_counter() - started
+
+
+def run_level(base_url, paths, concurrency, duration, headers, timeout):
+    """
+    Keeps concurrency clients requesting paths in turn against base_url
+    for duration seconds.
+
+    Returns (latencies in ms, number of failed requests, elapsed seconds).
+    """
+    sessions = []
+    for _ in range(concurrency):
+        session = requests.Session()
+        session.headers.update(headers)
+        sessions.append(session)
+
+    def call(client, turn):
+        url = base_url + paths[(client + turn) % len(paths)]
+        return sessions[client].get(url, timeout=timeout).status_code < 400
+
+    return run_clients(concurrency, duration, call)
+
+
+class Command(BaseCommand):
+    help = ('Load the hot read endpoints of running deployments, e.g. the gunicorn '
+            'WSGI one and the uvicorn ASGI one, and compare throughput and latency')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'base_urls', nargs='+',
+            help='Deployments to compare, e.g. http://localhost:8000 http://localhost:8001')
+        parser.add_argument(
+            '--path', action='append', dest='paths',
+            help='Path to request, repeatable; {recipe} and {user} are substituted. '
+                 'Defaults to the recipe list/detail, profile and bookmarks')
+        parser.add_argument(
+            '--concurrency', type=int, nargs='+', default=[1, 10, 50, 100],
+            help='Concurrent clients of each run')
+        parser.add_argument(
+            '--duration', type=float, default=10,
+            help='Seconds each concurrency level runs for')
+        parser.add_argument('--token', help='JWT access token sent as a Bearer token')
+        parser.add_argument('--recipe', type=int, default=1, help='Recipe id of {recipe}')
+        parser.add_argument('--user', type=int, default=1, help='User id of {user}')
+        parser.add_argument('--timeout', type=float, default=30)
+
+    def handle(self, *args, **options):
+        paths = [
+            path.format(recipe=options['recipe'], user=options['user'])
+            for path in options['paths'] or DEFAULT_PATHS
+        ]
+        headers = {'Accept': 'application/json'}
+        if options['token']:
+            headers['Authorization'] = 'Bearer {}'.format(options['token'])
+        if any(level < 1 for level in options['concurrency']):
+            raise CommandError('--concurrency values must be positive')
+
+        self.stdout.write('{:<28} {:>5} {:>9} {:>8} {:>8} {:>8} {:>7}'.format(
+            'deployment', 'conc', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms', 'errors'))
+        for base_url in options['base_urls']:
+            base_url = base_url.rstrip('/')
+            for concurrency in options['concurrency']:
+                latencies, errors, elapsed = run_level(
+                    base_url, paths, concurrency, options['duration'], headers,
+                    options['timeout'])
+                self.stdout.write('{:<28} {:>5} {:>9.1f} {:>8.1f} {:>8.1f} {:>8.1f} {:>7}'.format(
+                    base_url[:28], concurrency, len(latencies) / elapsed,
+                    percentile(latencies, 0.50), percentile(latencies, 0.95),
+                    percentile(latencies, 0.99), errors))
@@ -0,0 +1,75 @@
+import datetime
+import io
+import timeit
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from recipe.models import Recipe, RecipeCategory
+from recipe.parsers import ORJSONParser
+from recipe.renderers import ORJSONRenderer
+from recipe.serializers import RecipeSerializer
+
+PROCEDURE = ('Heat the oil in a heavy pan over a medium flame, add the onions and '
+             'a pinch of salt and cook, stirring, until soft and golden. ')
+INGREDIENTS = '\n'.join([
+    '2 tbsp olive oil', '1 large onion, chopped', '3 cloves garlic, minced',
+    '500 g chicken thighs', '1 tsp berbere', '400 g chopped tomatoes',
+    '250 ml chicken stock', 'salt and pepper to taste', 'fresh coriander',
+])
+
+
+def build_payload(count):
+    """
+    Serializes count unsaved, realistically sized recipes the way the
+    recipe endpoints do.
+    """
+    author = get_user_model()(pk=1, username='benchmark', email='benchmark@example.com')
+    categories = [RecipeCategory(pk=pk, name=name) for pk, name in
+                  enumerate(('Breakfast', 'Lunch', 'Dinner', 'Dessert', 'Ethiopian'), 1)]
+    recipes = [
+        Recipe(
+            pk=pk, author=author, category=categories[pk % len(categories)],
+            title='Slow cooked doro wat #{}'.format(pk),
+            desc='A rich, spicy Ethiopian chicken stew with hard boiled eggs',
+            cook_time=datetime.time(1, 30), ingredients=INGREDIENTS,
+            procedure=PROCEDURE * 8, like_count=pk * 7, bookmark_count=pk * 3,
+        )
+        for pk in range(1, count + 1)
+    ]
+    return {'next': None, 'previous': None,
+            'results': RecipeSerializer(recipes, many=True).data}
+
+
+class Command(BaseCommand):
+    help = 'Compare the orjson renderer and parser with the stock DRF JSON ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recipes', type=int, default=100,
+            help='Number of recipes in the benchmarked page')
+        parser.add_argument(
+            '--repeat', type=int, default=200,
+            help='Number of renders and parses timed per implementation')
+
+    def time(self, func, repeat):
+        return min(timeit.repeat(func, number=repeat, repeat=3)) / repeat * 1000
+
+    def handle(self, *args, **options):
+        data = build_payload(options['recipes'])
+        repeat = options['repeat']
+        body = JSONRenderer().render(data)
+        self.stdout.write('Payload: {} recipes, {} KiB'.format(
+            options['recipes'], len(body) // 1024))
+
+        rows = (
+            ('render', JSONRenderer(), ORJSONRenderer(), lambda impl: impl.render(data)),
+            ('parse', JSONParser(), ORJSONParser(), lambda impl: impl.parse(io.BytesIO(body))),
+        )
+        for name, stock, fast, call in rows:
+            stock_ms = self.time(lambda: call(stock), repeat)
+            fast_ms = self.time(lambda: call(fast), repeat)
+            self.stdout.write('{}: stock {:.3f} ms, orjson {:.3f} ms ({:.1f}x)'.format(
+                name, stock_ms, fast_ms, stock_ms / fast_ms))
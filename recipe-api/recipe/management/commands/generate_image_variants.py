@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from recipe.models import Recipe
+from recipe.tasks import process_recipe_picture
+from users.models import Profile
+from users.tasks import process_avatar
+
+
+class Command(BaseCommand):
+    help = 'Queue variant generation for pictures and avatars that have none yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Regenerate variants for every image, e.g. after IMAGE_VARIANTS changed')
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(picture='')
+        profiles = Profile.objects.exclude(avatar='')
+        if not options['all']:
+            recipes = recipes.filter(picture_variants={})
+            profiles = profiles.filter(avatar_variants={})
+
+        queued = 0
+        for pk in recipes.values_list('pk', flat=True).iterator():
+            process_recipe_picture.delay(pk)
+            queued += 1
+        for pk in profiles.values_list('pk', flat=True).iterator():
+            process_avatar.delay(pk)
+            queued += 1
+
+        self.stdout.write(self.style.SUCCESS('Queued {} images.'.format(queued)))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Max, Min
+
+from recipe.cache import invalidate_all
+from recipe.ingredients import index_recipes
+from recipe.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Parse the ingredients of every recipe into the ingredient index'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of recipe ids to index per transaction')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        bounds = Recipe.objects.aggregate(low=Min('pk'), high=Max('pk'))
+        if bounds['low'] is None:
+            self.stdout.write(self.style.SUCCESS('No recipes to index.'))
+            return
+
+        indexed = 0
+        for start in range(bounds['low'], bounds['high'] + 1, batch_size):
+            recipes = list(Recipe.objects.filter(
+                pk__gte=start, pk__lt=start + batch_size
+            ).only('pk', 'ingredients'))
+            if recipes:
+                index_recipes(recipes)
+                indexed += len(recipes)
+
+        invalidate_all()
+        self.stdout.write(self.style.SUCCESS(
+            'Indexed ingredients of {} recipes.'.format(indexed)))
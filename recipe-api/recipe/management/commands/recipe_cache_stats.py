@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from recipe.cache import get_stats
+
+
+class Command(BaseCommand):
+    help = 'Show the hit, miss and rebuild counters of the recipe response cache'
+
+    def handle(self, *args, **options):
+        stats = get_stats()
+        lookups = stats['hit'] + stats['miss']
+        ratio = stats['hit'] / lookups if lookups else 0
+        for name, value in stats.items():
+            self.stdout.write('{}: {}'.format(name, value))
+        self.stdout.write('hit ratio: {:.2%}'.format(ratio))
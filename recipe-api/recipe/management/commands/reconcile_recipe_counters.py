@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max, Min
+
+from recipe.cache import invalidate_all
+from recipe.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Recompute the stored like and bookmark counters on recipes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Number of recipe ids to reconcile per UPDATE statement')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        bounds = Recipe.objects.aggregate(low=Min('pk'), high=Max('pk'))
+        if bounds['low'] is None:
+            self.stdout.write(self.style.SUCCESS('No recipes to reconcile.'))
+            return
+
+        updated = 0
+        for start in range(bounds['low'], bounds['high'] + 1, batch_size):
+            with transaction.atomic():
+                updated += Recipe.objects.filter(
+                    pk__gte=start, pk__lt=start + batch_size
+                ).reconcile_counters()
+
+        invalidate_all()
+        self.stdout.write(self.style.SUCCESS(
+            'Reconciled counters for {} recipes.'.format(updated)))
@@ -0,0 +1,163 @@
+import csv
+import datetime
+import io
+import time
+
+import factory.random
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from factory.random import randgen
+
+from recipe.factories import CATEGORIES, RecipeCategoryFactory, RecipeFactory
+from recipe.models import Recipe, RecipeLike
+from recipe.trending import refresh_scores
+from users.factories import EMAIL_DOMAIN, ProfileFactory, UserFactory
+from users.models import CustomUser, Profile
+
+# Recipe columns loaded by COPY, the database fills in the id and the
+# search vector.
+RECIPE_COLUMNS = ('author', 'category', 'picture', 'picture_variants', 'title', 'desc',
+                  'cook_time', 'ingredients', 'procedure', 'created_at', 'updated_at',
+                  'like_count', 'bookmark_count', 'ingredient_count')
+LIKE_WINDOW = datetime.timedelta(days=90)
+
+
+def skewed_index(size, skew):
+    """
+    Random index below size, biased towards 0: with skew 3 the first 1% of
+    the indexes are drawn a fifth of the time.
+    """
+    return int(size * randgen.random() ** skew)
+
+
+def pairs(owners, targets, total):
+    """
+    About total distinct (owner, target) pairs. How many pairs an owner
+    gets is Pareto distributed, so a few users are far more active than
+    the rest, and popular targets (the first ones) are picked far more
+    often than the long tail.
+    """
+    weights = [randgen.paretovariate(2) for _ in owners]
+    scale = total / sum(weights)
+    cap = max(1, len(targets) // 4)
+    for owner, weight in zip(owners, weights):
+        chosen = set()
+        quota = min(cap, int(round(weight * scale)))
+        while len(chosen) < quota:
+            chosen.add(targets[skewed_index(len(targets), 3)])
+        for target in chosen:
+            yield owner, target
+
+
+class Command(BaseCommand):
+    help = ('Fill a database without recipes with a reproducible benchmark dataset of users, '
+            'recipes, likes and bookmarks, generated by the model factories from '
+            '--seed. Users log in as user<n>@example.com with the factories\' password')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100000)
+        parser.add_argument('--recipes', type=int, default=1000000)
+        parser.add_argument('--likes', type=int, default=10000000)
+        parser.add_argument('--bookmarks', type=int, default=1000000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=10000,
+                            help='Rows per INSERT or COPY statement')
+
+    def step(self, message, started):
+        self.stdout.write('{} ({:.1f}s)'.format(message, time.monotonic() - started))
+
+    def copy(self, model, columns, rows, batch_size):
+        """
+        Loads rows into the table of model with COPY, batch_size rows per
+        statement. Returns the number of rows loaded.
+        """
+        quote = connection.ops.quote_name
+        # Empty fields are empty strings rather than the CSV default NULL.
+        sql = "COPY {} ({}) FROM STDIN WITH (FORMAT csv, NULL '\\N')".format(
+            quote(model._meta.db_table),
+            ', '.join(quote(model._meta.get_field(name).column) for name in columns))
+        loaded = 0
+        with connection.cursor() as cursor:
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            for loaded, row in enumerate(rows, 1):
+                writer.writerow(row)
+                if loaded % batch_size == 0:
+                    buffer.seek(0)
+                    cursor.copy_expert(sql, buffer)
+                    buffer = io.StringIO()
+                    writer = csv.writer(buffer)
+            if buffer.tell():
+                buffer.seek(0)
+                cursor.copy_expert(sql, buffer)
+        return loaded
+
+    def create_users(self, count, batch_size):
+        users, profiles = [], []
+        UserFactory.reset_sequence(1)
+        for start in range(0, count, batch_size):
+            batch = CustomUser.objects.bulk_create(
+                UserFactory.build_batch(min(batch_size, count - start)))
+            # Bulk inserts skip the signal that creates profiles.
+            profiles.extend(Profile.objects.bulk_create(
+                [ProfileFactory.build(user=user) for user in batch]))
+            users.extend(batch)
+        return users, profiles
+
+    def recipe_rows(self, count, authors, categories):
+        for _ in range(count):
+            recipe = RecipeFactory.build(
+                author=authors[skewed_index(len(authors), 2)],
+                category=categories[skewed_index(len(categories), 1.5)])
+            yield (recipe.author_id, recipe.category_id, '', '{}', recipe.title, recipe.desc,
+                   recipe.cook_time.isoformat(), recipe.ingredients, recipe.procedure,
+                   recipe.created_at.isoformat(), recipe.updated_at.isoformat(), 0, 0, 0)
+
+    def like_rows(self, user_ids, recipe_ids, total):
+        now = timezone.now()
+        for user_id, recipe_id in pairs(user_ids, recipe_ids, total):
+            yield user_id, recipe_id, (now - LIKE_WINDOW * randgen.random()).isoformat()
+
+    def handle(self, *args, **options):
+        if Recipe.objects.exists() or \
+                CustomUser.objects.filter(email__endswith='@' + EMAIL_DOMAIN).exists():
+            raise CommandError('The benchmark dataset must be seeded into a database '
+                               'without recipes or @{} users'.format(EMAIL_DOMAIN))
+        if options['users'] < 1 or options['recipes'] < 1:
+            raise CommandError('--users and --recipes must be positive')
+        batch_size = options['batch_size']
+        factory.random.reseed_random(options['seed'])
+        started = time.monotonic()
+
+        categories = [RecipeCategoryFactory(name=name) for name in CATEGORIES]
+        users, profiles = self.create_users(options['users'], batch_size)
+        self.step('Created {} users'.format(len(users)), started)
+
+        # Most recipes come from a minority of prolific authors.
+        recipes = self.copy(Recipe, RECIPE_COLUMNS,
+                            self.recipe_rows(options['recipes'], users, categories),
+                            batch_size)
+        self.step('Created {} recipes'.format(recipes), started)
+
+        user_ids = [user.pk for user in users]
+        recipe_ids = list(Recipe.objects.order_by('pk').values_list('pk', flat=True))
+        # Spread popularity over the recipes instead of favouring the oldest ids.
+        randgen.shuffle(recipe_ids)
+        likes = self.copy(RecipeLike, ('user', 'recipe', 'created'),
+                          self.like_rows(user_ids, recipe_ids, options['likes']), batch_size)
+        self.step('Created {} likes'.format(likes), started)
+
+        profile_ids = [profile.pk for profile in profiles]
+        bookmarks = self.copy(Profile.bookmarks.through, ('profile', 'recipe'),
+                              pairs(profile_ids, recipe_ids, options['bookmarks']),
+                              batch_size)
+        self.step('Created {} bookmarks'.format(bookmarks), started)
+
+        call_command('reconcile_recipe_counters', stdout=self.stdout)
+        call_command('index_recipe_ingredients', stdout=self.stdout)
+        refresh_scores()
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.step('Seeded the benchmark dataset', started)
@@ -0,0 +1,42 @@
+# Generated by Django 3.2.9 on 2026-10-18 17:07
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    Recipe = apps.get_model('recipe', 'Recipe')
+    RecipeLike = apps.get_model('recipe', 'RecipeLike')
+    Bookmark = apps.get_model('users', 'Profile').bookmarks.through
+
+    likes = RecipeLike.objects.filter(recipe=OuterRef('pk')).order_by() \
+        .values('recipe').annotate(total=Count('pk')).values('total')
+    bookmarks = Bookmark.objects.filter(recipe=OuterRef('pk')).order_by() \
+        .values('recipe').annotate(total=Count('pk')).values('total')
+    Recipe.objects.update(
+        like_count=Coalesce(Subquery(likes), 0),
+        bookmark_count=Coalesce(Subquery(bookmarks), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0003_recipelike'),
+        ('users', '0010_alter_profile_avatar'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='bookmark_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
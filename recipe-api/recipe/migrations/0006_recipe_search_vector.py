@@ -0,0 +1,49 @@
+# Generated by Django 3.2.9 on 2026-10-18 17:13
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+CREATE_TRIGGER = """
+CREATE FUNCTION recipe_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('pg_catalog.english', coalesce(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('pg_catalog.english', coalesce(NEW."desc", '')), 'B') ||
+        setweight(to_tsvector('pg_catalog.english', coalesce(NEW.ingredients, '')), 'C');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER recipe_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF title, "desc", ingredients ON recipe_recipe
+    FOR EACH ROW EXECUTE FUNCTION recipe_search_vector_update();
+
+UPDATE recipe_recipe SET title = title;
+"""
+
+DROP_TRIGGER = """
+DROP TRIGGER IF EXISTS recipe_search_vector_trigger ON recipe_recipe;
+DROP FUNCTION IF EXISTS recipe_search_vector_update();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0005_recipe_cursor_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunSQL(CREATE_TRIGGER, DROP_TRIGGER),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='recipe_search_vector_idx'),
+        ),
+    ]
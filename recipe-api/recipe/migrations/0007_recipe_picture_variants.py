@@ -0,0 +1,18 @@
+# Generated by Django 3.2.9 on 2026-10-18 17:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0006_recipe_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='picture_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 3.2.9 on 2026-10-18 17:22
+
+from django.db import migrations, models
+from django.db.models import Count, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def remove_duplicate_likes(apps, schema_editor):
+    Recipe = apps.get_model('recipe', 'Recipe')
+    RecipeLike = apps.get_model('recipe', 'RecipeLike')
+
+    duplicates = RecipeLike.objects.values('user', 'recipe').order_by() \
+        .annotate(keep=Min('pk'), total=Count('pk')).filter(total__gt=1)
+    affected = set()
+    for row in list(duplicates):
+        RecipeLike.objects.filter(user=row['user'], recipe=row['recipe']) \
+            .exclude(pk=row['keep']).delete()
+        affected.add(row['recipe'])
+
+    likes = RecipeLike.objects.filter(recipe=OuterRef('pk')).order_by() \
+        .values('recipe').annotate(total=Count('pk')).values('total')
+    Recipe.objects.filter(pk__in=affected).update(
+        like_count=Coalesce(Subquery(likes), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0007_recipe_picture_variants'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_likes, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='recipelike',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_recipe_like'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 3.2.9 on 2026-10-18 17:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0008_recipelike_unique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendingScore',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='trending', serialize=False, to='recipe.recipe')),
+                ('score', models.FloatField()),
+                ('refreshed_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='recipelike',
+            index=models.Index(fields=['created'], name='recipelike_created_idx'),
+        ),
+        migrations.AddField(
+            model_name='trendingscore',
+            name='category',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='recipe.recipecategory'),
+        ),
+        migrations.AddIndex(
+            model_name='trendingscore',
+            index=models.Index(fields=['-score'], name='trending_score_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trendingscore',
+            index=models.Index(fields=['category', '-score'], name='trending_category_score_idx'),
+        ),
+    ]
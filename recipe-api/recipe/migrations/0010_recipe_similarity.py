@@ -0,0 +1,31 @@
+# Generated by Django 3.2.9 on 2026-10-18 17:28
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0009_trending_score'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeSimilarity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='recipe.recipe')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_from', to='recipe.recipe')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='recipesimilarity',
+            index=models.Index(fields=['recipe', '-score'], name='similarity_recipe_score_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='recipesimilarity',
+            constraint=models.UniqueConstraint(fields=('recipe', 'similar'), name='unique_recipe_similarity'),
+        ),
+    ]
@@ -1,4 +1,19 @@
-from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVectorField,
+)
+from django.db import connection, models
+from django.db.models import (
+    Count,
+    ExpressionWrapper,
+    F,
+    FloatField,
+    OuterRef,
+    Subquery,
+)
+from django.db.models.functions import Cast, Coalesce, Greatest, Now
 from django.conf import settings
 from django.utils.translation import gettext_lazy as _
 
@@ -24,6 +39,83 @@ def get_default_recipe_category():
     return RecipeCategory.objects.get_or_create(name='Others')[0]
 
 
+class RecipeQuerySet(models.QuerySet):
+    """
+    Custom queryset for recipes
+    """
+
+    def for_api(self):
+        """
+        Joins the relations walked by RecipeSerializer so that serializing
+        a page of recipes costs a single query.
+        """
+        return self.select_related('author', 'category')
+
+    def search(self, terms, max_candidates=None):
+        """
+        Full-text search over title, description and ingredients, best
+        matches first.
+
+        Only the first max_candidates (RECIPE_SEARCH_MAX_CANDIDATES by
+        default) matches found through the GIN index are ranked, so that a
+        broad query does not rank the whole table. When more recipes match,
+        the best of those candidates are returned.
+        """
+        if max_candidates is None:
+            max_candidates = settings.RECIPE_SEARCH_MAX_CANDIDATES
+        query = SearchQuery(terms, config='english', search_type='websearch')
+        candidates = Recipe.objects.filter(search_vector=query).order_by().values('pk')
+        return self.filter(pk__in=candidates[:max_candidates]).annotate(
+            rank=SearchRank(F('search_vector'), query)
+        ).order_by('-rank', '-created_at', '-id')
+
+    def with_ingredients(self, names):
+        """
+        Recipes using at least one of the given normalised ingredient names,
+        annotated with how many of them they use (matched_ingredients) and
+        which share of their own ingredients that covers
+        (ingredient_coverage), best covered first.
+        """
+        ingredients = Ingredient.objects.filter(name__in=names).values('pk')
+        return self.filter(recipe_ingredients__ingredient__in=ingredients).annotate(
+            matched_ingredients=Count('recipe_ingredients'),
+        ).annotate(
+            ingredient_coverage=ExpressionWrapper(
+                Cast('matched_ingredients', FloatField())
+                / Greatest(F('ingredient_count'), 1),
+                output_field=FloatField()),
+        ).order_by('-ingredient_coverage', '-matched_ingredients', '-id')
+
+    def adjust_counter(self, field, delta):
+        """
+        Atomically shifts a stored counter by delta, never below zero.
+        """
+        return self.update(**{field: Greatest(F(field) + delta, 0)}, updated_at=Now())
+
+    def touch(self):
+        """
+        Marks the recipes as modified after a change to data they display
+        but do not store, e.g. their category or author name. updated_at
+        backs the ETag and Last-Modified validators of the recipe views.
+        """
+        return self.update(updated_at=Now())
+
+    def reconcile_counters(self):
+        """
+        Recomputes the stored like and bookmark counters from the source tables.
+        """
+        likes = RecipeLike.objects.filter(recipe=OuterRef('pk')).order_by() \
+            .values('recipe').annotate(total=Count('pk')).values('total')
+        bookmarks = Recipe.bookmarked_by.through.objects \
+            .filter(recipe=OuterRef('pk')).order_by() \
+            .values('recipe').annotate(total=Count('pk')).values('total')
+        return self.update(
+            like_count=Coalesce(Subquery(likes), 0),
+            bookmark_count=Coalesce(Subquery(bookmarks), 0),
+            updated_at=Now(),
+        )
+
+
 class Recipe(models.Model):
     """
     Recipe model
@@ -33,25 +125,122 @@ class Recipe(models.Model):
     category = models.ForeignKey(
         RecipeCategory, related_name="recipe_list", on_delete=models.SET(get_default_recipe_category))
     picture = models.ImageField(upload_to='uploads')
+    picture_variants = models.JSONField(default=dict, blank=True, editable=False)
     title = models.CharField(max_length=200)
     desc = models.CharField(_('Short description'), max_length=200)
     cook_time = models.TimeField()
     ingredients = models.TextField()
     procedure = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+    # Also bumped by counter and picture updates that bypass save(), so it
+    # tracks every change to the API representation.
     updated_at = models.DateTimeField(auto_now=True)
+    like_count = models.PositiveIntegerField(default=0, editable=False)
+    bookmark_count = models.PositiveIntegerField(default=0, editable=False)
+    # Number of distinct ingredients parsed into RecipeIngredient
+    ingredient_count = models.PositiveSmallIntegerField(default=0, editable=False)
+    # Weighted title/desc/ingredients vector, maintained by a database trigger
+    # (see migration 0006_recipe_search_vector).
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
-        ordering = ('-created_at', )
+        ordering = ('-created_at', '-id')
+        indexes = [
+            models.Index(fields=['-created_at', '-id'],
+                         name='recipe_created_id_idx'),
+            models.Index(fields=['category', '-created_at', '-id'],
+                         name='recipe_category_created_idx'),
+            models.Index(fields=['author', '-created_at', '-id'],
+                         name='recipe_author_created_idx'),
+            GinIndex(fields=['search_vector'],
+                     name='recipe_search_vector_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
     def get_total_number_of_likes(self):
-        return self.recipelike_set.count()
+        return self.like_count
 
     def get_total_number_of_bookmarks(self):
-        return self.bookmarked_by.count()
+        return self.bookmark_count
+
+
+LIKE_SQL = """
+WITH pairs AS (
+    SELECT DISTINCT t.user_id, t.recipe_id
+    FROM unnest(%s::bigint[], %s::bigint[]) AS t(user_id, recipe_id)
+    JOIN {recipe} ON {recipe}.id = t.recipe_id
+    JOIN {user} ON {user}.id = t.user_id
+), inserted AS (
+    INSERT INTO {like} (user_id, recipe_id, created)
+    SELECT user_id, recipe_id, now() FROM pairs
+    ON CONFLICT (user_id, recipe_id) DO NOTHING
+    RETURNING user_id, recipe_id
+), counted AS (
+    UPDATE {recipe} SET like_count = {recipe}.like_count + c.total, updated_at = now()
+    FROM (SELECT recipe_id, count(*) AS total FROM inserted GROUP BY recipe_id) c
+    WHERE {recipe}.id = c.recipe_id
+)
+SELECT user_id, recipe_id FROM inserted
+"""
+
+UNLIKE_SQL = """
+WITH deleted AS (
+    DELETE FROM {like}
+    USING unnest(%s::bigint[], %s::bigint[]) AS t(user_id, recipe_id)
+    WHERE {like}.user_id = t.user_id AND {like}.recipe_id = t.recipe_id
+    RETURNING {like}.user_id, {like}.recipe_id
+), counted AS (
+    UPDATE {recipe}
+    SET like_count = GREATEST({recipe}.like_count - c.total, 0), updated_at = now()
+    FROM (SELECT recipe_id, count(*) AS total FROM deleted GROUP BY recipe_id) c
+    WHERE {recipe}.id = c.recipe_id
+)
+SELECT user_id, recipe_id FROM deleted
+"""
+
+
+class RecipeLikeQuerySet(models.QuerySet):
+    """
+    Custom queryset for recipe likes
+    """
+
+    def _apply(self, sql, pairs):
+        pairs = list(pairs)
+        if not pairs:
+            return []
+        user_model = RecipeLike._meta.get_field('user').related_model
+        sql = sql.format(
+            like=connection.ops.quote_name(RecipeLike._meta.db_table),
+            recipe=connection.ops.quote_name(Recipe._meta.db_table),
+            user=connection.ops.quote_name(user_model._meta.db_table),
+        )
+        user_ids, recipe_ids = zip(*pairs)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [list(user_ids), list(recipe_ids)])
+            return [tuple(row) for row in cursor.fetchall()]
+
+    def like(self, pairs):
+        """
+        Stores likes for (user_id, recipe_id) pairs and bumps the like
+        counters in a single statement. Pairs that are already liked or
+        point to a missing recipe or user are skipped.
+
+        Returns the pairs that were actually inserted.
+        """
+        return self._apply(LIKE_SQL, pairs)
+
+    def unlike(self, pairs):
+        """
+        Removes likes for (user_id, recipe_id) pairs and lowers the like
+        counters in a single statement.
+
+        Returns the pairs that were actually deleted.
+        """
+        return self._apply(UNLIKE_SQL, pairs)
 
 
 class RecipeLike(models.Model):
@@ -63,5 +252,96 @@ class RecipeLike(models.Model):
     recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE)
     created = models.DateTimeField(auto_now_add=True)
 
+    objects = RecipeLikeQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'recipe'],
+                                    name='unique_recipe_like'),
+        ]
+        indexes = [
+            models.Index(fields=['created'], name='recipelike_created_idx'),
+        ]
+
     def __str__(self):
         return self.user.username
+
+
+class Ingredient(models.Model):
+    """
+    Normalised ingredient name parsed out of recipe ingredient lists
+    """
+    name = models.CharField(max_length=100, unique=True)
+
+    def __str__(self):
+        return self.name
+
+
+class RecipeIngredient(models.Model):
+    """
+    Ingredient of a recipe. The (ingredient, recipe) constraint doubles as
+    the inverted index from ingredients to recipes.
+    """
+    recipe = models.ForeignKey(
+        Recipe, related_name='recipe_ingredients', on_delete=models.CASCADE)
+    ingredient = models.ForeignKey(
+        Ingredient, related_name='+', on_delete=models.CASCADE,
+        db_index=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['ingredient', 'recipe'],
+                                    name='unique_recipe_ingredient'),
+        ]
+
+    def __str__(self):
+        return '{}: {}'.format(self.recipe_id, self.ingredient_id)
+
+
+class TrendingScore(models.Model):
+    """
+    Time-decayed like score of recently liked recipes, refreshed
+    periodically by the refresh_trending_scores task.
+    """
+    recipe = models.OneToOneField(
+        Recipe, related_name='trending', on_delete=models.CASCADE,
+        primary_key=True)
+    category = models.ForeignKey(
+        RecipeCategory, related_name='+', on_delete=models.CASCADE)
+    score = models.FloatField()
+    refreshed_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-score'], name='trending_score_idx'),
+            models.Index(fields=['category', '-score'],
+                         name='trending_category_score_idx'),
+        ]
+
+    def __str__(self):
+        return '{}: {:.2f}'.format(self.recipe_id, self.score)
+
+
+class RecipeSimilarity(models.Model):
+    """
+    Top neighbours of a recipe by co-liking users, rebuilt nightly by the
+    build_recipe_similarities task.
+    """
+    recipe = models.ForeignKey(
+        Recipe, related_name='+', on_delete=models.CASCADE)
+    similar = models.ForeignKey(
+        Recipe, related_name='similar_from', on_delete=models.CASCADE)
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['recipe', 'similar'],
+                                    name='unique_recipe_similarity'),
+        ]
+        indexes = [
+            models.Index(fields=['recipe', '-score'],
+                         name='similarity_recipe_score_idx'),
+        ]
+
+    def __str__(self):
+        return '{} -> {}: {:.2f}'.format(self.recipe_id, self.similar_id, self.score)
@@ -0,0 +1,174 @@
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db import connection
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class RecipeCursorPagination(CursorPagination):
+    """
+    Keyset pagination over (created_at, id), backed by the matching index
+    on Recipe, so fetching a deep page costs the same as fetching the first.
+
+    DRF positions a cursor on the first ordering field only and skips the
+    rows sharing it with an offset. Here the cursor holds the values of
+    every ordering field, which together are unique, and pages are found
+    with a row comparison such as (created_at, id) < (%s, %s).
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-created_at', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            (offset, reverse, current_position) = (0, False, None)
+        else:
+            (offset, reverse, current_position) = self.cursor
+
+        if reverse:
+            queryset = queryset.order_by(*(
+                order[1:] if order.startswith('-') else '-' + order for order in self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+        if current_position is not None:
+            queryset = self.filter_after(queryset, current_position, reverse)
+
+        # One extra row tells whether a page follows.
+        results = list(queryset[offset:offset + self.page_size + 1])
+        self.page = list(results[:self.page_size])
+        if len(results) > len(self.page):
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+        else:
+            following_position = None
+
+        if reverse:
+            self.page = list(reversed(self.page))
+            self.has_next = current_position is not None or offset > 0
+            self.has_previous = following_position is not None
+            self.next_position = current_position
+            self.previous_position = following_position
+        else:
+            self.has_next = following_position is not None
+            self.has_previous = current_position is not None or offset > 0
+            self.next_position = following_position
+            self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def filter_after(self, queryset, position, reverse):
+        """
+        Keeps the rows following the position in the requested direction.
+        """
+        opts = queryset.model._meta
+        descending = {order.startswith('-') for order in self.ordering}
+        fields = [opts.get_field(order.lstrip('-')) for order in self.ordering]
+        if len(descending) != 1 or len(position) != len(fields):
+            raise NotFound(self.invalid_cursor_message)
+        try:
+            values = [field.to_python(value) for field, value in zip(fields, position)]
+        except ValidationError:
+            raise NotFound(self.invalid_cursor_message)
+        quote_name = connection.ops.quote_name
+        columns = ', '.join('{}.{}'.format(quote_name(opts.db_table), quote_name(field.column))
+                            for field in fields)
+        operator = '<' if descending.pop() != reverse else '>'
+        return queryset.extra(
+            where=['({}) {} ({})'.format(columns, operator, ', '.join(['%s'] * len(values)))],
+            params=values)
+
+    def decode_cursor(self, request):
+        cursor = super().decode_cursor(request)
+        if cursor is None or cursor.position is None:
+            return cursor
+        try:
+            position = json.loads(cursor.position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or not all(isinstance(value, str) for value in position):
+            raise NotFound(self.invalid_cursor_message)
+        return cursor._replace(position=position)
+
+    def encode_cursor(self, cursor):
+        if cursor.position is not None:
+            cursor = cursor._replace(position=json.dumps(cursor.position))
+        return super().encode_cursor(cursor)
+
+    def _get_position_from_instance(self, instance, ordering):
+        return [super(RecipeCursorPagination, self)._get_position_from_instance(
+            instance, (order,)) for order in ordering]
+
+
+class RecipeSearchPagination(PageNumberPagination):
+    """
+    Page-numbered pagination for ranked results (search relevance, trending
+    score), whose order comes from a value that a cursor cannot encode.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class RecipeUncountedPagination(RecipeSearchPagination):
+    """
+    Page-numbered pagination that never counts the results, which would
+    cost as much as finding them all: a page is fetched with one extra
+    row, telling whether there is a next page. Responses have no count.
+    """
+    template = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_size = self.get_page_size(request)
+        try:
+            self.page_number = int(request.query_params.get(self.page_query_param, 1))
+        except ValueError:
+            self.page_number = 0
+        if self.page_number < 1:
+            raise NotFound(self.invalid_page_message.format(
+                page_number=request.query_params.get(self.page_query_param),
+                message='That page number is not a positive integer'))
+
+        offset = (self.page_number - 1) * page_size
+        results = list(queryset[offset:offset + page_size + 1])
+        self.has_next = len(results) > page_size
+        self.request = request
+        return results[:page_size]
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        del response_schema['properties']['count']
+        return response_schema
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.page_query_param, self.page_number + 1)
+
+    def get_previous_link(self):
+        if self.page_number == 1:
+            return None
+        url = self.request.build_absolute_uri()
+        if self.page_number == 2:
+            return remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.page_query_param, self.page_number - 1)
@@ -0,0 +1,46 @@
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+ORJSON_OPTIONS = (orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME) if orjson else 0
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer that encodes with orjson, several times faster than the
+    stdlib encoder on recipe lists.
+
+    Dates, times and datetimes are handed to DRF's encoder so they render
+    exactly as before, as does anything else orjson does not know (lazy
+    strings, Decimals, querysets, ...). Pretty printed and ASCII-only
+    output, payloads orjson rejects (e.g. integers above 64 bits) and
+    environments without orjson use the stock renderer.
+
+    The output is not byte-identical for floats: they keep their value but
+    may be spelled differently (0.00001 for 1e-05, 1e16 for 1e+16), and
+    NaN and infinities render as null where DRF's STRICT_JSON raises
+    ValueError. Finding them would mean walking the whole payload in
+    Python, which costs most of the speedup, so fields that may hold them
+    must be made finite by their serializer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if orjson is None or self.ensure_ascii or \
+                self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default, option=ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Escape \u2028 and \u2029 like the stock renderer, so the output
+        # stays a strict javascript subset.
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
@@ -1,8 +1,40 @@
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
 
+from .images import variant_urls
 from .models import Recipe, RecipeCategory, RecipeLike
 
 
+def _names(value):
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+def requested_fields(available, request):
+    """
+    Returns the names among available kept by the ?fields= and ?omit=
+    query parameters of a read request.
+    """
+    names = set(available)
+    if request is None or request.method not in SAFE_METHODS:
+        return names
+    if request.query_params.get('fields'):
+        names &= _names(request.query_params['fields'])
+    if request.query_params.get('omit'):
+        names -= _names(request.query_params['omit'])
+    return names
+
+
+class DynamicFieldsMixin:
+    """
+    Lets clients choose the fields of a read response with ?fields=a,b or
+    drop some with ?omit=a,b. Unknown names are ignored.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        selected = requested_fields(fields, self.context.get('request'))
+        return {name: field for name, field in fields.items() if name in selected}
+
 
 class RecipeCategorySerializer(serializers.ModelSerializer):
     class Meta:
@@ -10,20 +42,34 @@ class RecipeCategorySerializer(serializers.ModelSerializer):
         fields = ('id', 'name')
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     author = serializers.PrimaryKeyRelatedField(read_only=True)
     username = serializers.SerializerMethodField()
     category_name = serializers.SerializerMethodField()
     category = RecipeCategorySerializer()
     total_number_of_likes = serializers.SerializerMethodField()
     total_number_of_bookmarks = serializers.SerializerMethodField()
+    picture_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
-        fields = ('id', 'category', 'category_name', 'picture', 'title', 'desc',
+        fields = ('id', 'category', 'category_name', 'picture', 'picture_variants', 'title', 'desc',
                   'cook_time', 'ingredients', 'procedure', 'author', 'username',
                   'total_number_of_likes', 'total_number_of_bookmarks')
 
+    # Model columns read only by the serializer field of the same name, which
+    # can be left in the database when that field is not rendered.
+    deferrable_fields = ('picture_variants', 'desc', 'ingredients', 'procedure')
+
+    @classmethod
+    def deferred_fields(cls, request):
+        """
+        Returns the Recipe columns a read of request does not need.
+        """
+        selected = requested_fields(cls.Meta.fields, request)
+        return ['search_vector'] + [
+            name for name in cls.deferrable_fields if name not in selected]
+
     def get_username(self, obj):
         return obj.author.username
 
@@ -36,6 +82,9 @@ class RecipeSerializer(serializers.ModelSerializer):
     def get_total_number_of_bookmarks(self, obj):
         return obj.get_total_number_of_bookmarks()
 
+    def get_picture_variants(self, obj):
+        return variant_urls(obj.picture_variants, self.context.get('request'))
+
     def create(self, validated_data):
         category = validated_data.pop('category')
         category_instance, created = RecipeCategory.objects.get_or_create(
@@ -55,9 +104,43 @@ class RecipeSerializer(serializers.ModelSerializer):
         return super(RecipeSerializer, self).update(instance, validated_data)
 
 
+class RecipeListSerializer(RecipeSerializer):
+    """
+    Compact recipe representation for collections, without the long
+    description, ingredient and procedure texts.
+    """
+    class Meta(RecipeSerializer.Meta):
+        fields = ('id', 'category', 'category_name', 'picture', 'picture_variants',
+                  'title', 'cook_time', 'author', 'username',
+                  'total_number_of_likes', 'total_number_of_bookmarks')
+
+
+class RecipeIngredientMatchSerializer(RecipeSerializer):
+    matched_ingredients = serializers.IntegerField(read_only=True)
+    ingredient_coverage = serializers.FloatField(read_only=True)
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + (
+            'matched_ingredients', 'ingredient_coverage')
+
+
 class RecipeLikeSerializer(serializers.ModelSerializer):
     user = serializers.PrimaryKeyRelatedField(read_only=True)
 
     class Meta:
         model = RecipeLike
         fields = ('id', 'user', 'recipe')
+
+
+class BulkRecipeIdsSerializer(serializers.Serializer):
+    """
+    Serializer class for the recipe ids of a bulk like or bookmark request.
+    """
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False,
+        max_length=100)
+
+    def validate_ids(self, value):
+        # Drop duplicates but keep the order the client sent them in
+        return list(dict.fromkeys(value))
+
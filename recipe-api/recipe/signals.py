@@ -0,0 +1,39 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import cache
+from .ingredients import index_recipes
+from .models import Recipe, RecipeCategory
+from .tasks import process_recipe_picture
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def invalidate_recipe_cache(sender, instance, **kwargs):
+    cache.invalidate_recipes(instance.pk)
+
+
+@receiver(post_save, sender=Recipe)
+def process_picture(sender, instance, **kwargs):
+    if (instance.picture.name or '') != instance.picture_variants.get('source', ''):
+        transaction.on_commit(lambda: process_recipe_picture.delay(instance.pk))
+
+
+@receiver(post_save, sender=Recipe)
+def index_ingredients(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or 'ingredients' in update_fields:
+        index_recipes([instance])
+
+
+@receiver(post_save, sender=RecipeCategory)
+@receiver(post_delete, sender=RecipeCategory)
+def invalidate_category_cache(sender, instance, **kwargs):
+    cache.invalidate_all()
+
+
+@receiver(post_save, sender=RecipeCategory)
+@receiver(pre_delete, sender=RecipeCategory)
+def touch_category_recipes(sender, instance, created=False, **kwargs):
+    if not created:
+        Recipe.objects.filter(category=instance).touch()
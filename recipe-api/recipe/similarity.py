@@ -0,0 +1,107 @@
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Min
+from scipy import sparse
+
+from .models import Recipe, RecipeLike, RecipeSimilarity
+
+
+def like_matrix(recipe_ids, user_chunk):
+    """
+    Builds the user x recipe matrix of likes, one row per user who liked
+    any of the recipes.
+
+    recipe_ids is the sorted array of recipe ids mapped to the matrix
+    columns. Likes are read one range of user_chunk user ids at a time, so
+    the like table is never held in memory as Python objects.
+    """
+    size = len(recipe_ids)
+    bounds = RecipeLike.objects.aggregate(low=Min('user_id'), high=Max('user_id'))
+    if not size or bounds['low'] is None:
+        return sparse.csr_matrix((0, size), dtype=np.int32)
+
+    chunks = []
+    for start in range(bounds['low'], bounds['high'] + 1, user_chunk):
+        pairs = np.array(list(
+            RecipeLike.objects.filter(user_id__gte=start, user_id__lt=start + user_chunk)
+            .values_list('user_id', 'recipe_id')),
+            dtype=np.int64).reshape(-1, 2)
+        # Drop likes on recipes created after recipe_ids was read.
+        columns = np.minimum(np.searchsorted(recipe_ids, pairs[:, 1]), size - 1)
+        known = recipe_ids[columns] == pairs[:, 1]
+        if not known.any():
+            continue
+        _, rows = np.unique(pairs[known, 0], return_inverse=True)
+        chunks.append(sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.int32), (rows, columns[known])),
+            shape=(rows.max() + 1, size)))
+    if not chunks:
+        return sparse.csr_matrix((0, size), dtype=np.int32)
+    return sparse.vstack(chunks, format='csr')
+
+
+def top_neighbours(co_likes, likes, offset, count, min_co_likes):
+    """
+    Scores the pairs of one block of co-occurrence rows by cosine
+    similarity, co_likes / sqrt(likes_a * likes_b), and keeps the best count
+    neighbours of each recipe.
+
+    co_likes holds the rows of the recipes starting at column offset and
+    likes the like count of every recipe. Returns three aligned arrays:
+    source columns, neighbour columns and scores, grouped by source and
+    ordered by descending score.
+    """
+    co_likes = co_likes.tocoo()
+    sources = co_likes.row.astype(np.int64) + offset
+    targets = co_likes.col.astype(np.int64)
+    keep = (sources != targets) & (co_likes.data >= min_co_likes)
+    sources, targets = sources[keep], targets[keep]
+    scores = co_likes.data[keep] / np.sqrt(likes[sources] * likes[targets])
+
+    order = np.lexsort((targets, -scores, sources))
+    sources, targets, scores = sources[order], targets[order], scores[order]
+    rank = np.arange(len(sources)) - np.searchsorted(sources, sources)
+    keep = rank < count
+    return sources[keep], targets[keep], scores[keep]
+
+
+def similar_pairs(likes, block, count, min_co_likes):
+    """
+    Yields the top_neighbours of each block of block recipes in turn.
+
+    Only the block x recipe slice of the co-occurrence matrix is built at a
+    time and it is reduced to count neighbours per recipe before the next
+    one, so memory follows the block size rather than the square of the
+    recipe count.
+    """
+    likes = likes.tocsc()
+    like_counts = np.asarray(likes.sum(axis=0), dtype=np.float64).ravel()
+    for start in range(0, likes.shape[1], block):
+        co_likes = likes[:, start:start + block].T @ likes
+        yield top_neighbours(co_likes, like_counts, start, count, min_co_likes)
+
+
+def build_similarities():
+    """
+    Recomputes the stored similar recipes from the whole like table and
+    swaps them in within one transaction.
+
+    Returns the number of stored neighbour rows.
+    """
+    recipe_ids = np.fromiter(
+        Recipe.objects.order_by('pk').values_list('pk', flat=True).iterator(),
+        dtype=np.int64)
+    likes = like_matrix(recipe_ids, settings.SIMILAR_RECIPES_USER_CHUNK)
+    rows = [
+        RecipeSimilarity(recipe_id=recipe_id, similar_id=similar_id, score=score)
+        for sources, targets, scores in similar_pairs(
+            likes, settings.SIMILAR_RECIPES_RECIPE_BLOCK,
+            settings.SIMILAR_RECIPES_COUNT, settings.SIMILAR_RECIPES_MIN_CO_LIKES)
+        for recipe_id, similar_id, score in zip(
+            recipe_ids[sources].tolist(), recipe_ids[targets].tolist(), scores.tolist())
+    ]
+    with transaction.atomic():
+        RecipeSimilarity.objects.all().delete()
+        RecipeSimilarity.objects.bulk_create(rows, batch_size=5000)
+    return len(rows)
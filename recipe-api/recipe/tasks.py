@@ -0,0 +1,71 @@
+from celery import shared_task
+from django.db.models.functions import Now
+
+from . import like_buffer, similarity, trending
+from .cache import invalidate_all, invalidate_recipes
+from .images import delete_variants, generate_variants
+from .models import Recipe
+
+
+@shared_task
+def process_recipe_picture(recipe_id):
+    """
+    Generates the resized variants and placeholder of a recipe picture.
+
+    The result is only stored if the picture was not replaced while the
+    variants were being rendered.
+    """
+    recipe = Recipe.objects.filter(pk=recipe_id).first()
+    if recipe is None:
+        return
+
+    variants = generate_variants(recipe.picture, 'variants/recipe/{}'.format(recipe.pk)) \
+        if recipe.picture else {}
+    updated = Recipe.objects.filter(pk=recipe.pk, picture=recipe.picture.name) \
+        .update(picture_variants=variants, updated_at=Now())
+    if not updated:
+        delete_variants(variants)
+        return
+    if recipe.picture_variants.get('source') != variants.get('source'):
+        delete_variants(recipe.picture_variants)
+    invalidate_recipes(recipe.pk)
+
+
+@shared_task
+def flush_like_buffer():
+    """
+    Writes the likes buffered in Redis (RECIPE_LIKE_BUFFER mode) to the
+    database.
+
+    Returns:
+        The number of buffered like states applied.
+    """
+    return like_buffer.flush()
+
+
+
+@shared_task
+def refresh_trending_scores():
+    """
+    Decays the trending scores and adds the likes created since the last
+    refresh.
+
+    Returns:
+        The number of recipes with a trending score.
+    """
+    count = trending.refresh_scores()
+    invalidate_recipes()
+    return count
+
+
+@shared_task
+def build_recipe_similarities():
+    """
+    Rebuilds the similar recipes of every recipe from the like table.
+
+    Returns:
+        The number of stored neighbour rows.
+    """
+    count = similarity.build_similarities()
+    invalidate_all()
+    return count
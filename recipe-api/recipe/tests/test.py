@@ -1,23 +1,69 @@
 from rest_framework.test import APITestCase, APIRequestFactory, APIClient
 from rest_framework import status
+from rest_framework.request import Request
 from django.urls import reverse
+from events.models import OutboxEvent
 from users.models import CustomUser
 from recipe.models import (
     Recipe,
     RecipeCategory,
+    Ingredient,
+    RecipeIngredient,
     RecipeLike,
+    RecipeSimilarity,
+    TrendingScore,
     get_default_recipe_category,
 )
-import base64
-from io import BytesIO
+from io import BytesIO, StringIO
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from recipe.management.commands.benchmark_api import compare
+from users.factories import PASSWORD
+from django.conf import settings
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django_redis import get_redis_connection
+from django.test import AsyncClient, AsyncRequestFactory, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.http import http_date
+from recipe import cache as recipe_cache
 from PIL import Image
-from recipe.serializers import RecipeSerializer
+from recipe.images import blurhash
+from recipe.serializers import RecipeListSerializer, RecipeSerializer
+from recipe import like_buffer
+from recipe import trending
+from recipe.trending import refresh_scores
+from recipe.similarity import build_similarities
+from recipe.ingredients import parse_ingredients
+from recipe import renderers
+from recipe.parsers import ORJSONParser
+from recipe.renderers import ORJSONRenderer
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from django.utils.translation import gettext_lazy
+import decimal
+import uuid
+from recipe.tasks import flush_like_buffer, process_recipe_picture
+from unittest import mock
 from rest_framework_simplejwt.tokens import RefreshToken
 import tempfile
-from PIL import Image
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.utils import timezone
 import datetime
+import asyncio
+import threading
+import time
+from recipe import async_views
+from recipe.views import RecipeAPIView, RecipeListAPIView
+from config.middleware import RequestTimingMiddleware
+import json
+from users.tokens import RefreshToken as BlacklistingRefreshToken
+
+DUMMY_CACHE = {"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+LOCMEM_CACHE = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+REDIS_CACHE = settings.CACHES
 
+
+@override_settings(CACHES=DUMMY_CACHE)
 class RecipeAPITestCase(APITestCase):
 
     def setUp(self):
@@ -57,6 +103,12 @@ class RecipeAPITestCase(APITestCase):
 
         
 
+    def get_image_bytes(self, size):
+        img = Image.new('RGB', size, color='blue')
+        img_io = BytesIO()
+        img.save(img_io, format='JPEG')
+        return img_io.getvalue()
+
     def get_temporary_image_file(self):
     # Create a temporary image in memory
         img = Image.new('RGB', (100, 100), color='blue')
@@ -174,12 +226,13 @@ class RecipeAPITestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
         # Validate the response data structure and content
-        expected_data = RecipeSerializer(
+        expected_data = RecipeListSerializer(
             instance=[self.recipe1], many=True
         ).data  
-        self.assertEqual(response.data, expected_data)
+        self.assertEqual(response.data["results"], expected_data)
+        self.assertNotIn("procedure", response.data["results"][0])
 
-        for recipe_data in response.data:
+        for recipe_data in response.data["results"]:
             self.assertIn("title", recipe_data)
             self.assertEqual(recipe_data["title"], self.recipe1.title)
 
@@ -287,5 +340,933 @@ class RecipeAPITestCase(APITestCase):
 
         # Check that no like was created
         self.assertFalse(RecipeLike.objects.filter(user=self.user, recipe=self.recipe1).exists())
-        
-        
+
+    def test_like_and_unlike_update_like_count(self):
+        self.client.force_authenticate(user=self.other_user)
+        self.client.post(self.like_url)
+        self.recipe1.refresh_from_db()
+        self.assertEqual(self.recipe1.like_count, 1)
+
+        self.client.delete(self.like_url)
+        self.recipe1.refresh_from_db()
+        self.assertEqual(self.recipe1.like_count, 0)
+
+    def test_like_and_unlike_publish_events(self):
+        self.client.force_authenticate(user=self.other_user)
+        self.client.post(self.like_url)
+        self.assertEqual(OutboxEvent.objects.filter(topic="recipe.liked").count(), 1)
+        self.client.delete(self.like_url)
+        events = list(OutboxEvent.objects.values_list("topic", "payload"))
+        payload = {"user": self.other_user.id, "recipe": self.recipe1.id}
+        self.assertEqual(events, [("recipe.liked", payload), ("recipe.unliked", payload)])
+
+    def test_like_is_written_in_a_single_statement(self):
+        self.client.force_authenticate(user=self.other_user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.like_url)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        writes = [q["sql"] for q in queries if "recipe_recipelike" in q["sql"]]
+        self.assertEqual(len(writes), 1)
+        self.recipe1.refresh_from_db()
+        self.assertEqual(self.recipe1.like_count, 1)
+
+    def test_like_missing_recipe_returns_404(self):
+        self.client.force_authenticate(user=self.user)
+        url = reverse("recipe:recipe-like", kwargs={"pk": self.recipe1.id + 1000})
+        self.assertEqual(self.client.post(url).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.delete(url).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_duplicate_like_rejected_by_constraint(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            RecipeLike.objects.create(user=self.user, recipe=self.recipe1)
+
+    @override_settings(RECIPE_LIKE_BUFFER=True, CACHES=REDIS_CACHE)
+    def test_buffered_likes_are_coalesced_and_flushed(self):
+        try:
+            get_redis_connection().delete(like_buffer.PENDING_KEY, like_buffer.PROCESSING_KEY)
+        except Exception:
+            self.skipTest("Redis is not available")
+        Recipe.objects.filter(pk=self.recipe1.pk).reconcile_counters()
+
+        self.client.force_authenticate(user=self.other_user)
+        for _ in range(3):
+            self.assertEqual(self.client.post(self.like_url).status_code, status.HTTP_202_ACCEPTED)
+            self.assertEqual(self.client.delete(self.like_url).status_code, status.HTTP_202_ACCEPTED)
+        self.client.post(self.like_url)
+        self.client.force_authenticate(user=self.user)
+        self.client.delete(self.like_url)
+        self.assertFalse(RecipeLike.objects.filter(user=self.other_user).exists())
+
+        self.assertEqual(flush_like_buffer(), 2)
+
+        self.assertTrue(RecipeLike.objects.filter(user=self.other_user, recipe=self.recipe1).exists())
+        self.assertFalse(RecipeLike.objects.filter(user=self.user, recipe=self.recipe1).exists())
+        self.recipe1.refresh_from_db()
+        self.assertEqual(self.recipe1.like_count, 1)
+        self.assertEqual(flush_like_buffer(), 0)
+
+    @override_settings(RECIPE_LIKE_BUFFER=True, CACHES=REDIS_CACHE)
+    def test_overlapping_flushes_are_skipped(self):
+        try:
+            redis = get_redis_connection()
+            redis.delete(like_buffer.PENDING_KEY, like_buffer.PROCESSING_KEY)
+        except Exception:
+            self.skipTest("Redis is not available")
+        like_buffer.buffer_like(self.other_user.pk, self.recipe1.pk, True)
+
+        lock = redis.lock(like_buffer.LOCK_KEY, timeout=10)
+        self.assertTrue(lock.acquire(blocking=False))
+        try:
+            self.assertEqual(flush_like_buffer(), 0)
+            self.assertTrue(redis.exists(like_buffer.PENDING_KEY))
+        finally:
+            lock.release()
+        self.assertEqual(flush_like_buffer(), 1)
+        self.assertTrue(RecipeLike.objects.filter(user=self.other_user, recipe=self.recipe1).exists())
+
+    @override_settings(RECIPE_LIKE_BUFFER=True, CACHES=REDIS_CACHE)
+    def test_flush_skips_likes_of_deleted_users(self):
+        try:
+            get_redis_connection().delete(like_buffer.PENDING_KEY, like_buffer.PROCESSING_KEY)
+        except Exception:
+            self.skipTest("Redis is not available")
+        Recipe.objects.filter(pk=self.recipe1.pk).reconcile_counters()
+        self.recipe1.refresh_from_db()
+        gone = CustomUser.objects.create_user(
+            username="gone", email="gone@example.org", password="password")
+        like_buffer.buffer_like(gone.pk, self.recipe1.pk, True)
+        like_buffer.buffer_like(self.other_user.pk, self.recipe1.pk, True)
+        gone.delete()
+
+        self.assertEqual(flush_like_buffer(), 2)
+        connection.check_constraints()
+        self.assertTrue(RecipeLike.objects.filter(user=self.other_user, recipe=self.recipe1).exists())
+        self.assertFalse(get_redis_connection().exists(like_buffer.PROCESSING_KEY))
+        like_count = self.recipe1.like_count
+        self.recipe1.refresh_from_db()
+        self.assertEqual(self.recipe1.like_count, like_count + 1)
+
+    def test_like_count_never_negative(self):
+        Recipe.objects.filter(pk=self.recipe1.pk).adjust_counter('like_count', -5)
+        self.recipe1.refresh_from_db()
+        self.assertEqual(self.recipe1.like_count, 0)
+
+    def test_reconcile_recipe_counters(self):
+        Recipe.objects.filter(pk=self.recipe1.pk).update(like_count=42, bookmark_count=7)
+        self.other_user.profile.bookmarks.add(self.recipe1)
+
+        call_command("reconcile_recipe_counters", stdout=StringIO())
+
+        self.recipe1.refresh_from_db()
+        self.assertEqual(self.recipe1.like_count, 1)
+        self.assertEqual(self.recipe1.bookmark_count, 1)
+
+    def create_recipes(self, count):
+        categories = [
+            RecipeCategory.objects.create(name=f"Category {i}") for i in range(5)
+        ]
+        return Recipe.objects.bulk_create(
+            Recipe(
+                title=f"Bulk Recipe {i}",
+                author=self.other_user if i % 2 else self.user,
+                category=categories[i % 5],
+                cook_time="00:15:00",
+                ingredients="Bulk ingredients",
+                procedure="Bulk procedure",
+            )
+            for i in range(count)
+        )
+
+    def test_recipe_list_query_count_is_constant(self):
+        url = reverse("recipe:recipe-list")
+        with CaptureQueriesContext(connection) as single:
+            response = self.client.get(url, {"page_size": 100})
+        self.assertEqual(len(response.data["results"]), 1)
+
+        self.create_recipes(499)
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(url, {"page_size": 100})
+        self.assertEqual(len(response.data["results"]), 100)
+        self.assertEqual(len(single), len(many))
+
+    def test_recipe_list_cursor_pagination(self):
+        self.create_recipes(44)
+        url = reverse("recipe:recipe-list")
+        seen = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data["results"]), 20)
+            seen.extend(recipe["id"] for recipe in response.data["results"])
+            url = response.data["next"]
+
+        self.assertEqual(len(seen), 45)
+        self.assertEqual(len(set(seen)), 45)
+
+    def test_recipe_list_cursor_pagination_keeps_filters(self):
+        self.create_recipes(30)
+        url = reverse("recipe:recipe-list")
+        response = self.client.get(url, {"author__username": "otheruser", "page_size": 10})
+        seen = []
+        while True:
+            self.assertTrue(all(r["username"] == "otheruser" for r in response.data["results"]))
+            seen.extend(recipe["id"] for recipe in response.data["results"])
+            if not response.data["next"]:
+                break
+            self.assertIn("author__username=otheruser", response.data["next"])
+            response = self.client.get(response.data["next"])
+
+        self.assertEqual(len(seen), 15)
+        self.assertEqual(len(set(seen)), 15)
+
+    def test_recipe_list_cursor_compares_created_at_and_id(self):
+        self.create_recipes(24)
+        Recipe.objects.update(created_at=timezone.now())
+        url = reverse("recipe:recipe-list") + "?page_size=10"
+        pages = []
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            pages.append([recipe["id"] for recipe in response.data["results"]])
+            if pages[1:]:
+                sql = next(q["sql"] for q in queries if "ORDER BY" in q["sql"])
+                self.assertIn('("recipe_recipe"."created_at", "recipe_recipe"."id") <', sql)
+                self.assertNotIn("OFFSET", sql)
+            url = response.data["next"]
+
+        ids = list(Recipe.objects.order_by("-id").values_list("id", flat=True))
+        self.assertEqual(sum(pages, []), ids)
+
+        response = self.client.get(response.data["previous"])
+        self.assertEqual([recipe["id"] for recipe in response.data["results"]], pages[1])
+
+        # Positions that are not JSON, or not a list of strings: p=notjson, p=[1,2], p=[null,"1"]
+        for cursor in ("cD1ub3Rqc29u", "cD1bMSwyXQ==", "cD1bbnVsbCwiMSJd"):
+            response = self.client.get(reverse("recipe:recipe-list"), {"cursor": cursor})
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_search_ranks_title_matches_first(self):
+        Recipe.objects.create(
+            title="Garlic Noodles",
+            author=self.user,
+            category=self.category,
+            cook_time="00:20:00",
+            ingredients="Noodles, butter",
+            procedure="Boil",
+        )
+        Recipe.objects.create(
+            title="Roast Chicken",
+            author=self.user,
+            category=self.category,
+            cook_time="01:20:00",
+            ingredients="Chicken, garlic, lemon",
+            procedure="Roast",
+        )
+        response = self.client.get(reverse("recipe:recipe-search"), {"q": "garlic"})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("count", response.data)
+        titles = [recipe["title"] for recipe in response.data["results"]]
+        self.assertEqual(titles, ["Garlic Noodles", "Roast Chicken"])
+
+    def test_search_ranks_a_bounded_candidate_set_without_counting(self):
+        for index in range(3):
+            Recipe.objects.create(
+                title=f"Garlic Bread {index}",
+                author=self.user,
+                category=self.category,
+                cook_time="00:10:00",
+                ingredients="Bread, garlic",
+                procedure="Bake",
+            )
+        self.assertEqual(Recipe.objects.search("garlic", max_candidates=2).count(), 2)
+
+        seen = []
+        url = reverse("recipe:recipe-search") + "?q=garlic&page_size=2"
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertFalse(any("COUNT(" in query["sql"] for query in queries))
+            seen.extend(recipe["id"] for recipe in response.data["results"])
+            url = response.data["next"]
+        self.assertEqual(len(set(seen)), 3)
+        self.assertNotIn("page=", response.data["previous"])
+
+        response = self.client.get(reverse("recipe:recipe-search"), {"q": "garlic", "page": 0})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_search_vector_follows_updates(self):
+        self.recipe1.title = "Spicy Lentil Soup"
+        self.recipe1.save()
+        response = self.client.get(reverse("recipe:recipe-search"), {"q": "lentils"})
+        self.assertEqual([r["id"] for r in response.data["results"]], [self.recipe1.id])
+
+    def test_search_without_query_is_empty(self):
+        response = self.client.get(reverse("recipe:recipe-search"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["results"], [])
+
+    @override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+    def test_picture_upload_generates_variants_after_commit(self):
+        self.recipe1.picture = SimpleUploadedFile(
+            "big.jpg", self.get_image_bytes((2000, 1000)), content_type="image/jpeg")
+        with mock.patch.object(process_recipe_picture, "delay") as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.recipe1.save()
+        delay.assert_called_once_with(self.recipe1.pk)
+
+        process_recipe_picture(self.recipe1.pk)
+
+        self.client.force_authenticate(user=self.user)
+        variants = self.client.get(self.detail_url).data["picture_variants"]
+        self.assertEqual(len(variants["placeholder"]), 28)
+        self.assertEqual((variants["thumbnail"]["width"], variants["thumbnail"]["height"]), (160, 80))
+        self.assertEqual((variants["card"]["width"], variants["card"]["height"]), (480, 240))
+        self.assertEqual((variants["full"]["width"], variants["full"]["height"]), (1280, 640))
+        self.assertTrue(variants["card"]["webp"].endswith("card.webp"))
+        self.assertTrue(variants["card"]["jpeg"].startswith("http://testserver/"))
+
+    def test_recipe_without_picture_has_no_variants(self):
+        self.assertIsNone(RecipeSerializer(self.recipe1).data["picture_variants"])
+
+    def test_blurhash_of_solid_image(self):
+        image = Image.new("RGB", (64, 48), color=(255, 0, 0))
+        value = blurhash(image)
+        self.assertEqual(len(value), 28)
+        # Characters 2-5 hold the average colour, base83 encoded
+        alphabet = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~"
+        average = 0
+        for char in value[2:6]:
+            average = average * 83 + alphabet.index(char)
+        self.assertEqual(average, 0xFF0000)
+
+    def test_bulk_like_and_unlike(self):
+        recipe2 = Recipe.objects.create(
+            title="Test Recipe 2",
+            author=self.other_user,
+            category=self.category,
+            cook_time="00:10:00",
+            ingredients="Test ingredients",
+            procedure="Test procedure",
+        )
+        url = reverse("recipe:recipe-bulk-like")
+        missing = recipe2.id + 1000
+        self.client.force_authenticate(user=self.user)
+
+        response = self.client.post(url, {"ids": [self.recipe1.id, recipe2.id, missing, recipe2.id]}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["results"], [
+            {"id": self.recipe1.id, "status": "already_liked"},
+            {"id": recipe2.id, "status": "liked"},
+            {"id": missing, "status": "not_found"},
+        ])
+        recipe2.refresh_from_db()
+        self.assertEqual(recipe2.like_count, 1)
+        self.assertEqual(RecipeLike.objects.filter(user=self.user).count(), 2)
+
+        response = self.client.delete(url, {"ids": [recipe2.id, missing]}, format="json")
+        self.assertEqual(response.data["results"], [
+            {"id": recipe2.id, "status": "unliked"},
+            {"id": missing, "status": "not_found"},
+        ])
+        recipe2.refresh_from_db()
+        self.assertEqual(recipe2.like_count, 0)
+        self.assertFalse(RecipeLike.objects.filter(user=self.user, recipe=recipe2).exists())
+
+    def test_bulk_like_rejects_invalid_payload(self):
+        self.client.force_authenticate(user=self.user)
+        url = reverse("recipe:recipe-bulk-like")
+        self.assertEqual(self.client.post(url, {"ids": []}, format="json").status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            self.client.post(url, {"ids": list(range(1, 102))}, format="json").status_code,
+            status.HTTP_400_BAD_REQUEST)
+
+
+    @override_settings(TRENDING_HALF_LIFE_HOURS=24, TRENDING_COMMIT_MARGIN=0)
+    def test_trending_ranks_by_decayed_likes(self):
+        dessert = RecipeCategory.objects.create(name="Dessert")
+        recipe2 = Recipe.objects.create(
+            title="Test Recipe 2",
+            author=self.other_user,
+            category=dessert,
+            cook_time="00:10:00",
+            ingredients="Test ingredients",
+            procedure="Test procedure",
+        )
+        now = timezone.now()
+        # Two likes two half-lives old weigh 0.25 each, less than one fresh like.
+        RecipeLike.objects.create(user=self.other_user, recipe=recipe2)
+        RecipeLike.objects.create(user=self.user, recipe=recipe2)
+        RecipeLike.objects.filter(recipe=recipe2).update(created=now - datetime.timedelta(hours=48))
+        RecipeLike.objects.filter(recipe=self.recipe1).update(created=now - datetime.timedelta(minutes=1))
+
+        self.assertEqual(refresh_scores(now), 2)
+        self.assertAlmostEqual(TrendingScore.objects.get(recipe=recipe2).score, 0.5, places=3)
+
+        url = reverse("recipe:recipe-trending")
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([r["id"] for r in response.data["results"]], [self.recipe1.id, recipe2.id])
+
+        response = self.client.get(url, {"category__name": "Dessert"})
+        self.assertEqual([r["id"] for r in response.data["results"]], [recipe2.id])
+
+    @override_settings(TRENDING_HALF_LIFE_HOURS=24, TRENDING_COMMIT_MARGIN=0, TRENDING_MIN_SCORE=0.01)
+    def test_trending_refresh_is_incremental(self):
+        now = timezone.now()
+        RecipeLike.objects.filter(recipe=self.recipe1).update(created=now)
+        refresh_scores(now)
+        self.assertAlmostEqual(TrendingScore.objects.get().score, 1.0, places=3)
+
+        # A day later the old like has halved and only the new one is added.
+        later = now + datetime.timedelta(hours=24)
+        RecipeLike.objects.create(user=self.other_user, recipe=self.recipe1)
+        RecipeLike.objects.filter(user=self.other_user).update(created=later)
+        refresh_scores(later)
+        self.assertAlmostEqual(TrendingScore.objects.get().score, 1.5, places=3)
+
+        # Refreshing again adds nothing twice.
+        refresh_scores(later)
+        self.assertAlmostEqual(TrendingScore.objects.get().score, 1.5, places=3)
+
+        # Scores that decayed away are dropped.
+        refresh_scores(later + datetime.timedelta(days=30))
+        self.assertFalse(TrendingScore.objects.exists())
+
+    def test_trending_refreshes_are_serialized(self):
+        held, release = threading.Event(), threading.Event()
+
+        def hold_refresh_lock():
+            try:
+                with transaction.atomic(), connection.cursor() as cursor:
+                    cursor.execute("SELECT pg_advisory_xact_lock(%s)", [trending.REFRESH_LOCK_ID])
+                    held.set()
+                    release.wait(5)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=hold_refresh_lock)
+        thread.start()
+        try:
+            self.assertTrue(held.wait(5))
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL lock_timeout = '100ms'")
+            with self.assertRaises(OperationalError):
+                refresh_scores()
+        finally:
+            release.set()
+            thread.join()
+
+    def create_similarity_fixture(self):
+        recipe2, recipe3 = (
+            Recipe.objects.create(
+                title=title,
+                author=self.other_user,
+                category=self.category,
+                cook_time="00:10:00",
+                ingredients="Test ingredients",
+                procedure="Test procedure",
+            )
+            for title in ("Test Recipe 2", "Test Recipe 3")
+        )
+        third, fourth = (
+            CustomUser.objects.create_user(username=name, password="pass", email=f"{name}@example.com")
+            for name in ("third", "fourth")
+        )
+        # recipe1 likes: user, other_user, third
+        # recipe2 likes: user, other_user -> 2 shared with recipe1
+        # recipe3 likes: user, third, fourth -> 2 shared with recipe1, 1 with recipe2
+        RecipeLike.objects.like([
+            (self.user.pk, recipe2.pk), (self.user.pk, recipe3.pk),
+            (self.other_user.pk, self.recipe1.pk), (self.other_user.pk, recipe2.pk),
+            (third.pk, self.recipe1.pk), (third.pk, recipe3.pk),
+            (fourth.pk, recipe3.pk),
+        ])
+        return recipe2, recipe3
+
+    @override_settings(SIMILAR_RECIPES_USER_CHUNK=1, SIMILAR_RECIPES_RECIPE_BLOCK=1,
+                       SIMILAR_RECIPES_MIN_CO_LIKES=2, SIMILAR_RECIPES_COUNT=20)
+    def test_similar_recipes_from_co_likes(self):
+        recipe2, recipe3 = self.create_similarity_fixture()
+
+        self.assertEqual(build_similarities(), 4)
+        score = RecipeSimilarity.objects.get(recipe=self.recipe1, similar=recipe2).score
+        self.assertAlmostEqual(score, 2 / (3 * 2) ** 0.5)
+
+        response = self.client.get(reverse("recipe:recipe-similar", kwargs={"pk": self.recipe1.id}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([r["id"] for r in response.data], [recipe2.id, recipe3.id])
+
+        # A single shared like is below the threshold.
+        response = self.client.get(reverse("recipe:recipe-similar", kwargs={"pk": recipe2.id}))
+        self.assertEqual([r["id"] for r in response.data], [self.recipe1.id])
+
+    @override_settings(SIMILAR_RECIPES_RECIPE_BLOCK=2, SIMILAR_RECIPES_MIN_CO_LIKES=1, SIMILAR_RECIPES_COUNT=1)
+    def test_similar_recipes_keeps_top_neighbours(self):
+        recipe2, recipe3 = self.create_similarity_fixture()
+        build_similarities()
+        self.assertEqual(
+            list(RecipeSimilarity.objects.filter(recipe=recipe2).values_list("similar_id", flat=True)),
+            [self.recipe1.id])
+        self.assertEqual(RecipeSimilarity.objects.count(), 3)
+
+        # Rebuilding replaces the previous rows.
+        build_similarities()
+        self.assertEqual(RecipeSimilarity.objects.count(), 3)
+
+    def test_similar_recipes_of_missing_recipe(self):
+        response = self.client.get(reverse("recipe:recipe-similar", kwargs={"pk": self.recipe1.id + 1000}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get(reverse("recipe:recipe-similar", kwargs={"pk": self.recipe1.id}))
+        self.assertEqual(response.data, [])
+
+    def test_parse_ingredients(self):
+        self.assertEqual(
+            parse_ingredients("2 cloves of Garlic (minced)\n500g chicken breasts, 1/2 cup olive oil; salt and pepper\n- 3 Tomatoes"),
+            {"garlic", "chicken breast", "olive oil", "salt", "pepper", "tomato"})
+        self.assertEqual(parse_ingredients("2 cups\n\n"), set())
+
+    def test_ingredients_indexed_on_save(self):
+        self.assertEqual(
+            list(RecipeIngredient.objects.filter(recipe=self.recipe1).values_list("ingredient__name", flat=True)),
+            ["test ingredient"])
+        self.recipe1.ingredients = "1 chicken, 2 cloves garlic, rice"
+        self.recipe1.save()
+        self.recipe1.refresh_from_db()
+        self.assertEqual(self.recipe1.ingredient_count, 3)
+        self.assertEqual(
+            set(RecipeIngredient.objects.filter(recipe=self.recipe1).values_list("ingredient__name", flat=True)),
+            {"chicken", "garlic", "rice"})
+
+    def test_recipes_by_ingredients_ranked_by_coverage(self):
+        self.recipe1.ingredients = "chicken, garlic, rice, saffron"
+        self.recipe1.save()
+        recipe2 = Recipe.objects.create(
+            title="Test Recipe 2",
+            author=self.other_user,
+            category=self.category,
+            cook_time="00:10:00",
+            ingredients="Chicken\nGarlic",
+            procedure="Test procedure",
+        )
+        Recipe.objects.create(
+            title="Test Recipe 3",
+            author=self.other_user,
+            category=self.category,
+            cook_time="00:10:00",
+            ingredients="beef",
+            procedure="Test procedure",
+        )
+        url = reverse("recipe:recipe-by-ingredients")
+
+        response = self.client.get(url, {"ingredients": "chicken, garlic, rice"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data["results"]
+        self.assertEqual([r["id"] for r in results], [recipe2.id, self.recipe1.id])
+        self.assertEqual([r["matched_ingredients"] for r in results], [2, 3])
+        self.assertEqual([r["ingredient_coverage"] for r in results], [1.0, 0.75])
+
+        self.assertEqual(self.client.get(url).data["results"], [])
+        response = self.client.get(url, {"ingredients": ",".join("item%s" % i for i in "abcdefghijklmnopqrstu")})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_index_recipe_ingredients_command(self):
+        Recipe.objects.filter(pk=self.recipe1.pk).update(ingredients="Eggs, flour", ingredient_count=0)
+        out = StringIO()
+        call_command("index_recipe_ingredients", "--batch-size", "1", stdout=out)
+        self.assertIn("Indexed ingredients of 1 recipes.", out.getvalue())
+        self.recipe1.refresh_from_db()
+        self.assertEqual(self.recipe1.ingredient_count, 2)
+        self.assertTrue(Ingredient.objects.filter(name="egg").exists())
+
+    def test_sparse_fieldsets(self):
+        url = reverse("recipe:recipe-list")
+        response = self.client.get(url, {"fields": "id,title,ingredients,bogus"})
+        self.assertEqual(set(response.data["results"][0]), {"id", "title", "ingredients"})
+
+        response = self.client.get(url, {"omit": "picture_variants,username"})
+        self.assertEqual(
+            set(response.data["results"][0]),
+            set(RecipeListSerializer.Meta.fields) - {"picture_variants", "username"})
+
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.detail_url, {"fields": "id,desc"})
+        self.assertEqual(response.data, {"id": self.recipe1.id, "desc": ""})
+
+    def test_list_leaves_long_texts_in_the_database(self):
+        url = reverse("recipe:recipe-list")
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        select = next(q["sql"] for q in queries.captured_queries if 'FROM "recipe_recipe"' in q["sql"] and "LIMIT" in q["sql"])
+        for column in ("ingredients", "procedure", "search_vector", "desc"):
+            self.assertNotIn('"recipe_recipe"."{}"'.format(column), select)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {"fields": "id,procedure"})
+        self.assertEqual(response.data["results"][0]["procedure"], "Test procedure")
+        self.assertEqual(len([q for q in queries.captured_queries if 'FROM "recipe_recipe"' in q["sql"]]), 2)
+
+    def test_recipe_conditional_get(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.detail_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response["ETag"]
+        self.assertTrue(response.has_header("Last-Modified"))
+
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response["ETag"], etag)
+        self.assertEqual(response.content, b"")
+
+        response = self.client.get(self.detail_url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # Likes change the representation, and so the validators.
+        RecipeLike.objects.like([(self.other_user.pk, self.recipe1.pk)])
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_recipe_list_conditional_get(self):
+        url = reverse("recipe:recipe-list")
+        etag = self.client.get(url)["ETag"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+        # Filters are part of the tag
+        self.assertNotEqual(self.client.get(url, {"author__username": "nobody"})["ETag"], etag)
+
+        self.category.name = "Renamed Category"
+        self.category.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response["ETag"]
+
+        self.recipe1.delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+    def test_recipe_update_if_match(self):
+        self.client.force_authenticate(user=self.user)
+        etag = self.client.get(self.detail_url)["ETag"]
+
+        response = self.client.patch(self.detail_url, {"title": "First"}, format="json", HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+
+        # A second writer still holding the old tag is rejected.
+        response = self.client.patch(self.detail_url, {"title": "Second"}, format="json", HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.recipe1.refresh_from_db()
+        self.assertEqual(self.recipe1.title, "First")
+
+        missing = reverse("recipe:recipe-detail", kwargs={"pk": self.recipe1.id + 1000})
+        response = self.client.patch(missing, {"title": "Third"}, format="json", HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class RecipeCacheTestCase(APITestCase):
+
+    def setUp(self):
+        recipe_cache.get_cache().clear()
+        self.user = CustomUser.objects.create_user(
+            username="testuser", password="testpassword", email="testuser@example.com"
+        )
+        self.category = RecipeCategory.objects.create(name="Test Category")
+        self.recipe = Recipe.objects.create(
+            title="Test Recipe 1",
+            author=self.user,
+            category=self.category,
+            cook_time="00:30:00",
+            ingredients="Test ingredients",
+            procedure="Test procedure",
+        )
+        self.list_url = reverse("recipe:recipe-list")
+        self.detail_url = reverse("recipe:recipe-detail", kwargs={"pk": self.recipe.id})
+        self.like_url = reverse("recipe:recipe-like", kwargs={"pk": self.recipe.id})
+
+    def test_second_read_is_served_from_cache(self):
+        response = self.client.get(self.list_url)
+        self.assertEqual(response["X-Cache"], "MISS")
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.list_url)
+        self.assertEqual(response["X-Cache"], "HIT")
+        self.assertEqual(response.data["results"][0]["title"], "Test Recipe 1")
+        self.assertEqual(recipe_cache.get_stats(), {"hit": 1, "miss": 1, "rebuild": 1})
+
+    def test_conditional_get_after_like(self):
+        self.client.force_authenticate(user=self.user)
+        etag = self.client.get(self.detail_url)["ETag"]
+        with self.assertNumQueries(0):
+            response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.client.post(self.like_url)
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["total_number_of_likes"], 1)
+
+    def test_conditional_list_get_does_not_scan_recipes(self):
+        self.client.force_authenticate(user=self.user)
+        etag = self.client.get(self.list_url)["ETag"]
+        self.client.post(self.like_url)
+
+        # The like bumped the list version, so the tag changed and the only
+        # query rebuilds the page.
+        with self.assertNumQueries(1):
+            response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_conditional_list_get_by_modification_time(self):
+        self.client.force_authenticate(user=self.user)
+        last_modified = self.client.get(self.list_url)["Last-Modified"]
+        with self.assertNumQueries(0):
+            response = self.client.get(self.list_url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        later = time.time() + 5
+        with mock.patch("recipe.cache.time.time", return_value=later):
+            self.client.post(self.like_url)
+        response = self.client.get(self.list_url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Last-Modified"], http_date(later))
+
+        # A version whose time was lost is taken to be new.
+        recipe_cache.get_cache().delete("recipe-cache:changed:list")
+        with mock.patch("recipe.cache.time.time", return_value=later + 5):
+            response = self.client.get(self.list_url, HTTP_IF_MODIFIED_SINCE=http_date(later))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Last-Modified"], http_date(later + 5))
+
+    def test_filters_are_part_of_the_key(self):
+        self.client.get(self.list_url)
+        response = self.client.get(self.list_url, {"author__username": "nobody"})
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.data["results"], [])
+
+    def test_recipe_save_invalidates_list_and_detail(self):
+        self.client.force_authenticate(user=self.user)
+        self.client.get(self.list_url)
+        self.client.get(self.detail_url)
+
+        self.client.patch(self.detail_url, {"title": "Renamed"}, format="json")
+
+        response = self.client.get(self.list_url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.data["results"][0]["title"], "Renamed")
+        response = self.client.get(self.detail_url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.data["title"], "Renamed")
+
+    def test_like_invalidates_cached_counts(self):
+        self.client.force_authenticate(user=self.user)
+        self.client.get(self.detail_url)
+        self.client.post(self.like_url)
+
+        response = self.client.get(self.detail_url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.data["total_number_of_likes"], 1)
+
+    def test_if_match_is_checked_against_the_locked_row(self):
+        self.client.force_authenticate(user=self.user)
+        etag = self.client.get(self.detail_url)["ETag"]
+        # A write that bypassed invalidation leaves the cached validators stale.
+        Recipe.objects.filter(pk=self.recipe.pk).update(title="Elsewhere", updated_at=timezone.now())
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(
+                self.detail_url, {"title": "Lost update"}, format="json", HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.assertTrue(any("FOR UPDATE" in query["sql"] for query in queries.captured_queries))
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.title, "Elsewhere")
+
+    @override_settings(RECIPE_CACHE_LOCK_WAIT=0.2)
+    def test_concurrent_miss_waits_for_rebuild(self):
+        request = APIRequestFactory().get(self.list_url)
+        key = recipe_cache.build_key(Request(request), recipe_cache.LIST_NAMESPACE)
+        recipe_cache.get_cache().add(key + ":lock", 1)
+
+        response = self.client.get(self.list_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertIsNone(recipe_cache.get_cache().get(key))
+        self.assertEqual(recipe_cache.get_stats()["rebuild"], 0)
+
+
+class ORJSONTestCase(APITestCase):
+
+    def payload(self):
+        return {
+            "cook_time": datetime.time(0, 30, 15, 123456),
+            "created": datetime.datetime(2024, 5, 1, 12, 30, 1, 987654, tzinfo=datetime.timezone.utc),
+            "day": datetime.date(2024, 5, 1),
+            "price": decimal.Decimal("12.50"),
+            "label": gettext_lazy("Recipe"),
+            "id": uuid.UUID("12345678-1234-5678-1234-567812345678"),
+            "text": "injera \u2028 wat é",
+            "nested": [{1: None, "ok": True}],
+        }
+
+    def test_renders_like_the_stock_renderer(self):
+        self.assertEqual(ORJSONRenderer().render(self.payload()), JSONRenderer().render(self.payload()))
+        self.assertEqual(ORJSONRenderer().render(None), b"")
+
+    def test_floats_keep_their_value_but_not_their_spelling(self):
+        data = {"values": [0.1, 1e-05, 1e16, -2.5]}
+        rendered = ORJSONRenderer().render(data)
+        self.assertNotEqual(rendered, JSONRenderer().render(data))
+        self.assertEqual(json.loads(rendered), data)
+
+    def test_non_finite_floats_render_as_null(self):
+        data = {"values": [float("nan"), float("inf"), float("-inf")]}
+        with self.assertRaises(ValueError):
+            JSONRenderer().render(data)
+        self.assertEqual(ORJSONRenderer().render(data), b'{"values":[null,null,null]}')
+
+    def test_falls_back_to_the_stock_renderer(self):
+        big = {"value": 2 ** 70}
+        self.assertEqual(ORJSONRenderer().render(big), JSONRenderer().render(big))
+        pretty = ORJSONRenderer().render({"a": 1}, "application/json; indent=4")
+        self.assertEqual(pretty, b'{\n    "a": 1\n}')
+        with mock.patch.object(renderers, "orjson", None):
+            self.assertEqual(ORJSONRenderer().render(self.payload()), JSONRenderer().render(self.payload()))
+
+    def test_parser(self):
+        self.assertEqual(ORJSONParser().parse(BytesIO('{"title": "wat é", "ids": [1, 2]}'.encode())),
+                         {"title": "wat é", "ids": [1, 2]})
+        with self.assertRaises(ParseError):
+            ORJSONParser().parse(BytesIO(b'{"title": '))
+        latin = ORJSONParser().parse(BytesIO('{"t": "é"}'.encode("latin-1")), parser_context={"encoding": "latin-1"})
+        self.assertEqual(latin, {"t": "é"})
+
+    def test_api_uses_orjson(self):
+        response = self.client.get(reverse("recipe:recipe-list"), HTTP_ACCEPT="application/json")
+        self.assertIsInstance(response.accepted_renderer, ORJSONRenderer)
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command("benchmark_json", "--recipes", "5", "--repeat", "2", stdout=out)
+        self.assertIn("render: stock", out.getvalue())
+        self.assertIn("parse: stock", out.getvalue())
+
+
+@override_settings(CACHES=DUMMY_CACHE, REQUEST_TIMING_HEADER=True)
+class AsyncViewTestCase(TransactionTestCase):
+    # The async views query from worker threads, which need committed data.
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            username='testuser', password='password123', email='testuser@example.com')
+        self.recipe = Recipe.objects.create(
+            title='Test Recipe', author=self.user, category=RecipeCategory.objects.create(name='Dinner'),
+            cook_time='00:30:00', ingredients='Eggs', procedure='Cook')
+        self.token = BlacklistingRefreshToken.for_user(self.user).access_token
+
+    def get(self, path):
+        # AsyncRequestFactory turns extra arguments into request headers.
+        return AsyncRequestFactory().get(path, authorization='Bearer {}'.format(self.token))
+
+    async def test_async_detail_view(self):
+        view = async_views.async_view(RecipeAPIView)
+        self.assertTrue(asyncio.iscoroutinefunction(view))
+        self.assertIs(view.cls, RecipeAPIView)
+
+        response = await view(self.get('/api/recipe/{}/'.format(self.recipe.pk)),
+                              pk=self.recipe.pk)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.is_rendered)
+        self.assertIn(b'"title":"Test Recipe"', response.content)
+
+    async def test_async_views_run_concurrently_off_the_event_loop(self):
+        loop_thread = threading.get_ident()
+        threads = set()
+        barrier = threading.Barrier(2, timeout=5)
+        original = RecipeListAPIView.list
+
+        def list_(view, request, *args, **kwargs):
+            threads.add(threading.get_ident())
+            # Only returns if both requests are being served at once.
+            barrier.wait()
+            return original(view, request, *args, **kwargs)
+
+        view = async_views.async_view(RecipeListAPIView)
+        with mock.patch.object(RecipeListAPIView, 'list', list_):
+            responses = await asyncio.gather(
+                view(self.get('/api/recipe/')), view(self.get('/api/recipe/')))
+
+        self.assertEqual([r.status_code for r in responses], [200, 200])
+        self.assertEqual(len(threads), 2)
+        self.assertNotIn(loop_thread, threads)
+
+    async def test_async_views_run_on_one_thread_per_pooled_connection(self):
+        names = []
+        original = RecipeListAPIView.list
+
+        def list_(view, request, *args, **kwargs):
+            names.append(threading.current_thread().name)
+            return original(view, request, *args, **kwargs)
+
+        view = async_views.async_view(RecipeListAPIView)
+        with mock.patch.object(RecipeListAPIView, 'list', list_):
+            await view(self.get('/api/recipe/'))
+
+        self.assertTrue(names[0].startswith('async-view'))
+        self.assertEqual(async_views.get_executor()._max_workers,
+                         settings.DATABASES['default']['POOL']['MAX_SIZE'])
+
+    async def test_async_view_is_timed(self):
+        middleware = RequestTimingMiddleware(async_views.async_view(RecipeListAPIView))
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+
+        response = await middleware(self.get('/api/recipe/'))
+        server_timing = response['Server-Timing']
+        # The queries ran on a worker thread.
+        self.assertNotIn('desc="0 queries"', server_timing)
+        self.assertRegex(server_timing, r'render;dur=\d')
+
+    async def test_asgi_handler_runs_the_middleware(self):
+        response = await AsyncClient().get('/api/recipe/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('render;dur=', response['Server-Timing'])
+
+
+class BenchmarkDatasetTestCase(APITestCase):
+
+    def test_seed_benchmark_data(self):
+        call_command('seed_benchmark_data', '--users', '20', '--recipes', '50', '--likes', '200',
+                     '--bookmarks', '50', '--batch-size', '16', stdout=StringIO())
+        self.assertEqual(CustomUser.objects.filter(email__endswith='@example.com').count(), 20)
+        self.assertEqual(Recipe.objects.count(), 50)
+        self.assertGreater(RecipeLike.objects.count(), 100)
+        for recipe in Recipe.objects.all():
+            self.assertEqual(recipe.like_count, RecipeLike.objects.filter(recipe=recipe).count())
+            self.assertEqual(recipe.cook_time.second, 0)
+
+        response = self.client.post(reverse('users:login-user'), {
+            'email': 'user1@example.com', 'password': PASSWORD})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        with self.assertRaises(CommandError):
+            call_command('seed_benchmark_data', '--users', '1', '--recipes', '1',
+                         stdout=StringIO())
+
+    def test_compare_with_baseline(self):
+        baseline = {'results': [
+            {'scenario': 'list', 'concurrency': 10, 'rps': 100, 'p95_ms': 50, 'p99_ms': 80},
+            {'scenario': 'detail', 'concurrency': 10, 'rps': 200, 'p95_ms': 20, 'p99_ms': 30},
+        ]}
+        results = [
+            {'scenario': 'list', 'concurrency': 10, 'rps': 95, 'p95_ms': 54, 'p99_ms': 90},
+            {'scenario': 'detail', 'concurrency': 10, 'rps': 150, 'p95_ms': 20, 'p99_ms': 30},
+            {'scenario': 'like', 'concurrency': 10, 'rps': 1, 'p95_ms': 900, 'p99_ms': 999},
+        ]
+        self.assertEqual(compare(results, baseline, 0.1), [
+            ('list', 10, 'p99_ms', 80, 90),
+            ('detail', 10, 'rps', 200, 150),
+        ])
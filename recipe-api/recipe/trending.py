@@ -0,0 +1,78 @@
+import math
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Max
+from django.utils import timezone
+
+from .models import Recipe, RecipeLike, TrendingScore
+
+UPSERT_SQL = """
+INSERT INTO {trending} (recipe_id, category_id, score, refreshed_at)
+SELECT l.recipe_id, r.category_id,
+       SUM(exp(-%(decay)s * extract(epoch FROM %(now)s - l.created))), %(now)s
+FROM {like} l JOIN {recipe} r ON r.id = l.recipe_id
+WHERE l.created > %(since)s AND l.created <= %(now)s
+GROUP BY l.recipe_id, r.category_id
+ON CONFLICT (recipe_id) DO UPDATE
+SET score = {trending}.score + EXCLUDED.score,
+    category_id = EXCLUDED.category_id,
+    refreshed_at = EXCLUDED.refreshed_at
+"""
+
+# Key of the transaction level advisory lock that serializes refreshes.
+REFRESH_LOCK_ID = 0x7472656e64  # 'trend'
+
+
+def decay_rate():
+    """
+    Per-second decay constant for TRENDING_HALF_LIFE_HOURS.
+    """
+    return math.log(2) / (settings.TRENDING_HALF_LIFE_HOURS * 3600)
+
+
+def refresh_scores(now=None):
+    """
+    Brings the trending scores up to date.
+
+    A recipe's score is the sum over its likes of exp(-rate * age). Since
+    every score decays by the same factor, a refresh multiplies the whole
+    table by exp(-rate * elapsed), drops recipes whose score became
+    negligible, and then adds only the likes created since the previous
+    refresh. The table therefore holds just the recently liked recipes and
+    each run reads a small slice of the like table through its created
+    index. After an empty table (first run, or nothing liked for a long
+    time) the last TRENDING_WINDOW_DAYS of likes are replayed.
+
+    Refreshes are serialized with an advisory lock: two overlapping ones
+    would otherwise both decay the table and both add the same likes.
+
+    Returns the number of recipes with a trending score.
+    """
+    # Leave a short margin for like transactions that are still committing.
+    now = (now or timezone.now()) - timedelta(seconds=settings.TRENDING_COMMIT_MARGIN)
+    rate = decay_rate()
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(%s)', [REFRESH_LOCK_ID])
+        since = TrendingScore.objects.aggregate(last=Max('refreshed_at'))['last']
+        if since is None:
+            since = now - timedelta(days=settings.TRENDING_WINDOW_DAYS)
+        elif since >= now:
+            return TrendingScore.objects.count()
+
+        factor = math.exp(-rate * (now - since).total_seconds())
+        TrendingScore.objects.update(score=F('score') * factor, refreshed_at=now)
+        TrendingScore.objects.filter(score__lt=settings.TRENDING_MIN_SCORE).delete()
+
+        quote = connection.ops.quote_name
+        sql = UPSERT_SQL.format(
+            trending=quote(TrendingScore._meta.db_table),
+            like=quote(RecipeLike._meta.db_table),
+            recipe=quote(Recipe._meta.db_table),
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, {'decay': rate, 'now': now, 'since': since})
+    return TrendingScore.objects.count()
@@ -1,13 +1,22 @@
 from django.urls import path
 
-from recipe import views
+from recipe import async_views, views
 
 app_name = 'recipe'
 
 urlpatterns = [
-    path('', views.RecipeListAPIView.as_view(), name="recipe-list"),
-    path('<int:pk>/', views.RecipeAPIView.as_view(), name="recipe-detail"),
+    path('', async_views.as_view(views.RecipeListAPIView), name="recipe-list"),
+    path('<int:pk>/', async_views.as_view(views.RecipeAPIView), name="recipe-detail"),
+    path('<int:pk>/similar/', views.RecipeSimilarAPIView.as_view(),
+         name="recipe-similar"),
+    path('search/', views.RecipeSearchAPIView.as_view(), name="recipe-search"),
+    path('by-ingredients/', views.RecipeIngredientSearchAPIView.as_view(),
+         name="recipe-by-ingredients"),
+    path('trending/', views.RecipeTrendingAPIView.as_view(),
+         name="recipe-trending"),
     path('create/', views.RecipeCreateAPIView.as_view(), name="recipe-create"),
     path('<int:pk>/like/', views.RecipeLikeAPIView.as_view(),
          name='recipe-like'),
+    path('likes/', views.RecipeBulkLikeAPIView.as_view(),
+         name='recipe-bulk-like'),
 ]
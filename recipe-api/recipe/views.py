@@ -1,22 +1,158 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max
 from rest_framework import generics, status
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS, AllowAny, IsAuthenticated
 from django.shortcuts import get_object_or_404
 from rest_framework.response import Response
 
+from events.outbox import publish, publish_many
+
+from . import like_buffer
+from .ingredients import parse_ingredients
+from .cache import (
+    LIST_NAMESPACE,
+    CachedRetrieveMixin,
+    invalidate_recipes,
+    versioned_validators,
+)
+from .conditional import ConditionalRequestMixin, make_etag
 from .models import Recipe, RecipeLike
-from .serializers import RecipeLikeSerializer, RecipeSerializer
+from .pagination import (
+    RecipeCursorPagination,
+    RecipeSearchPagination,
+    RecipeUncountedPagination,
+)
+from .serializers import (
+    BulkRecipeIdsSerializer,
+    RecipeIngredientMatchSerializer,
+    RecipeLikeSerializer,
+    RecipeListSerializer,
+    RecipeSerializer,
+)
 from .permissions import IsAuthorOrReadOnly
 
 
-class RecipeListAPIView(generics.ListAPIView):
+class RecipeFieldsMixin:
     """
-    Get: a collection of recipes
+    Leaves the recipe columns that the requested representation does not
+    render (see ?fields= / ?omit=) in the database on reads.
     """
-    queryset = Recipe.objects.all()
-    serializer_class = RecipeSerializer
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.request.method not in SAFE_METHODS:
+            return queryset
+        return queryset.defer(*self.get_serializer_class().deferred_fields(self.request))
+
+
+class RecipeListAPIView(ConditionalRequestMixin, CachedRetrieveMixin, RecipeFieldsMixin,
+                        generics.ListAPIView):
+    """
+    Get: a collection of recipes, in the compact representation unless
+    ?fields= asks for more
+    """
+    queryset = Recipe.objects.for_api()
     permission_classes = (AllowAny,)
+    pagination_class = RecipeCursorPagination
     filterset_fields = ('category__name', 'author__username')
 
+    def get_serializer_class(self):
+        if self.request.query_params.get('fields'):
+            return RecipeSerializer
+        return RecipeListSerializer
+
+    def get_validators(self):
+        # Every recipe change bumps the list namespace, so its version
+        # identifies the lists without scanning the recipes.
+        return versioned_validators(self.request, LIST_NAMESPACE) or self.compute_validators()
+
+    def compute_validators(self):
+        stats = self.filter_queryset(self.get_queryset()).aggregate(
+            last_modified=Max('updated_at'), count=Count('pk'))
+        params = sorted(self.request.query_params.lists())
+        etag = make_etag('recipes', params, stats['count'], stats['last_modified'])
+        return etag, stats['last_modified']
+
+
+class RecipeSearchAPIView(CachedRetrieveMixin, RecipeFieldsMixin, generics.ListAPIView):
+    """
+    Get: recipes matching the full-text query ?q=, ranked by relevance
+    """
+    serializer_class = RecipeSerializer
+    permission_classes = (AllowAny,)
+    pagination_class = RecipeUncountedPagination
+
+    def get_queryset(self):
+        terms = self.request.query_params.get('q', '').strip()
+        if not terms:
+            return Recipe.objects.none()
+        return Recipe.objects.for_api().search(terms)
+
+
+class RecipeIngredientSearchAPIView(CachedRetrieveMixin, RecipeFieldsMixin, generics.ListAPIView):
+    """
+    Get: recipes using the comma separated ?ingredients=, the ones mostly
+    made of them first
+    """
+    serializer_class = RecipeIngredientMatchSerializer
+    permission_classes = (AllowAny,)
+    pagination_class = RecipeSearchPagination
+    max_ingredients = 20
+
+    def get_queryset(self):
+        names = parse_ingredients(self.request.query_params.get('ingredients', ''))
+        if not names:
+            return Recipe.objects.none()
+        if len(names) > self.max_ingredients:
+            raise ValidationError({'ingredients': 'At most {} ingredients are allowed.'.format(
+                self.max_ingredients)})
+        return Recipe.objects.for_api().with_ingredients(names)
+
+
+class RecipeTrendingAPIView(CachedRetrieveMixin, RecipeFieldsMixin, generics.ListAPIView):
+    """
+    Get: recently popular recipes, optionally within ?category__name=
+    """
+    serializer_class = RecipeSerializer
+    permission_classes = (AllowAny,)
+    pagination_class = RecipeSearchPagination
+
+    def get_queryset(self):
+        # Filter on the category copied to the score table so the query
+        # walks the (category, -score) index.
+        queryset = Recipe.objects.for_api().filter(trending__isnull=False)
+        category = self.request.query_params.get('category__name')
+        if category:
+            queryset = queryset.filter(trending__category__name=category)
+        return queryset.order_by('-trending__score', '-id')
+
+
+class RecipeSimilarAPIView(CachedRetrieveMixin, RecipeFieldsMixin, generics.ListAPIView):
+    """
+    Get: recipes liked by the same people as the given one
+    """
+    serializer_class = RecipeSerializer
+    permission_classes = (AllowAny,)
+    pagination_class = None
+
+    def get_cache_namespace(self):
+        # The payload embeds other recipes, which every recipe change
+        # invalidates through the list namespace.
+        return LIST_NAMESPACE
+
+    def get_queryset(self):
+        return Recipe.objects.for_api() \
+            .filter(similar_from__recipe_id=self.kwargs['pk']) \
+            .order_by('-similar_from__score')
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        if not response.data:
+            get_object_or_404(Recipe, pk=self.kwargs['pk'])
+        return response
+
 
 class RecipeCreateAPIView(generics.CreateAPIView):
     """
@@ -30,14 +166,22 @@ class RecipeCreateAPIView(generics.CreateAPIView):
         serializer.save(author=self.request.user)
 
 
-class RecipeAPIView(generics.RetrieveUpdateDestroyAPIView):
+class RecipeAPIView(ConditionalRequestMixin, CachedRetrieveMixin, RecipeFieldsMixin,
+                    generics.RetrieveUpdateDestroyAPIView):
     """
     Get, Update, Delete a recipe
     """
-    queryset = Recipe.objects.all()
+    queryset = Recipe.objects.for_api()
     serializer_class = RecipeSerializer
     permission_classes = (IsAuthorOrReadOnly,)
 
+    def compute_validators(self):
+        updated_at = Recipe.objects.filter(pk=self.kwargs['pk']) \
+            .values_list('updated_at', flat=True).first()
+        if updated_at is None:
+            return None, None
+        return make_etag('recipe', self.kwargs['pk'], updated_at), updated_at
+
 
 class RecipeLikeAPIView(generics.CreateAPIView):
     """
@@ -47,21 +191,88 @@ class RecipeLikeAPIView(generics.CreateAPIView):
     permission_classes = (IsAuthenticated,)
 
     def post(self, request, pk):
-        recipe = get_object_or_404(Recipe, id=self.kwargs['pk'])
-        new_like, created = RecipeLike.objects.get_or_create(
-            user=request.user, recipe=recipe)
-        if created:
-            new_like.save()
-            return Response(status=status.HTTP_201_CREATED)
-        return Response(status=status.HTTP_400_BAD_REQUEST)
+        return self.toggle(request, pk, liked=True)
 
     def delete(self, request, pk):
-        recipe = get_object_or_404(Recipe, id=self.kwargs['pk'])
-        like = RecipeLike.objects.filter(user=request.user, recipe=recipe)
-        if like.exists():
-            like.delete()
-            return Response(status=status.HTTP_200_OK)
+        return self.toggle(request, pk, liked=False)
+
+    def toggle(self, request, pk, liked):
+        if settings.RECIPE_LIKE_BUFFER:
+            like_buffer.buffer_like(request.user.pk, pk, liked)
+            return Response(status=status.HTTP_202_ACCEPTED)
+
+        with transaction.atomic():
+            if liked:
+                changed = RecipeLike.objects.like([(request.user.pk, pk)])
+            else:
+                changed = RecipeLike.objects.unlike([(request.user.pk, pk)])
+            if changed:
+                invalidate_recipes(pk)
+                publish('recipe.liked' if liked else 'recipe.unliked',
+                        user=request.user.pk, recipe=pk)
+        if changed:
+            return Response(
+                status=status.HTTP_201_CREATED if liked else status.HTTP_200_OK)
+
+        # Nothing changed, either the recipe does not exist or the like
+        # was already in the requested state.
+        get_object_or_404(Recipe, id=pk)
         return Response(status=status.HTTP_400_BAD_REQUEST)
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
+
+
+def bulk_response(ids, found, changed, changed_status, unchanged_status):
+    """
+    Reports the outcome of a bulk request for every id, in request order.
+    """
+    results = []
+    for pk in ids:
+        if pk not in found:
+            result = 'not_found'
+        elif pk in changed:
+            result = changed_status
+        else:
+            result = unchanged_status
+        results.append({'id': pk, 'status': result})
+    return Response({'results': results}, status=status.HTTP_200_OK)
+
+
+class RecipeBulkLikeAPIView(generics.GenericAPIView):
+    """
+    Like (POST), Dislike (DELETE) a batch of recipes
+    """
+    serializer_class = BulkRecipeIdsSerializer
+    permission_classes = (IsAuthenticated,)
+
+    def get_ids(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data['ids']
+
+    def post(self, request):
+        ids = self.get_ids(request)
+        with transaction.atomic():
+            found = set(Recipe.objects.filter(pk__in=ids).values_list('pk', flat=True))
+            liked = RecipeLike.objects.like((request.user.pk, pk) for pk in found)
+            new = {recipe_id for _, recipe_id in liked}
+            if new:
+                invalidate_recipes(*new)
+            publish_many('recipe.liked', [
+                {'user': request.user.pk, 'recipe': pk} for pk in new])
+
+        return bulk_response(ids, found, new, 'liked', 'already_liked')
+
+    def delete(self, request):
+        ids = self.get_ids(request)
+        with transaction.atomic():
+            found = set(Recipe.objects.filter(pk__in=ids).values_list('pk', flat=True))
+            unliked = RecipeLike.objects.unlike((request.user.pk, pk) for pk in found)
+            removed = {recipe_id for _, recipe_id in unliked}
+            if removed:
+                invalidate_recipes(*removed)
+            publish_many('recipe.unliked', [
+                {'user': request.user.pk, 'recipe': pk} for pk in removed])
+
+        return bulk_response(ids, found, removed, 'unliked', 'not_liked')
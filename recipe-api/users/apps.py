@@ -6,4 +6,5 @@ class UsersConfig(AppConfig):
     name = 'users'
 
     def ready(self):
+        import users.handlers  # noqa
         import users.signals  # noqa
@@ -0,0 +1,79 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils.functional import SimpleLazyObject
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTTokenUserAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+ACTIVE = 'active'
+INACTIVE = 'inactive'
+MISSING = 'missing'
+
+
+def user_state_key(user_id):
+    return 'auth:user-state:{}'.format(user_id)
+
+
+def get_user_state(user_id):
+    """
+    Returns whether the user is active, inactive or missing, cached for
+    AUTH_USER_STATE_TIMEOUT seconds. Saving or deleting the user clears
+    the entry (see users.signals).
+    """
+    key = user_state_key(user_id)
+    state = cache.get(key)
+    if state is None:
+        is_active = get_user_model().objects \
+            .filter(**{api_settings.USER_ID_FIELD: user_id}) \
+            .values_list('is_active', flat=True).first()
+        state = MISSING if is_active is None else ACTIVE if is_active else INACTIVE
+        cache.set(key, state, timeout=settings.AUTH_USER_STATE_TIMEOUT)
+    return state
+
+
+class LazyTokenUser(SimpleLazyObject):
+    """
+    request.user built from the access token claims.
+
+    The id and the authentication flags are answered from the token. Any
+    other attribute loads the real user, together with its profile, on
+    first access, after which the object behaves like that CustomUser.
+    """
+
+    def __init__(self, token):
+        user_id = token[api_settings.USER_ID_CLAIM]
+        super().__init__(
+            lambda: get_user_model().objects.select_related('profile')
+            .get(**{api_settings.USER_ID_FIELD: user_id}))
+        # Set on the proxy itself, reading them must not load the user.
+        self.__dict__.update({
+            'pk': user_id,
+            api_settings.USER_ID_FIELD: user_id,
+            'is_authenticated': True,
+            'is_anonymous': False,
+            'token': token,
+        })
+
+
+class StatelessJWTAuthentication(JWTTokenUserAuthentication):
+    """
+    JWT authentication that does not query the user table per request.
+    The user is a SIMPLE_JWT TOKEN_USER_CLASS built from the claims, and
+    the active check goes through the short-lived user state cache.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        state = get_user_state(user_id)
+        if state == MISSING:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+        if state == INACTIVE:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        return super().get_user(validated_token)
@@ -0,0 +1,96 @@
+import math
+import time
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+from django_redis import get_redis_connection
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+KEY_PREFIX = 'jwt-blacklist'
+
+
+def get_blacklist():
+    """
+    Returns an instance of the TOKEN_BLACKLIST_BACKEND class.
+    """
+    return import_string(settings.TOKEN_BLACKLIST_BACKEND)()
+
+
+class RedisBlacklist:
+    """
+    Keeps the JTI of each revoked token in Redis until the token would have
+    expired anyway, so the blacklist only ever holds live tokens and a
+    lookup is a single EXISTS.
+
+    The TOKEN_BLACKLIST_CACHE_ALIAS database must never be flushed, and its
+    server must run with maxmemory-policy noeviction: a lost entry silently
+    makes its revoked token valid again.
+    """
+
+    def __init__(self):
+        self.redis = get_redis_connection(settings.TOKEN_BLACKLIST_CACHE_ALIAS)
+
+    def key(self, jti):
+        return '{}:{}'.format(KEY_PREFIX, jti)
+
+    def is_blacklisted(self, jti):
+        return bool(self.redis.exists(self.key(jti)))
+
+    def add_many(self, entries):
+        """
+        Blacklists (jti, exp) pairs, exp being the token expiry as a Unix
+        timestamp. Already expired tokens are skipped.
+
+        Returns the number of stored entries.
+        """
+        now = time.time()
+        pipeline = self.redis.pipeline(transaction=False)
+        stored = 0
+        for jti, exp in entries:
+            ttl = math.ceil(exp - now)
+            if ttl > 0:
+                pipeline.set(self.key(jti), 1, ex=ttl)
+                stored += 1
+        pipeline.execute()
+        return stored
+
+    def add(self, token):
+        """
+        Blacklists the token with a single SET NX.
+
+        Returns whether it was not blacklisted yet, so that of concurrent
+        requests revoking the same token only one succeeds.
+        """
+        ttl = math.ceil(token['exp'] - time.time())
+        if ttl <= 0:
+            return False
+        return bool(self.redis.set(self.key(token[api_settings.JTI_CLAIM]), 1, ex=ttl, nx=True))
+
+
+class DatabaseBlacklist:
+    """
+    simplejwt's OutstandingToken/BlacklistedToken tables. Needs
+    rest_framework_simplejwt.token_blacklist in INSTALLED_APPS.
+    """
+
+    def is_blacklisted(self, jti):
+        from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+        return BlacklistedToken.objects.filter(token__jti=jti).exists()
+
+    def add(self, token):
+        from rest_framework_simplejwt.token_blacklist.models import (
+            BlacklistedToken,
+            OutstandingToken,
+        )
+
+        outstanding, _ = OutstandingToken.objects.get_or_create(
+            jti=token[api_settings.JTI_CLAIM],
+            defaults={
+                'token': str(token),
+                'expires_at': datetime_from_epoch(token['exp']),
+            },
+        )
+        _, created = BlacklistedToken.objects.get_or_create(token=outstanding)
+        return created
@@ -0,0 +1,49 @@
+import functools
+
+import factory
+from django.contrib.auth.hashers import make_password
+from django.utils import timezone
+
+from .models import CustomUser, Profile
+
+# Password of every user built by UserFactory
+PASSWORD = 'benchmark-password'
+EMAIL_DOMAIN = 'example.com'
+
+
+@functools.lru_cache(maxsize=None)
+def password_hash():
+    # Hashed once: at the hasher's cost, hashing per user would take hours
+    # for a benchmark sized dataset.
+    return make_password(PASSWORD)
+
+
+class UserFactory(factory.django.DjangoModelFactory):
+    """
+    Users named user<n>, with the email user<n>@example.com and the
+    password PASSWORD.
+    """
+
+    class Meta:
+        model = CustomUser
+
+    username = factory.Sequence(lambda n: 'user{}'.format(n))
+    email = factory.LazyAttribute(lambda user: '{}@{}'.format(user.username, EMAIL_DOMAIN))
+    first_name = factory.Faker('first_name')
+    last_name = factory.Faker('last_name')
+    password = factory.LazyFunction(password_hash)
+    date_joined = factory.Faker('date_time_between', start_date='-3y', tzinfo=timezone.utc)
+
+
+class ProfileFactory(factory.django.DjangoModelFactory):
+    """
+    The profile of a user. Saving a user already creates it, so it is
+    looked up by user first.
+    """
+
+    class Meta:
+        model = Profile
+        django_get_or_create = ('user',)
+
+    user = factory.SubFactory(UserFactory)
+    bio = factory.Faker('sentence', nb_words=10)
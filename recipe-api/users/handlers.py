@@ -0,0 +1,24 @@
+from django.db.models import Case, DateTimeField, Value, When
+from django.utils.dateparse import parse_datetime
+
+from events.outbox import handler
+
+from .models import CustomUser
+
+
+@handler('user.logged_in')
+def update_last_login(payloads):
+    """
+    Stores the latest login time of every user in the batch with a single
+    UPDATE.
+    """
+    latest = {}
+    for payload in payloads:
+        logged_in_at = parse_datetime(payload['at'])
+        if payload['user'] not in latest or latest[payload['user']] < logged_in_at:
+            latest[payload['user']] = logged_in_at
+
+    CustomUser.objects.filter(pk__in=latest).update(last_login=Case(
+        *[When(pk=pk, then=Value(at)) for pk, at in latest.items()],
+        output_field=DateTimeField(),
+    ))
@@ -0,0 +1,68 @@
+import time
+
+from aiosmtpd.controller import Controller
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from recipe.models import Recipe
+from users.tasks import _chunked, send_like_count_digest_chunk
+
+
+class Sink:
+    """
+    aiosmtpd handler accepting and counting every message.
+    """
+
+    def __init__(self):
+        self.received = 0
+
+    async def handle_DATA(self, server, session, envelope):
+        self.received += 1
+        return '250 Message accepted for delivery'
+
+
+class Command(BaseCommand):
+    help = ('Send the like count digest of the first authors to a local SMTP sink, '
+            'in chunks of each given size, and print the messages sent per second. '
+            'A chunk size of 1 sends each email over its own connection')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--authors', type=int, default=1000,
+                            help='Authors the digest is sent to')
+        parser.add_argument('--chunk-size', type=int, nargs='+', dest='chunk_sizes',
+                            default=[1, settings.DIGEST_CHUNK_SIZE],
+                            help='Authors per send_like_count_digest_chunk call')
+        parser.add_argument('--port', type=int, default=8025, help='Port of the SMTP sink')
+
+    def handle(self, *args, **options):
+        if any(size < 1 for size in options['chunk_sizes']):
+            raise CommandError('--chunk-size values must be positive')
+        author_ids = list(Recipe.objects.order_by('author_id')
+                          .values_list('author_id', flat=True).distinct()[:options['authors']])
+        if not author_ids:
+            raise CommandError('No recipes, run seed_benchmark_data first')
+
+        sink = Sink()
+        controller = Controller(sink, hostname='127.0.0.1', port=options['port'])
+        controller.start()
+        smtp = override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+            EMAIL_HOST='127.0.0.1', EMAIL_PORT=options['port'], EMAIL_USE_TLS=False,
+            EMAIL_USE_SSL=False, EMAIL_HOST_USER='digest@example.com', EMAIL_HOST_PASSWORD='')
+        self.stdout.write('{:>10} {:>9} {:>9} {:>9}'.format('chunk', 'messages', 'seconds', 'msg/s'))
+        try:
+            with smtp:
+                for size in options['chunk_sizes']:
+                    sink.received = 0
+                    started = time.perf_counter()
+                    sent = sum(send_like_count_digest_chunk(chunk)
+                               for chunk in _chunked(author_ids, size))
+                    elapsed = time.perf_counter() - started
+                    if sink.received != sent:
+                        raise CommandError('{} messages sent but {} received'.format(
+                            sent, sink.received))
+                    self.stdout.write('{:>10} {:>9} {:>9.2f} {:>9.1f}'.format(
+                        size, sent, elapsed, sent / elapsed))
+        finally:
+            controller.stop()
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import (
+    BlacklistedToken,
+    OutstandingToken,
+)
+
+from users.blacklist import RedisBlacklist
+
+
+class Command(BaseCommand):
+    help = ('Copy the unexpired tokens of the token_blacklist tables to the Redis '
+            'blacklist, optionally emptying the tables')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Number of tokens written to Redis per pipeline')
+        parser.add_argument(
+            '--delete', action='store_true',
+            help='Empty the token_blacklist tables once the tokens are copied')
+
+    def handle(self, *args, **options):
+        blacklist = RedisBlacklist()
+        rows = BlacklistedToken.objects.filter(token__expires_at__gt=timezone.now()) \
+            .values_list('token__jti', 'token__expires_at').iterator()
+
+        copied = 0
+        batch = []
+        for jti, expires_at in rows:
+            batch.append((jti, expires_at.timestamp()))
+            if len(batch) >= options['batch_size']:
+                copied += blacklist.add_many(batch)
+                batch = []
+        copied += blacklist.add_many(batch)
+        self.stdout.write(self.style.SUCCESS(
+            'Copied {} blacklisted tokens to Redis.'.format(copied)))
+
+        if options['delete']:
+            tables = ', '.join(connection.ops.quote_name(model._meta.db_table)
+                               for model in (BlacklistedToken, OutstandingToken))
+            with transaction.atomic(), connection.cursor() as cursor:
+                # Fire pending deferred foreign key checks, TRUNCATE refuses
+                # to run while there are any.
+                cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+                cursor.execute('TRUNCATE {}'.format(tables))
+            self.stdout.write(self.style.SUCCESS('Emptied the token_blacklist tables.'))
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.9 on 2026-10-18 17:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0011_profile_avatar_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
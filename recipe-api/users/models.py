@@ -1,6 +1,6 @@
 from django.conf import settings
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import connection, models
 from django.utils.translation import ugettext_lazy as _
 
 from recipe.models import Recipe
@@ -20,12 +20,73 @@ class CustomUser(AbstractUser):
         return self.email
 
 
+BOOKMARK_SQL = """
+WITH inserted AS (
+    INSERT INTO {bookmark} (profile_id, recipe_id)
+    SELECT %s, {recipe}.id FROM {recipe} WHERE {recipe}.id = ANY(%s::bigint[])
+    ON CONFLICT (profile_id, recipe_id) DO NOTHING
+    RETURNING recipe_id
+), counted AS (
+    UPDATE {recipe} SET bookmark_count = {recipe}.bookmark_count + 1, updated_at = now()
+    FROM inserted
+    WHERE {recipe}.id = inserted.recipe_id
+)
+SELECT recipe_id FROM inserted
+"""
+
+UNBOOKMARK_SQL = """
+WITH deleted AS (
+    DELETE FROM {bookmark}
+    WHERE profile_id = %s AND recipe_id = ANY(%s::bigint[])
+    RETURNING recipe_id
+), counted AS (
+    UPDATE {recipe}
+    SET bookmark_count = GREATEST({recipe}.bookmark_count - 1, 0), updated_at = now()
+    FROM deleted
+    WHERE {recipe}.id = deleted.recipe_id
+)
+SELECT recipe_id FROM deleted
+"""
+
+
 class Profile(models.Model):
     user = models.OneToOneField(
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     bookmarks = models.ManyToManyField(Recipe, related_name='bookmarked_by')
     avatar = models.ImageField(upload_to='avatar', blank=True)
+    avatar_variants = models.JSONField(default=dict, blank=True, editable=False)
     bio = models.CharField(max_length=200, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.user.username
+
+    def _apply_bookmarks(self, sql, recipe_ids):
+        recipe_ids = list(recipe_ids)
+        if not recipe_ids:
+            return []
+        sql = sql.format(
+            bookmark=connection.ops.quote_name(Profile.bookmarks.through._meta.db_table),
+            recipe=connection.ops.quote_name(Recipe._meta.db_table),
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [self.pk, recipe_ids])
+            return [row[0] for row in cursor.fetchall()]
+
+    def add_bookmarks(self, recipe_ids):
+        """
+        Bookmarks recipes and bumps their bookmark counters in a single
+        statement. Recipes already bookmarked or missing are skipped.
+
+        Returns the ids of the recipes actually bookmarked.
+        """
+        return self._apply_bookmarks(BOOKMARK_SQL, recipe_ids)
+
+    def remove_bookmarks(self, recipe_ids):
+        """
+        Removes bookmarks and lowers the bookmark counters in a single
+        statement.
+
+        Returns the ids of the recipes actually removed.
+        """
+        return self._apply_bookmarks(UNBOOKMARK_SQL, recipe_ids)
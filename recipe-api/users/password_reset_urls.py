@@ -0,0 +1,16 @@
+from django.urls import path
+
+from users import views
+
+# Same routes and names as django_rest_passwordreset.urls, with the views
+# rate limited like the other password endpoints.
+app_name = 'password_reset'
+
+urlpatterns = [
+    path('validate_token/', views.PasswordResetValidateAPIView.as_view(),
+         name='reset-password-validate'),
+    path('confirm/', views.PasswordResetConfirmAPIView.as_view(),
+         name='reset-password-confirm'),
+    path('', views.PasswordResetRequestAPIView.as_view(),
+         name='reset-password-request'),
+]
@@ -1,8 +1,19 @@
 from rest_framework import serializers
+from rest_framework_simplejwt import serializers as jwt_serializers
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
 from django.contrib.auth import authenticate
 from django.contrib.auth.password_validation import validate_password
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+
+from events.outbox import publish
+from recipe.cache import invalidate_all, invalidate_recipes
+from recipe.images import variant_urls
+from recipe.models import Recipe
 
 from .models import CustomUser, Profile
+from .tokens import RefreshToken
 
 
 class CustomUserSerializer(serializers.ModelSerializer):
@@ -13,6 +24,16 @@ class CustomUserSerializer(serializers.ModelSerializer):
         model = CustomUser
         fields = ('id', 'username', 'email')
 
+    def update(self, instance, validated_data):
+        renamed = 'username' in validated_data \
+            and validated_data['username'] != instance.username
+        instance = super().update(instance, validated_data)
+        if renamed:
+            # Recipes display their author's username.
+            Recipe.objects.filter(author=instance).touch()
+            invalidate_all()
+        return instance
+
 
 class UserRegisterationSerializer(serializers.ModelSerializer):
     """
@@ -49,14 +70,38 @@ class ProfileSerializer(CustomUserSerializer):
         model = Profile
         fields = ('bookmarks', 'bio')
 
+    def update(self, instance, validated_data):
+        if 'bookmarks' not in validated_data:
+            return super().update(instance, validated_data)
+
+        new_ids = {recipe.pk for recipe in validated_data.pop('bookmarks')}
+        with transaction.atomic():
+            old_ids = set(instance.bookmarks.values_list('pk', flat=True))
+            instance = super().update(instance, validated_data)
+            # The counters follow the rows actually inserted and deleted,
+            # which concurrent requests may have changed since old_ids.
+            added = instance.add_bookmarks(new_ids - old_ids)
+            removed = instance.remove_bookmarks(old_ids - new_ids)
+            invalidate_recipes(*added, *removed)
+            for recipe_id in added:
+                publish('recipe.bookmarked', user=instance.user_id, recipe=recipe_id)
+            for recipe_id in removed:
+                publish('recipe.unbookmarked', user=instance.user_id, recipe=recipe_id)
+        return instance
+
 
 class ProfileAvatarSerializer(serializers.ModelSerializer):
     """
     Serializer class to serialize the avatar
     """
+    avatar_variants = serializers.SerializerMethodField()
+
     class Meta:
         model = Profile
-        fields = ('avatar',)
+        fields = ('avatar', 'avatar_variants')
+
+    def get_avatar_variants(self, obj):
+        return variant_urls(obj.avatar_variants, self.context.get('request'))
 
 
 class PasswordChangeSerializer(serializers.Serializer):
@@ -80,3 +125,24 @@ class PasswordChangeSerializer(serializers.Serializer):
         instance.set_password(validated_data['new_password'])
         instance.save()
         return instance
+
+
+class TokenRefreshSerializer(jwt_serializers.TokenRefreshSerializer):
+    """
+    Serializer class to refresh tokens, rotating and blacklisting them
+    through the TOKEN_BLACKLIST_BACKEND. A token revoked between its check
+    and its blacklisting, e.g. by a concurrent refresh, is rejected.
+    """
+
+    def validate(self, attrs):
+        refresh = RefreshToken(attrs['refresh'])
+        data = {'access': str(refresh.access_token)}
+
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION and not refresh.blacklist():
+                raise TokenError(_('Token is blacklisted'))
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            data['refresh'] = str(refresh)
+        return data
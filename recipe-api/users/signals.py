@@ -1,13 +1,17 @@
-from django.db.models.signals import post_save
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
 from django.contrib.auth import get_user_model
 from django.dispatch import receiver
 from django.core.mail import EmailMultiAlternatives
 from django.template.loader import render_to_string
+from django.db import transaction
 from django.urls import reverse
 
 from django_rest_passwordreset.signals import reset_password_token_created
 
+from .authentication import user_state_key
 from .models import Profile
+from .tasks import process_avatar
 
 
 User = get_user_model()
@@ -24,6 +28,18 @@ def save_profile(sender, instance, **kwargs):
     instance.profile.save()
 
 
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def clear_user_state(sender, instance, **kwargs):
+    cache.delete(user_state_key(instance.pk))
+
+
+@receiver(post_save, sender=Profile)
+def process_avatar_upload(sender, instance, **kwargs):
+    if (instance.avatar.name or '') != instance.avatar_variants.get('source', ''):
+        transaction.on_commit(lambda: process_avatar.delay(instance.pk))
+
+
 # Password reset
 @receiver(reset_password_token_created)
 def password_reset_token_created(sender, instance, reset_password_token, *args, **kwargs):
@@ -1,47 +1,99 @@
+from itertools import groupby, islice
+
 from celery import shared_task
-import time
-from django.core.mail import send_mail
-from decouple import config
-from .models import CustomUser
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+
+from config.db.routing import replica_reads
+from recipe.images import delete_variants, generate_variants
 from recipe.models import Recipe
 
+from .models import Profile
+
+
+def _chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
 
 @shared_task(bind=True) #TODO Fix me (raises all alone warning)
+@replica_reads
 def send_daily_mail_like_count(self):
     """
     Sends daily emails to each author with the like counts for their recipes.
 
-    This task runs as a scheduled job (via Celery Beat) and retrieves all authors 
-    (CustomUser). For each author, it collects their recipes and calculates the 
-    total likes for each. The results are emailed to the author.
+    This task runs as a scheduled job (via Celery Beat). It streams the ids
+    of every author that has at least one recipe and fans them out in chunks
+    of DIGEST_CHUNK_SIZE to send_like_count_digest_chunk, so the digest is
+    built and mailed by several workers in parallel. Reads go to a read
+    replica when one is configured.
 
     Returns:
-        None
+        The number of chunks dispatched.
     """
-    authors = CustomUser.objects.all()
-    for author in authors:
-        # Prepare a list to hold the recipe details
-        recipe_details = []
-        
-        # Get all recipes for the author
-        recipes = author.recipes.all()
-        
-        for recipe in recipes:
-            total_likes = recipe.get_total_number_of_likes()
-            recipe_details.append(f"{recipe.title}: {total_likes} likes")
-
-        # Prepare the email
+    author_ids = Recipe.objects.order_by('author_id') \
+        .values_list('author_id', flat=True).distinct().iterator()
+    chunks = 0
+    for chunk in _chunked(author_ids, settings.DIGEST_CHUNK_SIZE):
+        send_like_count_digest_chunk.delay(chunk)
+        chunks += 1
+    return chunks
+
+
+@shared_task
+@replica_reads
+def send_like_count_digest_chunk(author_ids):
+    """
+    Sends the like count digest to the given authors.
+
+    The recipes of the whole chunk are read in one query, ordered by author
+    and streamed, and every email of the chunk goes out over a single SMTP
+    connection.
+
+    Returns:
+        The number of emails sent.
+    """
+    rows = Recipe.objects.filter(author_id__in=author_ids) \
+        .order_by('author_id', '-like_count', 'title') \
+        .values_list('author_id', 'author__username', 'author__email',
+                     'title', 'like_count') \
+        .iterator()
+
+    messages = []
+    for (_, username, email), recipes in groupby(rows, key=lambda row: row[:3]):
+        recipe_details = [
+            f"{title}: {like_count} likes" for *_, title, like_count in recipes]
         subject = 'Daily Recipe Likes Update'
-        message = f'Dear {author.username},\n\nHere is the like count for your recipes today:\n\n' + "\n".join(recipe_details)
-        email_from = config('EMAIL_USER')
-        recipient_list = [author.email]
-        
-        # Send the email
-        send_mail(
-            subject,
-            message,
-            email_from,
-            recipient_list,
-            fail_silently=False,
-        )
-        
\ No newline at end of file
+        message = f'Dear {username},\n\nHere is the like count for your recipes today:\n\n' + "\n".join(recipe_details)
+        messages.append(EmailMessage(
+            subject, message, settings.EMAIL_HOST_USER, [email]))
+
+    connection = get_connection(fail_silently=False)
+    return connection.send_messages(messages) or 0
+
+
+@shared_task
+def process_avatar(profile_id):
+    """
+    Generates the resized variants and placeholder of a profile avatar.
+
+    The result is only stored if the avatar was not replaced while the
+    variants were being rendered.
+    """
+    profile = Profile.objects.filter(pk=profile_id).first()
+    if profile is None:
+        return
+
+    variants = generate_variants(profile.avatar, 'variants/avatar/{}'.format(profile.pk)) \
+        if profile.avatar else {}
+    updated = Profile.objects.filter(pk=profile.pk, avatar=profile.avatar.name) \
+        .update(avatar_variants=variants)
+    if not updated:
+        delete_variants(variants)
+    elif profile.avatar_variants.get('source') != variants.get('source'):
+        delete_variants(profile.avatar_variants)
+
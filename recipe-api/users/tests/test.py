@@ -1,9 +1,47 @@
 from rest_framework.test import APITestCase
 from rest_framework import status
 from django.urls import reverse
+from events.models import OutboxEvent
 from users.models import CustomUser, Profile
 from recipe.models import Recipe, RecipeCategory
 from rest_framework_simplejwt.tokens import RefreshToken
+from unittest import mock
+from django.core import mail
+from django.core.mail import get_connection
+from django.db import connection
+from django.conf import settings
+from django.test import override_settings
+from users.tasks import process_avatar, send_daily_mail_like_count, send_like_count_digest_chunk
+import socket
+import tempfile
+from io import BytesIO
+from PIL import Image
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test.utils import CaptureQueriesContext
+from django.core.cache import cache
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIRequestFactory
+from users.authentication import StatelessJWTAuthentication, user_state_key
+from users.blacklist import RedisBlacklist
+from users.tokens import RefreshToken as BlacklistingRefreshToken
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from django.core.management import call_command
+from io import StringIO
+from django_redis import get_redis_connection
+from redis.exceptions import ConnectionError as RedisConnectionError
+from users import throttling
+
+
+def redis_location(redis):
+    kwargs = redis.connection_pool.connection_kwargs
+    return tuple(kwargs.get(name) for name in ('host', 'port', 'path', 'db'))
+
+
+def clear_throttles():
+    redis = get_redis_connection('default')
+    keys = list(redis.scan_iter('{}:*'.format(throttling.KEY_PREFIX)))
+    if keys:
+        redis.delete(*keys)
 
 class UserAPITestCase(APITestCase):
 
@@ -14,6 +52,7 @@ class UserAPITestCase(APITestCase):
             password='password123',
             email='testuser@example.com'
         )
+        clear_throttles()
         self.client.force_authenticate(user=self.user)
         self.refresh_token = str(RefreshToken.for_user(self.user))
         self.profile, created = Profile.objects.get_or_create(user=self.user, defaults={'bio': "This is a bio"})
@@ -292,10 +331,437 @@ class UserAPITestCase(APITestCase):
         
     def test_profile_str(self):
         self.assertEqual(str(self.profile), 'testuser')
-        
-    
-    
 
+    def test_bookmark_updates_bookmark_count(self):
+        url = reverse('users:user-bookmark', kwargs={'pk': self.user.id})
+        self.client.post(url, {'id': self.recipe.id})
+        self.client.post(url, {'id': self.recipe.id})
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.bookmark_count, 1)
 
-        
-   
+        self.client.delete(url, {'id': self.recipe.id})
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.bookmark_count, 0)
+
+    def test_bookmark_and_unbookmark_publish_events(self):
+        url = reverse('users:user-bookmark', kwargs={'pk': self.user.id})
+        self.client.post(url, {'id': self.recipe.id})
+        self.client.post(url, {'id': self.recipe.id})
+        self.client.delete(url, {'id': self.recipe.id})
+        payload = {'user': self.user.id, 'recipe': self.recipe.id}
+        self.assertEqual(list(OutboxEvent.objects.values_list('topic', 'payload')),
+                         [('recipe.bookmarked', payload), ('recipe.unbookmarked', payload)])
+
+    def test_update_profile_bookmarks_updates_bookmark_count(self):
+        self.client.patch(reverse('users:user-profile'), {'bookmarks': [self.recipe.id]})
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.bookmark_count, 1)
+
+        other_recipe = Recipe.objects.create(
+            title="Test Recipe 2",
+            author=self.user,
+            category=self.category,
+            cook_time="00:10:00",
+            ingredients="Test ingredients",
+            procedure="Test procedure",
+        )
+        self.client.put(reverse('users:user-profile'), {'bio': 'bio', 'bookmarks': [other_recipe.id]})
+        self.recipe.refresh_from_db()
+        other_recipe.refresh_from_db()
+        self.assertEqual(self.recipe.bookmark_count, 0)
+        self.assertEqual(other_recipe.bookmark_count, 1)
+
+    def test_get_user_bookmarks_query_count_is_constant(self):
+        url = reverse('users:user-bookmark', kwargs={'pk': self.user.id})
+        self.profile.bookmarks.add(self.recipe)
+        with CaptureQueriesContext(connection) as single:
+            response = self.client.get(url)
+        self.assertEqual(len(response.data), 1)
+
+        categories = [
+            RecipeCategory.objects.create(name=f"Category {i}") for i in range(5)
+        ]
+        Recipe.objects.bulk_create(
+            Recipe(
+                title=f"Bulk Recipe {i}",
+                author=self.user,
+                category=categories[i % 5],
+                cook_time="00:15:00",
+                ingredients="Bulk ingredients",
+                procedure="Bulk procedure",
+            )
+            for i in range(499)
+        )
+        self.profile.bookmarks.add(*Recipe.objects.filter(title__startswith="Bulk"))
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(url)
+        self.assertEqual(len(response.data), 500)
+        self.assertEqual(len(single), len(many))
+
+    @override_settings(DIGEST_CHUNK_SIZE=2)
+    def test_daily_digest_fans_out_authors_with_recipes(self):
+        authors = [self.user]
+        for i in range(3):
+            author = CustomUser.objects.create_user(
+                username=f'author{i}', password='password123', email=f'author{i}@example.com')
+            Recipe.objects.create(
+                title=f"Recipe {i}",
+                author=author,
+                category=self.category,
+                cook_time="00:30:00",
+                ingredients="Test ingredients",
+                procedure="Test procedure",
+            )
+            authors.append(author)
+        CustomUser.objects.create_user(
+            username='noRecipes', password='password123', email='norecipes@example.com')
+
+        with mock.patch.object(send_like_count_digest_chunk, 'delay') as delay:
+            self.assertEqual(send_daily_mail_like_count.apply().get(), 2)
+
+        dispatched = [call.args[0] for call in delay.call_args_list]
+        self.assertEqual(sum(dispatched, []), sorted(author.id for author in authors))
+        self.assertTrue(all(len(chunk) <= 2 for chunk in dispatched))
+
+    def test_digest_chunk_sends_over_one_connection(self):
+        other = CustomUser.objects.create_user(
+            username='other', password='password123', email='other@example.com')
+        Recipe.objects.create(
+            title="Other Recipe",
+            author=other,
+            category=self.category,
+            cook_time="00:30:00",
+            ingredients="Test ingredients",
+            procedure="Test procedure",
+        )
+        Recipe.objects.filter(pk=self.recipe.pk).update(like_count=3)
+
+        with mock.patch('users.tasks.get_connection', wraps=get_connection) as connect:
+            sent = send_like_count_digest_chunk([self.user.id, other.id])
+
+        self.assertEqual(sent, 2)
+        self.assertEqual(connect.call_count, 1)
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(mail.outbox[0].to, ['testuser@example.com'])
+        self.assertIn('Test Recipe 1: 3 likes', mail.outbox[0].body)
+        self.assertIn('Other Recipe: 0 likes', mail.outbox[1].body)
+
+    def test_benchmark_digest_delivers_to_the_smtp_sink(self):
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            port = probe.getsockname()[1]
+        out = StringIO()
+        call_command('benchmark_digest', '--chunk-size', '1', '10', '--port', str(port), stdout=out)
+        rows = [line.split() for line in out.getvalue().splitlines()[1:]]
+        self.assertEqual([row[:2] for row in rows], [['1', '1'], ['10', '1']])
+
+    @override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+    def test_avatar_upload_queues_variants_without_waiting(self):
+        img_io = BytesIO()
+        Image.new('RGB', (600, 600), color='red').save(img_io, format='PNG')
+        avatar = SimpleUploadedFile('avatar.png', img_io.getvalue(), content_type='image/png')
+
+        with mock.patch.object(process_avatar, 'delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.patch(reverse('users:user-avatar'), {'avatar': avatar}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(response.data['avatar_variants'])
+        delay.assert_called_once_with(self.profile.pk)
+
+        process_avatar(self.profile.pk)
+        self.user.profile.refresh_from_db()
+        response = self.client.get(reverse('users:user-avatar'))
+        self.assertEqual(response.data['avatar_variants']['thumbnail']['width'], 160)
+        self.assertEqual(response.data['avatar_variants']['full']['width'], 600)
+
+    def test_bulk_bookmark_add_and_remove(self):
+        url = reverse('users:user-bookmark-bulk', kwargs={'pk': self.user.id})
+        missing = self.recipe.id + 1000
+        response = self.client.post(url, {'ids': [self.recipe.id, missing]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'], [
+            {'id': self.recipe.id, 'status': 'bookmarked'},
+            {'id': missing, 'status': 'not_found'},
+        ])
+        response = self.client.post(url, {'ids': [self.recipe.id]}, format='json')
+        self.assertEqual(response.data['results'], [{'id': self.recipe.id, 'status': 'already_bookmarked'}])
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.bookmark_count, 1)
+        self.assertIn(self.recipe, self.profile.bookmarks.all())
+
+        response = self.client.delete(url, {'ids': [self.recipe.id]}, format='json')
+        self.assertEqual(response.data['results'], [{'id': self.recipe.id, 'status': 'removed'}])
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.bookmark_count, 0)
+        self.assertNotIn(self.recipe, self.profile.bookmarks.all())
+
+    def test_profile_conditional_get_and_if_match(self):
+        url = reverse('users:user-profile')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.client.post(reverse('users:user-bookmark', kwargs={'pk': self.user.id}), {'id': self.recipe.id})
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['bookmarks'], [self.recipe.id])
+
+        response = self.client.patch(url, {'bio': 'stale'}, HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        response = self.client.patch(url, {'bio': 'fresh'}, HTTP_IF_MATCH=self.client.get(url)['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # Deleting a bookmarked recipe changes the profile without touching it.
+        etag = response['ETag']
+        self.recipe.delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+    def test_bookmark_statements_count_only_the_rows_they_change(self):
+        other_recipe = Recipe.objects.create(
+            title="Test Recipe 2",
+            author=self.user,
+            category=self.category,
+            cook_time="00:10:00",
+            ingredients="Test ingredients",
+            procedure="Test procedure",
+        )
+        # Bookmarked by a concurrent request since the caller last looked.
+        Profile.bookmarks.through.objects.create(profile=self.profile, recipe=self.recipe)
+
+        self.assertEqual(self.profile.add_bookmarks([self.recipe.id, other_recipe.id, 0]),
+                         [other_recipe.id])
+        self.recipe.refresh_from_db()
+        other_recipe.refresh_from_db()
+        self.assertEqual((self.recipe.bookmark_count, other_recipe.bookmark_count), (0, 1))
+
+        self.assertEqual(self.profile.remove_bookmarks([other_recipe.id]), [other_recipe.id])
+        self.assertEqual(self.profile.remove_bookmarks([other_recipe.id]), [])
+        other_recipe.refresh_from_db()
+        self.assertEqual(other_recipe.bookmark_count, 0)
+
+    def test_bulk_bookmark_other_profile_forbidden(self):
+        other = CustomUser.objects.create_user(
+            username='other', password='password123', email='other@example.com')
+        url = reverse('users:user-bookmark-bulk', kwargs={'pk': other.id})
+        response = self.client.post(url, {'ids': [self.recipe.id]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class StatelessJWTAuthenticationTestCase(APITestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            username='testuser', password='password123', email='testuser@example.com')
+        self.user.profile.bio = 'bio'
+        self.user.profile.save()
+        cache.delete(user_state_key(self.user.pk))
+        self.access_token = str(RefreshToken.for_user(self.user).access_token)
+
+    def authenticate(self):
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {self.access_token}')
+        return StatelessJWTAuthentication().authenticate(request)[0]
+
+    def test_user_is_built_from_the_token(self):
+        with self.assertNumQueries(1):
+            self.authenticate()
+        with self.assertNumQueries(0):
+            user = self.authenticate()
+            self.assertEqual(user.pk, self.user.pk)
+            self.assertTrue(user.is_authenticated)
+
+        # The real user and its profile load together on first use.
+        with self.assertNumQueries(1):
+            self.assertEqual(user.email, 'testuser@example.com')
+            self.assertEqual(user.profile.bio, 'bio')
+        self.assertIsInstance(user, CustomUser)
+        self.assertEqual(user, self.user)
+
+    def test_inactive_and_deleted_users_are_rejected(self):
+        self.authenticate()
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+        self.user.delete()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_api_requests_with_token(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access_token}')
+        response = self.client.get(reverse('users:user-profile'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['bio'], 'bio')
+        response = self.client.patch(reverse('users:user-info'), {'username': 'renamed'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.username, 'renamed')
+
+
+class TokenBlacklistTestCase(APITestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            username='testuser', password='password123', email='testuser@example.com')
+        clear_throttles()
+        self.refresh_url = reverse('users:token-refresh')
+
+    def login(self):
+        response = self.client.post(reverse('users:login-user'), {
+            'email': 'testuser@example.com', 'password': 'password123'})
+        return response.data['tokens']['refresh']
+
+    def test_rotated_refresh_token_is_blacklisted_in_redis(self):
+        refresh = self.login()
+        response = self.client.post(self.refresh_url, {'refresh': refresh})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response.data['refresh'], refresh)
+
+        response = self.client.post(self.refresh_url, {'refresh': refresh})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        # Nothing reaches the token_blacklist tables, and the entry expires
+        # with the token.
+        self.assertFalse(OutstandingToken.objects.exists())
+        blacklist = RedisBlacklist()
+        jti = BlacklistingRefreshToken(refresh, verify=False)['jti']
+        ttl = blacklist.redis.ttl(blacklist.key(jti))
+        self.assertTrue(0 < ttl <= 14 * 24 * 3600)
+
+    def test_blacklist_survives_a_cache_flush(self):
+        refresh = self.login()
+        self.client.post(self.refresh_url, {'refresh': refresh})
+        cache.clear()
+
+        response = self.client.post(self.refresh_url, {'refresh': refresh})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertNotEqual(redis_location(RedisBlacklist().redis),
+                            redis_location(get_redis_connection('default')))
+
+    def test_concurrent_refreshes_of_one_token_rotate_it_once(self):
+        refresh = self.login()
+        token = BlacklistingRefreshToken(refresh)
+        self.assertTrue(token.blacklist())
+        self.assertFalse(token.blacklist())
+
+        # A concurrent refresh that passed the blacklist check before the
+        # token was blacklisted.
+        with mock.patch.object(RedisBlacklist, 'is_blacklisted', return_value=False):
+            response = self.client.post(self.refresh_url, {'refresh': refresh})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertNotIn('access', response.data)
+
+    def test_logout_blacklists_refresh_token(self):
+        refresh = self.login()
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(reverse('users:logout-user'), {'refresh': refresh})
+        self.assertEqual(response.status_code, status.HTTP_205_RESET_CONTENT)
+        response = self.client.post(self.refresh_url, {'refresh': refresh})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_migrate_token_blacklist_command(self):
+        revoked = RefreshToken.for_user(self.user)
+        revoked.blacklist()
+        self.assertEqual(BlacklistedToken.objects.count(), 1)
+
+        out = StringIO()
+        call_command('migrate_token_blacklist', '--delete', stdout=out)
+        self.assertIn('Copied 1 blacklisted tokens to Redis.', out.getvalue())
+        self.assertFalse(OutstandingToken.objects.exists())
+        response = self.client.post(self.refresh_url, {'refresh': str(revoked)})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+@override_settings(AUTH_THROTTLE_RATES={
+    'auth_ip': '4/min', 'auth_email': '2/min', 'auth_global': '100/s'})
+class AuthThrottleTestCase(APITestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            username='testuser', password='password123', email='testuser@example.com')
+        clear_throttles()
+
+    def login(self, email, **extra):
+        return self.client.post(reverse('users:login-user'), {
+            'email': email, 'password': 'wrong'}, **extra)
+
+    def test_email_limit_rejects_before_hashing(self):
+        for _ in range(2):
+            self.assertEqual(self.login('testuser@example.com').status_code,
+                             status.HTTP_400_BAD_REQUEST)
+
+        with mock.patch('users.serializers.authenticate') as authenticate:
+            response = self.login(' TestUser@example.com')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertTrue(0 < int(response['Retry-After']) <= 60)
+        authenticate.assert_not_called()
+
+        # Other accounts are only subject to the address limit.
+        self.assertEqual(self.login('other@example.com').status_code,
+                         status.HTTP_400_BAD_REQUEST)
+
+    def test_ip_limit_spans_accounts_and_endpoints(self):
+        for i in range(3):
+            self.assertEqual(self.login('user{}@example.com'.format(i)).status_code,
+                             status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(reverse('password_reset:reset-password-request'),
+                                    {'email': 'testuser@example.com'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.post(reverse('users:create-user'), {
+            'username': 'new', 'email': 'new@example.com',
+            'password': 'password123'})
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertFalse(CustomUser.objects.filter(email='new@example.com').exists())
+
+        # Another client address gets its own window.
+        self.assertEqual(self.login('user9@example.com', REMOTE_ADDR='10.0.0.2').status_code,
+                         status.HTTP_400_BAD_REQUEST)
+
+    def test_ip_limit_ignores_spoofed_forwarded_for(self):
+        for i in range(4):
+            self.assertEqual(self.login('user{}@example.com'.format(i),
+                                        HTTP_X_FORWARDED_FOR='203.0.113.{}'.format(i)).status_code,
+                             status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.login('user9@example.com',
+                                    HTTP_X_FORWARDED_FOR='203.0.113.9').status_code,
+                         status.HTTP_429_TOO_MANY_REQUESTS)
+
+    @override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'NUM_PROXIES': 1})
+    def test_ip_limit_uses_the_address_added_by_a_trusted_proxy(self):
+        for i in range(4):
+            self.login('user{}@example.com'.format(i),
+                       HTTP_X_FORWARDED_FOR='198.51.100.{}, 203.0.113.1'.format(i))
+        self.assertEqual(self.login('user9@example.com',
+                                    HTTP_X_FORWARDED_FOR='198.51.100.9, 203.0.113.1').status_code,
+                         status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(self.login('user9@example.com',
+                                    HTTP_X_FORWARDED_FOR='203.0.113.2').status_code,
+                         status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(AUTH_THROTTLE_RATES={
+        'auth_ip': '2/min', 'auth_email': '100/min', 'auth_global': '5/min'})
+    def test_rejected_requests_do_not_use_up_other_limits(self):
+        for i in range(10):
+            self.login('user{}@example.com'.format(i))
+        # Only the two requests the address limit let through were counted
+        # globally, so other clients can still log in.
+        for address in ('10.0.0.2', '10.0.0.3'):
+            self.assertEqual(self.login('other@example.com', REMOTE_ADDR=address).status_code,
+                             status.HTTP_400_BAD_REQUEST)
+
+    def test_password_change_is_limited_per_user(self):
+        self.client.force_authenticate(user=self.user)
+        url = reverse('users:change-password')
+        data = {'old_password': 'wrong', 'new_password': 'n3w-Passw0rd!'}
+        for _ in range(2):
+            self.assertNotEqual(self.client.put(url, data).status_code,
+                                status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(self.client.put(url, data).status_code,
+                         status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_requests_are_allowed_when_redis_is_down(self):
+        with mock.patch.object(throttling.AuthRateThrottle, 'script', create=True,
+                               side_effect=RedisConnectionError):
+            for i in range(5):
+                self.assertEqual(self.login('user{}@example.com'.format(i)).status_code,
+                                 status.HTTP_400_BAD_REQUEST)
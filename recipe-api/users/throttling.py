@@ -0,0 +1,190 @@
+import hashlib
+import logging
+import uuid
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+from rest_framework.throttling import SimpleRateThrottle
+
+logger = logging.getLogger('users')
+
+KEY_PREFIX = 'throttle'
+
+# Sliding window logs: one sorted set member per accepted request, scored
+# by its arrival time in milliseconds. KEYS are the windows a request
+# counts in, ARGV the request id followed by the length in milliseconds
+# and the limit of each window. Expired members are trimmed and the
+# remaining ones counted in every window first; the request is recorded
+# only if all of them allow it, so a request rejected by one limit never
+# uses up another. Running as one script, concurrent workers can never
+# let more than a limit through.
+# Returns 0 when the request is allowed, otherwise the milliseconds until
+# every window would allow it.
+SLIDING_WINDOW_SCRIPT = '''
+local now = redis.call('TIME')
+now = tonumber(now[1]) * 1000 + math.floor(tonumber(now[2]) / 1000)
+local wait = 0
+
+for i, key in ipairs(KEYS) do
+    local window = tonumber(ARGV[i * 2])
+    local limit = tonumber(ARGV[i * 2 + 1])
+    redis.call('ZREMRANGEBYSCORE', key, '-inf', now - window)
+    if redis.call('ZCARD', key) >= limit then
+        local oldest = redis.call('ZRANGE', key, 0, 0, 'WITHSCORES')
+        local expires = window
+        if oldest[2] then
+            expires = tonumber(oldest[2]) + window - now
+        end
+        wait = math.max(wait, expires, 1)
+    end
+end
+if wait > 0 then
+    return wait
+end
+
+for i, key in ipairs(KEYS) do
+    redis.call('ZADD', key, now, ARGV[1])
+    redis.call('PEXPIRE', key, tonumber(ARGV[i * 2]))
+end
+return 0
+'''
+
+
+class RedisSlidingWindowThrottle(SimpleRateThrottle):
+    """
+    Rate limit kept in Redis as a sliding window log and decided atomically
+    by a Lua script.
+
+    Rates are read from AUTH_THROTTLE_RATES by scope, in DRF's
+    "<requests>/<period>" format. DRF runs throttles before the handler,
+    so a rejected request never reaches the password hasher. If Redis is
+    unreachable the request is let through rather than locking everybody
+    out.
+    """
+
+    script = None
+
+    def __init__(self):
+        self.redis = get_redis_connection(settings.AUTH_THROTTLE_CACHE_ALIAS)
+        super().__init__()
+
+    def get_rate(self):
+        try:
+            return settings.AUTH_THROTTLE_RATES[self.scope]
+        except KeyError:
+            raise ImproperlyConfigured(
+                "No AUTH_THROTTLE_RATES entry for scope '%s'" % self.scope)
+
+    def get_ident_key(self, request, view):
+        raise NotImplementedError('.get_ident_key() must be overridden')
+
+    def get_cache_key(self, request, view):
+        ident = self.get_ident_key(request, view)
+        if ident is None:
+            return None
+        return '{}:{}:{}'.format(KEY_PREFIX, self.scope, ident)
+
+    def get_windows(self, request, view):
+        """
+        Returns the (key, length in milliseconds, limit) sliding windows the
+        request counts in.
+        """
+        if self.rate is None:
+            return []
+        key = self.get_cache_key(request, view)
+        if key is None:
+            return []
+        return [(key, self.duration * 1000, self.num_requests)]
+
+    def allow_request(self, request, view):
+        windows = self.get_windows(request, view)
+        if not windows:
+            return True
+
+        cls = type(self)
+        if cls.script is None:
+            cls.script = self.redis.register_script(SLIDING_WINDOW_SCRIPT)
+        args = [uuid.uuid4().hex]
+        for _, length, limit in windows:
+            args.extend((length, limit))
+        try:
+            self.wait_ms = cls.script(keys=[key for key, _, _ in windows], args=args)
+        except RedisError:
+            logger.warning('Throttle %s unavailable, allowing request', self.scope,
+                           exc_info=True)
+            return True
+        return not self.wait_ms
+
+    def wait(self):
+        return self.wait_ms / 1000
+
+
+class AuthIPRateThrottle(RedisSlidingWindowThrottle):
+    """
+    Limits the requests of a single client address: REMOTE_ADDR, or the
+    X-Forwarded-For entry added by the outermost of the NUM_PROXIES trusted
+    proxies, so that clients cannot pick their own address.
+    """
+
+    scope = 'auth_ip'
+
+    def get_ident_key(self, request, view):
+        return self.get_ident(request)
+
+
+class AuthEmailRateThrottle(RedisSlidingWindowThrottle):
+    """
+    Limits the attempts against a single account, whatever address they
+    come from: the email posted in the body, or the authenticated user.
+    Requests carrying neither are left to the other throttles.
+    """
+
+    scope = 'auth_email'
+
+    def get_ident_key(self, request, view):
+        email = request.data.get('email') if hasattr(request.data, 'get') else None
+        if isinstance(email, str) and email.strip():
+            # Hashed so addresses are not stored in Redis in clear.
+            return hashlib.sha256(email.strip().lower().encode('utf-8')).hexdigest()[:32]
+        if request.user and request.user.is_authenticated:
+            return 'user-{}'.format(request.user.pk)
+        return None
+
+
+class AuthGlobalRateThrottle(RedisSlidingWindowThrottle):
+    """
+    Caps the hashing work of all clients together, so a distributed burst
+    cannot starve the workers either.
+    """
+
+    scope = 'auth_global'
+
+    def get_ident_key(self, request, view):
+        return 'all'
+
+
+class AuthRateThrottle(RedisSlidingWindowThrottle):
+    """
+    Applies the address, account and global limits in one script. DRF
+    runs every throttle class even after one rejects the request, so as
+    separate throttles the requests rejected per address would still fill
+    the global window, letting one client lock everybody out.
+    """
+
+    scope = 'auth'
+    throttle_classes = (AuthIPRateThrottle, AuthEmailRateThrottle, AuthGlobalRateThrottle)
+
+    def get_rate(self):
+        # Each window has the rate of its own scope.
+        return None
+
+    def get_windows(self, request, view):
+        windows = []
+        for throttle_class in self.throttle_classes:
+            windows.extend(throttle_class().get_windows(request, view))
+        return windows
+
+
+AUTH_THROTTLE_CLASSES = (AuthRateThrottle,)
@@ -0,0 +1,34 @@
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt import tokens
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+
+from .blacklist import get_blacklist
+
+
+class BlacklistMixin:
+    """
+    Checks and records revoked tokens in the TOKEN_BLACKLIST_BACKEND.
+    Unlike simplejwt's mixin, issuing a token writes nothing.
+    """
+
+    def verify(self, *args, **kwargs):
+        self.check_blacklist()
+        super().verify(*args, **kwargs)
+
+    def check_blacklist(self):
+        if get_blacklist().is_blacklisted(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError(_('Token is blacklisted'))
+
+    def blacklist(self):
+        """
+        Returns whether the token was not blacklisted yet.
+        """
+        return get_blacklist().add(self)
+
+
+class RefreshToken(BlacklistMixin, tokens.Token):
+    token_type = 'refresh'
+    lifetime = api_settings.REFRESH_TOKEN_LIFETIME
+    no_copy_claims = tokens.RefreshToken.no_copy_claims
+    access_token = tokens.RefreshToken.access_token
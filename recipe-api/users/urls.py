@@ -1,6 +1,6 @@
 from django.urls import path
-from rest_framework_simplejwt.views import TokenRefreshView
 
+from recipe import async_views
 from users import views
 
 app_name = 'users'
@@ -9,15 +9,17 @@ urlpatterns = [
     path('register/', views.UserRegisterationAPIView.as_view(),
          name="create-user"),
     path('login/', views.UserLoginAPIView.as_view(), name="login-user"),
-    path('token/refresh/', TokenRefreshView.as_view(), name='token-refresh'),
+    path('token/refresh/', views.TokenRefreshAPIView.as_view(), name='token-refresh'),
     path('logout/', views.UserLogoutAPIView.as_view(), name='logout-user'),
     path('', views.UserAPIView.as_view(), name='user-info'),
-    path('profile/', views.UserProfileAPIView.as_view(),
+    path('profile/', async_views.as_view(views.UserProfileAPIView),
          name='user-profile'),
     path('profile/avatar/', views.UserAvatarAPIView.as_view(),
          name='user-avatar'),
-    path('profile/<int:pk>/bookmarks/', views.UserBookmarkAPIView.as_view(),
+    path('profile/<int:pk>/bookmarks/', async_views.as_view(views.UserBookmarkAPIView),
          name='user-bookmark'),
+    path('profile/<int:pk>/bookmarks/bulk/', views.UserBulkBookmarkAPIView.as_view(),
+         name='user-bookmark-bulk'),
     path('password/change/', views.PasswordChangeAPIView.as_view(),
          name='change-password'),
 ]
@@ -1,4 +1,5 @@
 from rest_framework import status
+from rest_framework.exceptions import PermissionDenied
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.generics import (
@@ -7,15 +8,25 @@ from rest_framework.generics import (
     RetrieveUpdateAPIView,
     UpdateAPIView,
 )
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.views import TokenRefreshView
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django_rest_passwordreset import views as password_reset_views
 
+from events.outbox import publish, publish_many
+
+from recipe.cache import invalidate_recipes
+from recipe.conditional import ConditionalRequestMixin, make_etag
 from recipe.models import Recipe
 from .models import Profile
-from recipe.serializers import RecipeSerializer
+from .tokens import RefreshToken
+from recipe.serializers import BulkRecipeIdsSerializer, RecipeSerializer
+from recipe.views import RecipeFieldsMixin, bulk_response
 from . import serializers
-from .tasks import send_daily_mail_like_count
+from .throttling import AUTH_THROTTLE_CLASSES
 import logging
 
 logger = logging.getLogger("users")
@@ -30,6 +41,7 @@ class UserRegisterationAPIView(GenericAPIView):
     """
 
     permission_classes = (AllowAny,)
+    throttle_classes = AUTH_THROTTLE_CLASSES
     serializer_class = serializers.UserRegisterationSerializer
 
     def post(self, request, *args, **kwargs):
@@ -48,15 +60,16 @@ class UserLoginAPIView(GenericAPIView):
     """
 
     permission_classes = (AllowAny,)
+    throttle_classes = AUTH_THROTTLE_CLASSES
     serializer_class = serializers.UserLoginSerializer
 
     def post(self, request, *args, **kwargs):
         logger.info('User attempting to sign in with email: %s', request.data.get('email'))
-        send_daily_mail_like_count.delay()
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         user = serializer.validated_data
         logger.info("User signed in: %s", user.email)
+        publish('user.logged_in', user=user.pk, at=timezone.now().isoformat())
         serializer = serializers.CustomUserSerializer(user)
         token = RefreshToken.for_user(user)
         data = serializer.data
@@ -81,6 +94,14 @@ class UserLogoutAPIView(GenericAPIView):
             return Response(status=status.HTTP_400_BAD_REQUEST)
 
 
+class TokenRefreshAPIView(TokenRefreshView):
+    """
+    An endpoint to exchange a refresh token for a new token pair.
+    """
+
+    serializer_class = serializers.TokenRefreshSerializer
+
+
 class UserAPIView(RetrieveUpdateAPIView):
     """
     Get, Update user information
@@ -93,7 +114,7 @@ class UserAPIView(RetrieveUpdateAPIView):
         return self.request.user
 
 
-class UserProfileAPIView(RetrieveUpdateAPIView):
+class UserProfileAPIView(ConditionalRequestMixin, RetrieveUpdateAPIView):
     """
     Get, Update user profile
     """
@@ -105,6 +126,24 @@ class UserProfileAPIView(RetrieveUpdateAPIView):
     def get_object(self):
         return self.request.user.profile
 
+    def lock_object(self):
+        list(Profile.objects.select_for_update().filter(user_id=self.request.user.pk)
+             .values_list('pk', flat=True))
+
+    def compute_validators(self):
+        # The bookmark count catches bookmarks dropped by recipe deletions,
+        # which do not touch the profile.
+        row = Profile.objects.filter(user_id=self.request.user.pk) \
+            .annotate(bookmark_total=Count('bookmarks')) \
+            .values_list('pk', 'updated_at', 'bookmark_total').first()
+        if row is None:
+            return None, None
+        pk, updated_at, bookmark_total = row
+        return make_etag('profile', pk, updated_at, bookmark_total), updated_at
+
+    def get_validators(self):
+        return self.compute_validators()
+
 
 class UserAvatarAPIView(RetrieveUpdateAPIView):
     """
@@ -119,7 +158,7 @@ class UserAvatarAPIView(RetrieveUpdateAPIView):
         return self.request.user.profile
 
 
-class UserBookmarkAPIView(ListCreateAPIView):
+class UserBookmarkAPIView(RecipeFieldsMixin, ListCreateAPIView):
     """
     Get, Create, Delete favorite recipe
     """
@@ -131,14 +170,18 @@ class UserBookmarkAPIView(ListCreateAPIView):
     def get_queryset(self):
         user = User.objects.get(id=self.kwargs["pk"])
         user_profile = get_object_or_404(self.profile, user=user)
-        return user_profile.bookmarks.all()
+        return user_profile.bookmarks.for_api()
 
     def post(self, request, pk):
         user = User.objects.get(id=pk)
         user_profile = get_object_or_404(self.profile, user=user)
         recipe = Recipe.objects.get(id=request.data["id"])
         if user_profile:
-            user_profile.bookmarks.add(recipe)
+            with transaction.atomic():
+                if user_profile.add_bookmarks([recipe.pk]):
+                    Profile.objects.filter(pk=user_profile.pk).update(updated_at=timezone.now())
+                    invalidate_recipes(recipe.pk)
+                    publish('recipe.bookmarked', user=user.pk, recipe=recipe.pk)
             return Response(status=status.HTTP_200_OK)
         return Response(status=status.HTTP_400_BAD_REQUEST)
 
@@ -147,18 +190,96 @@ class UserBookmarkAPIView(ListCreateAPIView):
         user_profile = get_object_or_404(self.profile, user=user)
         recipe = Recipe.objects.get(id=request.data["id"])
         if user_profile:
-            user_profile.bookmarks.remove(recipe)
+            with transaction.atomic():
+                if user_profile.remove_bookmarks([recipe.pk]):
+                    Profile.objects.filter(pk=user_profile.pk).update(updated_at=timezone.now())
+                    invalidate_recipes(recipe.pk)
+                    publish('recipe.unbookmarked', user=user.pk, recipe=recipe.pk)
             return Response(status=status.HTTP_200_OK)
         return Response(status=status.HTTP_400_BAD_REQUEST)
 
 
+class UserBulkBookmarkAPIView(GenericAPIView):
+    """
+    Add (POST), Remove (DELETE) a batch of favorite recipes
+    """
+
+    serializer_class = BulkRecipeIdsSerializer
+    permission_classes = (IsAuthenticated,)
+
+    def get_profile(self, pk):
+        if pk != self.request.user.pk:
+            raise PermissionDenied()
+        return get_object_or_404(Profile, user_id=pk)
+
+    def get_ids(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data['ids']
+
+    def post(self, request, pk):
+        user_profile = self.get_profile(pk)
+        ids = self.get_ids(request)
+        with transaction.atomic():
+            found = set(Recipe.objects.filter(pk__in=ids).values_list('pk', flat=True))
+            # Only the rows this statement inserted are counted, whatever
+            # concurrent requests did in between.
+            new = set(user_profile.add_bookmarks(found))
+            if new:
+                Profile.objects.filter(pk=user_profile.pk).update(updated_at=timezone.now())
+                invalidate_recipes(*new)
+            publish_many('recipe.bookmarked', [
+                {'user': pk, 'recipe': recipe_id} for recipe_id in new])
+
+        return bulk_response(ids, found, new, 'bookmarked', 'already_bookmarked')
+
+    def delete(self, request, pk):
+        user_profile = self.get_profile(pk)
+        ids = self.get_ids(request)
+        with transaction.atomic():
+            found = set(Recipe.objects.filter(pk__in=ids).values_list('pk', flat=True))
+            removed = set(user_profile.remove_bookmarks(found))
+            if removed:
+                Profile.objects.filter(pk=user_profile.pk).update(updated_at=timezone.now())
+                invalidate_recipes(*removed)
+            publish_many('recipe.unbookmarked', [
+                {'user': pk, 'recipe': recipe_id} for recipe_id in removed])
+
+        return bulk_response(ids, found, removed, 'removed', 'not_bookmarked')
+
+
 class PasswordChangeAPIView(UpdateAPIView):
     """
     Change password view for authenticated user
     """
 
     permission_classes = (IsAuthenticated,)
+    throttle_classes = AUTH_THROTTLE_CLASSES
     serializer_class = serializers.PasswordChangeSerializer
 
     def get_object(self):
         return self.request.user
+
+
+class PasswordResetRequestAPIView(password_reset_views.ResetPasswordRequestToken):
+    """
+    Request a password reset token by email
+    """
+
+    throttle_classes = AUTH_THROTTLE_CLASSES
+
+
+class PasswordResetConfirmAPIView(password_reset_views.ResetPasswordConfirm):
+    """
+    Set a new password with a reset token
+    """
+
+    throttle_classes = AUTH_THROTTLE_CLASSES
+
+
+class PasswordResetValidateAPIView(password_reset_views.ResetPasswordValidateToken):
+    """
+    Check that a password reset token is valid
+    """
+
+    throttle_classes = AUTH_THROTTLE_CLASSES